@@ -5,9 +5,11 @@
 """We are concerned with a setting in which the agents submit approval ballots that are subsets of the set of voters/alternatives.
 The only restriction is that they cannot approve of themselves.""" 
 
-from pylgl import solve, itersolve
 from math import factorial, comb
 from itertools import chain, combinations
+import numpy as np
+from clauseArrays import winnerLiterals, literalClauses, maskPairs
+from profileCodec import approvalBallots, approvalTransitions, ballotMasks, profilesWithBallots, supportMasks, completeMasks, transitionArrays
 
 # Initiate values.
 n = 3 # number of voters
@@ -141,21 +143,27 @@ def cnfCondPosUnanimous():
     """No one with incomplete support is elected while someone with complete support is not.
     In other words for any two agents i and j, where the former has complete support and the latter does not,
     if i is not elected, then neither is j."""
-    cnf = []
-    for r in allApprovalProfiles():
-        for i in voters(lambda v: completeApproval(r,v)):
-            for j in voters(lambda v: not completeApproval(r,v)):
-                cnf.append([posLiteral(r,i),negLiteral(r,j)])
-    return cnf
+    base = numPossibleBallots()
+    ballots = [approvalBallots(n,m,j) for j in allVoters()]
+    masks = [ballotMasks(ballots[j]) for j in allVoters()]
+    # Generate only the profiles in which some agent i has complete support, i.e. voter i is free and all other voters approve of i.
+    fullySupportedProfilesOf = lambda i: profilesWithBallots([[b for b in range(base) if j == i or i in ballots[j][b]] for j in allVoters()], base)
+    completeProfiles = np.unique(np.concatenate([fullySupportedProfilesOf(i) for i in allVoters()]))
+    complete = completeMasks(completeProfiles, masks, base)
+    r, i, j = maskPairs(completeProfiles, complete, ~complete & ((1 << n) - 1), n)
+    return [literalClauses(winnerLiterals(r, i, n), -winnerLiterals(r, j, n))]
 
 def cnfCondNegUnanimous():
     """If some agent with no support is elected, then everyone with at least one vote is elected as well."""
-    cnf = []
-    for r in allApprovalProfiles():
-        for i in voters(lambda v: positiveApproval(r,v)):
-            for j in voters(lambda v: not positiveApproval(r,v)):
-                cnf.append([posLiteral(r,i),negLiteral(r,j)])
-    return cnf
+    base = numPossibleBallots()
+    ballots = [approvalBallots(n,m,j) for j in allVoters()]
+    masks = [ballotMasks(ballots[j]) for j in allVoters()]
+    # Generate only the profiles in which some agent j has no support, i.e. voter j is free and no other voter approves of j.
+    unsupportedProfilesOf = lambda j: profilesWithBallots([[b for b in range(base) if i == j or j not in ballots[i][b]] for i in allVoters()], base)
+    unsupportedProfiles = np.unique(np.concatenate([unsupportedProfilesOf(j) for j in allVoters()]))
+    support = supportMasks(unsupportedProfiles, masks, base)
+    r, i, j = maskPairs(unsupportedProfiles, support, ~support & ((1 << n) - 1), n)
+    return [literalClauses(winnerLiterals(r, i, n), -winnerLiterals(r, j, n))]
 
 def cnfNewUnanimity():
     """The agents with maximal approval scores are elected. There is no one who is elected while there is an agent with a higher approval
@@ -173,16 +181,11 @@ def cnfMonotonicity():
     """For any voter i, if i is elected in r1 and r1 and r2 are j-variants, then if j does not approve of i in r1,
     and j approves of i in r2 besides or instead of some of the approved voters in r1,
     then i should be among the winners in r2."""
-    cnf = []
-    for i in allVoters():
-        for r1 in allApprovalProfiles():
-            # Consider only those voters that don't approve of i in r1
-            for j in voters(lambda l: l != i and not approves(l,i,r1)):
-                # Consider only those j-variants of r1 in which j adds an extra approval of i or approves of i instead of some other agent.
-                for r2 in approvalProfiles(lambda r: iVariants(j,r1,r) and approves(j,i,r) and len(approvalSet(j,r))>=len(approvalSet(j,r1)) and all(elem in approvalSet(j,r1) for elem in approvalSet(j,r) if elem != i)):
-                    # If i wins in r1, i should win in r2
-                    cnf.append([negLiteral(r1,i),posLiteral(r2,i)])
-    return cnf
+    transitions = [approvalTransitions(n,m,j) for j in allVoters()]
+    # r2 is the j-variant of r1 in which j approves of i besides or instead of some of the agents approved in r1
+    # If i wins in r1, i should win in r2
+    return [np.concatenate([literalClauses(-winnerLiterals(r1, i, n), winnerLiterals(r2, i, n))
+        for r1, i, r2 in transitionArrays(transitions, numPossibleBallots())])]
 
 # Surjectivity/non-imposition
 
@@ -0,0 +1,54 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Solving under conflict and propagation budgets
+
+"""Killing a solver process after a wall-clock timeout loses everything the solver has learnt, and whether a cell
+finishes depends on the load of the machine. Instead, an in-process PySAT solver is given a budget of conflicts (or
+propagations). If the budget is exhausted the verdict is unknown, but the solver keeps its state, so the same instance
+can be resumed later with a larger budget. Budgets are counted from the current state of the solver, i.e. a budget
+of b allows b further conflicts."""
+
+import time
+from pysat.solvers import Solver
+from satSolvers import SolverResult
+
+# PySAT solvers that respect budgets (Lingeling does not support limited solving at all, CaDiCaL ignores the budgets)
+budgetSolvers = ['glucose3','glucose4','glucose42','maplechrono','maplecm','maplesat','mergesat3','minisat22','minisatgh']
+
+
+def budgetSolver(solver):
+    """The given solver if it supports budgets, otherwise Glucose."""
+    return solver if solver in budgetSolvers else 'glucose4'
+
+def newSolver(cnf, solver='glucose4'):
+    return Solver(name=budgetSolver(solver), bootstrap_with=cnf)
+
+def solveBudgeted(s, conflicts=None, propagations=None):
+    """
+    Continue solving with the PySAT solver s for at most the given number of further conflicts and propagations (None
+    for no limit). Returns a SolverResult whose verdict is None if a budget was exhausted; stats are accumulated over
+    all calls on s.
+    """
+    # a budget of -1 switches off both budgets, so they are reset first and then only the given ones are set
+    s.conf_budget(-1)
+    if conflicts is not None:
+        s.conf_budget(conflicts)
+    if propagations is not None:
+        s.prop_budget(propagations)
+    start = time.perf_counter()
+    verdict = s.solve_limited()
+    return SolverResult(verdict, s.get_model() if verdict else None, s.accum_stats(), time.perf_counter() - start)
+
+def escalate(cnf, conflicts=10**4, factor=10, passes=4, solver='glucose4', verbose=False):
+    """
+    Solve cnf with the conflict budgets conflicts, conflicts*factor, ..., resuming the same solver instance each time,
+    until a verdict is found or all passes are used. Returns the SolverResult of the last pass.
+    """
+    with newSolver(cnf, solver) as s:
+        for p in range(passes):
+            result = solveBudgeted(s, conflicts * factor**p)
+            if verbose:
+                print('pass ' + str(p) + ': ' + str(result.verdict) + ' after ' + str(result.stats.get('conflicts')) + ' conflicts')
+            if result.verdict is not None:
+                break
+    return result
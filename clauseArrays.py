@@ -0,0 +1,95 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Clause generation by broadcasting over arrays of profiles
+
+"""Many axioms impose the same clauses in every profile, only shifted to the winner variables of that profile
+(posLiteral(r,x) = r*n + x + 1). Instead of looping over allProfiles() in Python, the clauses for profile 0 are
+written down once as a template and broadcast over an array of profile indices. The result is a compact clause
+array with one row per clause (all clauses of an axiom have the same width). Clauses that only hold in some profiles
+(unanimity, monotonicity) are built the same way from arrays of profiles and agents (see winnerLiterals, literalClauses).
+
+A generator returns its clause array wrapped in a list, so that CNFs still concatenate with + and may mix clause arrays
+with clauses. The arrays stay arrays until the CNF is handed to a solver or written to a file, where toClauses turns it
+into the usual list of clauses. The generators looping over profiles in peerGrading.py and approvalPeerGrading.py
+serve as the reference."""
+
+import numpy as np
+
+
+def templateArray(template):
+    """Array (number of clauses, width) holding the clauses of template, which must all have the same width."""
+    if len(template) == 0:
+        return np.zeros((0, 0), dtype=np.int64)
+    return np.array(template, dtype=np.int64).reshape(len(template), len(template[0]))
+
+def profileClauses(template, numProfiles, n):
+    """
+    Clause array of the template (the clauses for profile 0) imposed in every profile r, in the order
+    for r in range(numProfiles): for clause in template.
+    """
+    t = templateArray(template)
+    r = np.arange(numProfiles, dtype=np.int64)[:,None,None] * n
+    return (np.sign(t) * (r + np.abs(t))).reshape(numProfiles * len(t), t.shape[1])
+
+def spanningClauses(template, numProfiles, n):
+    """
+    Clause array in which every clause of the template (written for profile 0) is turned into a single clause
+    containing its literals for all profiles, in the order for r in range(numProfiles): for literal in clause.
+    """
+    t = templateArray(template)
+    r = np.arange(numProfiles, dtype=np.int64)[None,:,None] * n
+    return (np.sign(t)[:,None,:] * (r + np.abs(t)[:,None,:])).reshape(len(t), numProfiles * t.shape[1])
+
+def ballotSpanningClause(ballotTemplate, i, base, numProfiles, n):
+    """
+    A single clause containing for every profile r the literals ballotTemplate[b] (written for profile 0), where b is
+    the ballot index of voter i in r. All rows of ballotTemplate must have the same width.
+    """
+    t = templateArray(ballotTemplate)
+    r = np.arange(numProfiles, dtype=np.int64)
+    b = (r // base**i) % base
+    return (np.sign(t[b]) * (r[:,None] * n + np.abs(t[b]))).reshape(1, numProfiles * t.shape[1])
+
+def winnerLiterals(profiles, agents, n):
+    """The literals posLiteral(r,x) for arrays (or single values) of profiles r and agents x, broadcast together."""
+    return np.asarray(profiles, dtype=np.int64) * n + np.asarray(agents, dtype=np.int64) + 1
+
+def literalClauses(*columns):
+    """Clause array whose j-th literal in every clause is taken from columns[j] (arrays broadcast together)."""
+    return np.stack(np.broadcast_arrays(*[np.asarray(c, dtype=np.int64) for c in columns]), axis=1).reshape(-1, len(columns))
+
+def maskPairs(profiles, first, second, n):
+    """
+    Arrays (r, i, j) of the profiles r and agents i, j such that bit i of first[r] and bit j of second[r] are set, where
+    first and second hold one bitmask per profile, in the order for r in profiles: for i in first[r]: for j in second[r].
+    """
+    bits = np.int64(1) << np.arange(n, dtype=np.int64)
+    a = (np.asarray(first, dtype=np.int64)[:,None] & bits) != 0
+    b = (np.asarray(second, dtype=np.int64)[:,None] & bits) != 0
+    rows, i, j = np.nonzero(a[:,:,None] & b[:,None,:])
+    return np.asarray(profiles, dtype=np.int64)[rows], i, j
+
+
+# The solver boundary
+
+def isClauseArray(entry):
+    return isinstance(entry, np.ndarray) and entry.ndim == 2
+
+def toClauses(cnf):
+    """The list of clauses of a CNF whose entries are clauses or clause arrays."""
+    clauses = []
+    for entry in cnf:
+        if isClauseArray(entry):
+            clauses.extend(entry.tolist())
+        else:
+            clauses.append(entry)
+    return clauses
+
+def numClauses(cnf):
+    """Number of clauses of a CNF whose entries are clauses or clause arrays."""
+    return sum(len(entry) if isClauseArray(entry) else 1 for entry in cnf)
+
+def numVariables(cnf):
+    """Largest variable of a CNF whose entries are clauses or clause arrays."""
+    return max((int(np.abs(entry).max(initial=0)) if isClauseArray(entry) else max((abs(lit) for lit in entry), default=0)
+        for entry in cnf), default=0)
@@ -0,0 +1,173 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Benchmark of the CNF generators and of solving the standard axiom combinations
+
+"""Every cnf* function of the peer grading modules is run for every (n, m, k) of a grid in a separate process, which
+measures the wall-clock and CPU time of the generation, the growth of the peak memory (resident set size) of the
+process and the number of clauses and variables. The standard axiom combinations (theorems 3 and 4 of Holzman and
+Moulin and their approval variants, with exactly k winners) are generated and solved as well. The results are written
+as JSON and can be compared against a stored baseline: a measurement is a regression if it exceeds the baseline by more
+than the threshold, and a changed number of clauses is reported as well.
+
+    python cnfBenchmark.py --grid small                         (n = 3, 4: a few minutes on a laptop)
+    python cnfBenchmark.py --grid cluster --baseline base.json  (n = 3..5, for the cluster)
+
+The cluster grid covers the cells that lisa_analysis.py generates eagerly; its cells for n = 6, 7 are only solved
+with lazily instantiated axioms (see lazySolving.py) and are not benchmarked here."""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import time
+from satSolvers import solveCNF
+from clauseArrays import toClauses
+from instrumentation import cnfSize
+
+# the modules with their kind of ballots; the cnf* functions of the iterate modules are obtained from main
+modules = ['peerGrading', 'approvalPeerGrading', 'iteratePeerGrading', 'iterateApprovalPeerGrading', 'iterateAPGNoEmptyBallots']
+
+standardCombinations = {
+    'ranking': {'I,NU,PU': ['cnfImpartial', 'cnfNegUnanimous', 'cnfPosUnanimous'],
+                'I,A,NC': ['cnfImpartial', 'cnfAnonymous', 'cnfNonConstant']},
+    'approval': {'I,CNU,CPU': ['cnfImpartial', 'cnfCondNegUnanimous', 'cnfCondPosUnanimous'],
+                 'I,SA,NC': ['cnfImpartial', 'cnfApprovalScoreAnonymity', 'cnfNonConstant']}}
+
+grids = {'small': range(3,5), 'cluster': range(3,6)}
+
+
+def kind(module):
+    return 'ranking' if module in ['peerGrading', 'iteratePeerGrading'] else 'approval'
+
+def generators(module, n, m, k):
+    """Dictionary mapping the name of every cnf* function of module to the function, for the given n, m and k."""
+    if module.startswith('iterate'):
+        return __import__(module).main(n,m,k,None,None,None,None,generators=True)
+    mod = __import__(module)
+    mod.n, mod.m, mod.k = n, m, k
+    return {name: getattr(mod, name) for name in dir(mod) if name.startswith('cnf') and callable(getattr(mod, name))}
+
+def grid(nRange):
+    """All (n, m, k) with m, k < n, in the order of iterate."""
+    return [(n,m,k) for n in nRange for k in range(1,n) for m in range(1,n)]
+
+
+# Measurements (each in its own process)
+
+def peakRSS():
+    """Peak resident set size of this process in bytes (ru_maxrss is in kilobytes on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def worker_generate(queue, module, name, n, m, k):
+    f = generators(module, n, m, k)[name]
+    baseline = peakRSS()
+    wall, cpu = time.perf_counter(), time.process_time()
+    cnf = f()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    if cnf is None:
+        queue.put({'status': 'not implemented'})
+        return
+    queue.put({'status': 'ok', 'wall': wall, 'cpu': cpu, 'memory': peakRSS() - baseline, **cnfSize(cnf)})
+
+def worker_solve(queue, module, names, n, m, k, solver):
+    fs = generators(module, n, m, k)
+    cnf = toClauses([entry for name in names + ['cnfAtLeastK', 'cnfAtMostK'] for entry in fs[name]()])
+    result = solveCNF(cnf, solver)
+    queue.put({'status': 'ok', 'verdict': result.verdict, 'wall': result.time, 'clauses': len(cnf),
+        'stats': {key: result.stats[key] for key in ['conflicts', 'decisions', 'propagations'] if key in result.stats}})
+
+def measure(target, args, timeout):
+    """Run target(queue, *args) in a new process and return the dictionary it reports, or a status on timeout/error."""
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=target, name="benchmark", args=(queue,) + args)
+    p.start()
+    p.join(timeout)
+    if p.is_alive():
+        p.terminate()
+        p.join()
+        return {'status': 'timeout'}
+    if queue.empty():
+        return {'status': 'error', 'exitcode': p.exitcode}
+    return queue.get()
+
+
+# Running and comparing
+
+def run(nRange=grids['small'], modules=modules, timeout=600, solver='cadical153', filename='cnf_benchmark.json'):
+    """
+    Benchmark every cnf* function of the modules and solve the standard combinations for all (n, m, k) of the grid.
+    Returns (and writes to filename) a dictionary with the settings under 'meta' and a list of 'records', each holding
+    module, n, m, k, either 'axiom' (generation) or 'combination' (solving), and the measurements.
+    """
+    records = []
+    for module in modules:
+        for n, m, k in grid(nRange):
+            for name in sorted(generators(module, n, m, k)):
+                record = {'module': module, 'axiom': name, 'n': n, 'm': m, 'k': k}
+                record.update(measure(worker_generate, (module, name, n, m, k), timeout))
+                records.append(record)
+                print(record)
+            for label, names in standardCombinations[kind(module)].items():
+                record = {'module': module, 'combination': label, 'n': n, 'm': m, 'k': k}
+                record.update(measure(worker_solve, (module, names, n, m, k, solver), timeout))
+                records.append(record)
+                print(record)
+    results = {'meta': {'grid': list(nRange), 'solver': solver, 'timeout': timeout, 'python': platform.python_version(),
+        'machine': platform.node(), 'date': time.strftime("%d-%m-%Y-%H:%M:%S", time.localtime())}, 'records': records}
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=1)
+    return results
+
+def recordKey(record):
+    return (record['module'], record.get('axiom', record.get('combination')), record['n'], record['m'], record['k'])
+
+def compare(results, baseline, threshold=0.2, minSeconds=0.05):
+    """
+    Compare two benchmark results (as returned by run or read from its JSON file). Returns a list of lines describing
+    the regressions: times more than threshold (a fraction) above the baseline, ignoring times below minSeconds in
+    both, more memory by the same factor, changed clause counts and changed verdicts or statuses.
+    """
+    base = {recordKey(record): record for record in baseline['records']}
+    regressions = []
+    for record in results['records']:
+        key = recordKey(record)
+        old = base.get(key)
+        if old is None:
+            continue
+        if old.get('status') != record.get('status'):
+            regressions.append(str(key) + ': status ' + str(old.get('status')) + ' -> ' + str(record.get('status')))
+            continue
+        if old.get('verdict') != record.get('verdict'):
+            regressions.append(str(key) + ': VERDICT CHANGED ' + str(old.get('verdict')) + ' -> ' + str(record.get('verdict')))
+        if old.get('clauses') != record.get('clauses'):
+            regressions.append(str(key) + ': clauses ' + str(old.get('clauses')) + ' -> ' + str(record.get('clauses')))
+        for measurement in ['wall', 'cpu', 'memory']:
+            before, after = old.get(measurement), record.get(measurement)
+            if before is None or after is None:
+                continue
+            if measurement != 'memory' and max(before, after) < minSeconds:
+                continue
+            if after > before * (1 + threshold) and after - before > (minSeconds if measurement != 'memory' else 1 << 20):
+                regressions.append(str(key) + ': ' + measurement + ' ' + format(before, '.4g') + ' -> ' + format(after, '.4g'))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the CNF generators and solving of the peer grading modules.')
+    parser.add_argument('--grid', choices=sorted(grids), default='small')
+    parser.add_argument('--modules', nargs='+', default=modules)
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--solver', default='cadical153')
+    parser.add_argument('--output', default='cnf_benchmark.json')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    arguments = parser.parse_args()
+    results = run(grids[arguments.grid], arguments.modules, arguments.timeout, arguments.solver, arguments.output)
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            regressions = compare(results, json.load(file), arguments.threshold)
+        for line in regressions:
+            print(line)
+        print(str(len(regressions)) + ' regressions against ' + arguments.baseline)
+        raise SystemExit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,130 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Cube-and-conquer for instances that exceed the solve timeout
+
+"""An unsatisfiable cell that a single solver cannot refute in time can often be refuted piece by piece. We split the
+instance on a few winner variables into 2^d cubes (all assignments of the d variables), solve every cube under
+assumptions on all cores, and combine: the instance is satisfiable iff some cube is. Each worker keeps one incremental
+solver for all its cubes and reads the CNF from shared memory (see portfolio.py). Finished cubes are appended to a
+progress file, so a killed job resumes with the remaining cubes."""
+
+import json
+import os
+import time
+import multiprocessing
+from itertools import product
+from pysat.solvers import Solver
+from portfolio import shareCNF, attachCNF
+from domainGrowth import unanimousSeeds
+
+
+# Choosing the split variables
+
+def occurrences(cnf):
+    """Dictionary mapping every variable of cnf to the number of clauses it occurs in."""
+    counts = {}
+    for clause in cnf:
+        for lit in clause:
+            counts[abs(lit)] = counts.get(abs(lit), 0) + 1
+    return counts
+
+def unanimousVariables(n, m):
+    """The winner variables (posLiteral(r,x) = r*n + x + 1) of all agents at the unanimous profiles of unanimousSeeds."""
+    return [r * n + x + 1 for r in unanimousSeeds(n, m) for x in range(n)]
+
+def splitVariables(cnf, depth, candidates=None):
+    """
+    The depth variables to split cnf on: the candidates first, then the other variables, each by the number of clauses
+    they occur in. Variables that do not occur in cnf, e.g. because preprocessing assigned them, are skipped.
+    """
+    counts = occurrences(cnf)
+    preferred = [v for v in dict.fromkeys(candidates or []) if v in counts]
+    rest = [v for v in counts if v not in set(preferred)]
+    return (sorted(preferred, key=lambda v: -counts[v]) + sorted(rest, key=lambda v: -counts[v]))[:depth]
+
+def cubes(variables):
+    """All 2^d cubes over the variables, as lists of literals; cube c sets variable i to false iff bit i of c is set."""
+    return [[-v if sign else v for v, sign in zip(variables, signs[::-1])] for signs in product([0, 1], repeat=len(variables))]
+
+
+# Progress
+
+def loadProgress(progress, variables):
+    """Verdicts of the cubes finished in an earlier run with the same split variables, as a dictionary index -> verdict."""
+    done = {}
+    if progress is None or not os.path.exists(progress):
+        return done
+    with open(progress) as file:
+        lines = [json.loads(line) for line in file if line.strip()]
+    if len(lines) == 0 or lines[0].get('variables') != variables:
+        return done
+    for line in lines[1:]:
+        done[line['cube']] = line['verdict']
+    return done
+
+
+# Conquering
+
+workerSolver = None
+
+def initWorker(name, length, solver):
+    global workerSolver
+    workerSolver = Solver(name=solver, bootstrap_with=attachCNF(name, length))
+
+def worker_cube(job):
+    index, cube = job
+    return index, workerSolver.solve(assumptions=cube)
+
+def conquer(cnf, depth=6, candidates=None, processes=None, solver='cadical153', progress=None, timeout=None, verbose=False):
+    """
+    Decide cnf by cube-and-conquer.
+
+    Keyword arguments:
+    depth -- number of split variables, giving 2^depth cubes
+    candidates -- variables to split on first (e.g. unanimousVariables(n, m)), see splitVariables
+    processes -- number of worker processes, all cores by default
+    solver -- name of the incremental PySAT solver used by the workers
+    progress -- file recording the finished cubes; an existing file for the same split variables is resumed
+    timeout -- seconds after which the remaining cubes are given up (None waits for all of them)
+
+    Returns a pair (verdict, stats): verdict is True if some cube is satisfiable, False if all cubes are unsatisfiable
+    and None if the timeout was hit first; stats counts the cubes.
+    """
+    variables = splitVariables(cnf, depth, candidates)
+    allCubes = cubes(variables)
+    done = loadProgress(progress, variables)
+    if progress is not None and len(done) == 0:
+        with open(progress, 'w') as file:
+            file.write(json.dumps({'variables': variables}) + '\n')
+    stats = {'cubes': len(allCubes), 'resumed': len(done)}
+    if True in done.values():
+        return True, stats
+    jobs = [(c, cube) for c, cube in enumerate(allCubes) if c not in done]
+    block, length = shareCNF(cnf)
+    pool = multiprocessing.Pool(processes, initializer=initWorker, initargs=(block.name, length, solver))
+    verdict = False
+    try:
+        results = pool.imap_unordered(worker_cube, jobs)
+        deadline = None if timeout is None else time.time() + timeout
+        for _ in jobs:
+            try:
+                index, satisfiable = results.next(None if deadline is None else max(deadline - time.time(), 0))
+            except multiprocessing.TimeoutError:
+                verdict = None
+                break
+            done[index] = satisfiable
+            if progress is not None:
+                with open(progress, 'a') as file:
+                    file.write(json.dumps({'cube': index, 'verdict': satisfiable}) + '\n')
+            if verbose:
+                print('cube ' + str(index) + ': ' + ('SAT' if satisfiable else 'UNSAT') + ' (' + str(len(done)) + '/' + str(len(allCubes)) + ')')
+            if satisfiable:
+                verdict = True
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+        block.close()
+        block.unlink()
+    stats['solved'] = len(done)
+    return verdict, stats
@@ -0,0 +1,241 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Impossibility search on a growing subset of profiles
+
+"""At n >= 6 the set of all profiles cannot even be iterated. Restricting every axiom to a subset of profiles gives a
+relaxation of the full CNF, so if the restricted CNF is unsatisfiable the axioms are incompatible on all profiles.
+We start from a few seed profiles (e.g. unanimous ones) and add layer after layer of neighbours (i-variants, which
+also cover the j-variants used by monotonicity, and permutations of the ballots), until the SAT solver proves
+unsatisfiability or the budget is exhausted.
+
+Profiles are stored by their global index only in a dictionary that hands out a dense local numbering, so memory
+depends on the explored subset only. Axioms that ask for the existence of some profile (cnfNoExclusion,
+cnfNonConstant, cnfNondictatorial) get an extra literal standing for the profiles that have not been explored yet."""
+
+from itertools import combinations
+from pysat.solvers import Solver
+from profileCodec import numRankingBallots, rankingBallots, rankingBallotIndex, rankingTransitions
+
+universalAxioms = ['cnfAtLeastOne','cnfAtMostK','cnfAtLeastK','cnfImpartial','cnfMonotonous','cnfAnonymous',
+    'cnfPosUnanimous','cnfNegUnanimous']
+existentialAxioms = ['cnfNoExclusion','cnfNonConstant','cnfNondictatorial']
+
+
+# Profiles given by their global index
+
+def digits(r, n, m):
+    base = numRankingBallots(n, m)
+    return [(r // base**i) % base for i in range(n)]
+
+def profile(digits, n, m):
+    base = numRankingBallots(n, m)
+    return sum(d * base**i for i, d in enumerate(digits))
+
+def preflists(r, n, m):
+    return [rankingBallots(n, m, i)[d] for i, d in enumerate(digits(r, n, m))]
+
+def iVariants(i, r, n, m):
+    """All i-variants of r (including r itself)."""
+    base = numRankingBallots(n, m)
+    d = digits(r, n, m)[i]
+    return [r + (b - d) * base**i for b in range(base)]
+
+def vPermutations(r, n, m):
+    """All profiles that contain the same rankings as r, submitted by different voters (including r itself)."""
+    result = []
+    def assign(voter, remaining, ballots):
+        if voter == n:
+            result.append(profile([rankingBallotIndex(n, m, i)[b] for i, b in enumerate(ballots)], n, m))
+            return
+        for ranking in sorted(set(remaining)):
+            if voter not in ranking:
+                rest = list(remaining)
+                rest.remove(ranking)
+                assign(voter + 1, rest, ballots + [ranking])
+    assign(0, sorted(preflists(r, n, m)), [])
+    return result
+
+def unanimousSeeds(n, m):
+    """For every agent i the profile in which all other voters submit their first ballot with i on top (and i her first ballot)."""
+    seeds = []
+    for i in range(n):
+        seeds.append(profile([next(b for b, ballot in enumerate(rankingBallots(n, m, j)) if ballot[0] == i) if j != i else 0 \
+            for j in range(n)], n, m))
+    return seeds
+
+
+# Search
+
+def growDomain(n, m, k, axioms, seeds=None, maxDepth=None, maxProfiles=100000, solver='cadical153', core=False, verbose=False):
+    """
+    Search for an impossibility on a growing set of profiles.
+
+    Keyword arguments:
+    n, m, k -- parameters as in peerGrading.py
+    axioms -- names of the cnf functions to restrict, including the outcome size constraints (e.g. 'cnfAtMostK')
+    seeds -- global indices of the profiles to start from, unanimousSeeds(n, m) by default
+    maxDepth -- maximal number of layers of neighbours added around the seeds (0 restricts the axioms to the seeds)
+    maxProfiles -- budget on the number of explored profiles
+    core -- on unsatisfiability, return only the explored profiles occurring in an unsat core; the existential axioms
+            then never count as complete, so that the axioms restricted to the core alone are unsatisfiable
+
+    Returns a triple (verdict, profiles, stats): verdict is False if the axioms are unsatisfiable on the explored profiles
+    (and hence on all profiles), True if they are satisfiable on all profiles and None if the budget or maxDepth was
+    hit first. profiles lists the global indices of the explored profiles (or of the core).
+    """
+    for x in axioms:
+        if x not in universalAxioms + existentialAxioms:
+            raise ValueError(x + ' cannot be restricted to a subset of profiles')
+    base = numRankingBallots(n, m)
+    transitions = [rankingTransitions(n, m, j) for j in range(n)]
+    # reverse transitions: for voter j and ballot b2 the pairs (b, i) such that b2 is a transition of b for agent i
+    predecessors = [[[] for b in range(base)] for j in range(n)]
+    for j in range(n):
+        for b, edges in enumerate(transitions[j]):
+            for i, targets in edges.items():
+                for b2 in targets:
+                    predecessors[j][b2].append((b, i))
+
+    # Dense local numbering of the explored profiles. The n winner variables of a profile are allocated when it is
+    # added, interleaved with the variables standing for unexplored profiles and the selector literals.
+    local = {}
+    explored = []
+    firstVar = []
+    selectors = []
+    numVars = [0]
+    s = Solver(name=solver)
+
+    def newVar():
+        numVars[0] += 1
+        return numVars[0]
+
+    def literal(r, x):
+        return firstVar[local[r]] + x
+
+    def addClause(clause, profiles):
+        # with core every instance is guarded by the selector literals of its profiles
+        if core:
+            clause = clause + [-selectors[local[r]] for r in set(profiles)]
+        s.add_clause(clause)
+
+    def add(r):
+        """Add the profile r together with all instances relating it to the profiles already explored."""
+        local[r] = len(explored)
+        explored.append(r)
+        firstVar.append(numVars[0] + 1)
+        numVars[0] += n
+        if core:
+            selectors.append(newVar())
+        lit = literal
+        ballots = preflists(r, n, m)
+        others = lambda i: [ballots[j] for j in range(n) if j != i]
+
+        if 'cnfAtLeastOne' in axioms:
+            addClause([lit(r,x) for x in range(n)], [r])
+        if 'cnfAtMostK' in axioms:
+            for c in combinations(range(n),k+1):
+                addClause([-lit(r,x) for x in c], [r])
+        if 'cnfAtLeastK' in axioms:
+            for c in combinations(range(n),n-k+1):
+                addClause([lit(r,x) for x in c], [r])
+        if 'cnfPosUnanimous' in axioms:
+            for i in range(n):
+                if all(ballot[0] == i for ballot in others(i)):
+                    addClause([lit(r,i)], [r])
+        if 'cnfNegUnanimous' in axioms:
+            for i in range(n):
+                if m == n-1 and all(ballot[m-1] == i for ballot in others(i)):
+                    addClause([-lit(r,i)], [r])
+                elif m != n-1 and all(i not in ballot for ballot in others(i)):
+                    for j in sorted(set(x for ballot in ballots for x in ballot)):
+                        addClause([-lit(r,i), lit(r,j)], [r])
+        if 'cnfImpartial' in axioms:
+            for i in range(n):
+                for r2 in iVariants(i, r, n, m):
+                    if r2 != r and r2 in local:
+                        addClause([-lit(r,i), lit(r2,i)], [r,r2])
+                        addClause([-lit(r2,i), lit(r,i)], [r,r2])
+        if 'cnfMonotonous' in axioms:
+            d = digits(r, n, m)
+            for j in range(n):
+                for i, targets in transitions[j][d[j]].items():
+                    for b2 in targets:
+                        r2 = r + (b2 - d[j]) * base**j
+                        if r2 in local:
+                            addClause([-lit(r,i), lit(r2,i)], [r,r2])
+                for b, i in predecessors[j][d[j]]:
+                    r0 = r + (b - d[j]) * base**j
+                    if r0 in local:
+                        addClause([-lit(r0,i), lit(r,i)], [r0,r])
+        if 'cnfAnonymous' in axioms:
+            for r2 in set(vPermutations(r, n, m)):
+                if r2 != r and r2 in local:
+                    for x in range(n):
+                        addClause([-lit(r,x), lit(r2,x)], [r,r2])
+                        addClause([lit(r,x), -lit(r2,x)], [r,r2])
+
+    def solve(complete):
+        """
+        Solve the axioms restricted to the explored profiles. The existential axioms are added anew, guarded by a
+        fresh selector, and unless complete is True they may also be satisfied by the unexplored profiles.
+        """
+        selector = newVar()
+        def existential(clause):
+            if not complete:
+                clause = clause + [newVar()]
+            s.add_clause(clause + [-selector])
+        if 'cnfNoExclusion' in axioms:
+            for i in range(n):
+                existential([literal(r,i) for r in explored])
+        if 'cnfNonConstant' in axioms:
+            for c in combinations(range(n),k):
+                existential([-literal(r,v) for r in explored for v in c])
+        if 'cnfNondictatorial' in axioms:
+            for i in range(n):
+                existential([-literal(r,j) for r in explored for j in range(n) if j == i or j in preflists(r, n, m)[i][:k-1]])
+        return s.solve(assumptions=[selector] + selectors)
+
+    def neighbours(r):
+        # the i-variants connect all profiles, so the search eventually covers everything
+        result = []
+        for i in range(n):
+            result.extend(iVariants(i, r, n, m))
+        if 'cnfAnonymous' in axioms:
+            result.extend(vPermutations(r, n, m))
+        return result
+
+    frontier = list(dict.fromkeys(unanimousSeeds(n, m) if seeds is None else seeds))[:maxProfiles]
+    depth = 0
+    stats = {'layers': []}
+    try:
+        while True:
+            for r in frontier:
+                if r not in local:
+                    add(r)
+            layer = []
+            if maxDepth is None or depth < maxDepth:
+                layer = list(dict.fromkeys(r2 for r in frontier for r2 in neighbours(r) if r2 not in local))
+            complete = len(explored) == base**n
+            satisfiable = solve(complete and not core)
+            stats['layers'].append(len(explored))
+            if verbose:
+                print('depth ' + str(depth) + ': ' + str(len(explored)) + ' profiles, ' + ('SAT' if satisfiable else 'UNSAT'))
+            if not satisfiable:
+                if core:
+                    coreSelectors = set(s.get_core())
+                    return False, [r for r in explored if selectors[local[r]] in coreSelectors], stats
+                return False, explored, stats
+            if complete and not core:
+                return True, explored, stats
+            if len(layer) == 0 or len(explored) >= maxProfiles:
+                return None, explored, stats
+            frontier = layer[:maxProfiles - len(explored)]
+            depth += 1
+    finally:
+        s.delete()
+
+
+if __name__ == "__main__":
+    # Holzman-Moulin impossibility (I, NU, PU) for n=6, starting from the unanimous profiles
+    print(growDomain(6, 1, 2, ['cnfAtLeastK','cnfAtMostK','cnfImpartial','cnfNegUnanimous','cnfPosUnanimous'], verbose=True)[0])
+    print(growDomain(6, 2, 1, ['cnfAtLeastK','cnfAtMostK','cnfImpartial','cnfNegUnanimous','cnfPosUnanimous'], verbose=True)[0])
@@ -0,0 +1,103 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Lifting impossibilities from n to n+1 voters
+
+"""If the axioms restricted to a set of profiles (an unsat core, see domainGrowth.py) are unsatisfiable for n voters,
+we can try to show the same for n+1 voters by embedding the core: every voter keeps her ranking and a dummy voter n
+is added whose ballot is the same within every class of i-variants of the core, so that i-variants stay i-variants.
+If the axioms restricted to the embedded profiles are unsatisfiable, the impossibility holds for n+1 voters as well,
+which only needs a SAT call on a few profiles instead of the full instance."""
+
+from itertools import combinations, product, islice
+from profileCodec import rankingBallots, rankingBallotIndex
+from domainGrowth import growDomain, digits, preflists, profile
+
+
+def embed(r, n, m, dummyBallot):
+    """
+    Embed the profile r for n voters into the profiles for n+1 voters, in which voter n submits dummyBallot
+    (a ranking of m of the agents 0,...,n-1) and the other voters keep their rankings.
+    """
+    ballots = preflists(r, n, m) + [tuple(dummyBallot)]
+    return profile([rankingBallotIndex(n+1, m, i)[ballot] for i, ballot in enumerate(ballots)], n+1, m)
+
+def dummyBallots(n, m):
+    """All ballots the dummy voter n can submit in the setting with n+1 voters."""
+    return rankingBallots(n+1, m, n)
+
+def components(core, n, m):
+    """
+    Partition core into the classes of profiles connected by i-variant relations. Within a class the dummy voter has to
+    submit the same ballot, otherwise the embedded profiles would no longer be i-variants of each other.
+    """
+    parent = {r: r for r in core}
+    def find(r):
+        while parent[r] != r:
+            r = parent[r]
+        return r
+    for r1, r2 in combinations(core, 2):
+        d1, d2 = digits(r1, n, m), digits(r2, n, m)
+        if sum(a != b for a, b in zip(d1, d2)) <= 1:
+            parent[find(r1)] = find(r2)
+    classes = {}
+    for r in core:
+        classes.setdefault(find(r), []).append(r)
+    return list(classes.values())
+
+def embeddings(core, n, m, maxEmbeddings=1000):
+    """
+    Candidate embeddings of core into the setting with n+1 voters: every assignment of a dummy ballot to the classes of
+    components(core, n, m) (at most maxEmbeddings of them), followed by the union of all embeddings of all profiles.
+    Yields pairs (description, profiles).
+    """
+    classes = components(core, n, m)
+    for assignment in islice(product(dummyBallots(n, m), repeat=len(classes)), maxEmbeddings):
+        yield assignment, [embed(r, n, m, ballot) for c, ballot in zip(classes, assignment) for r in c]
+    yield 'all dummy ballots', [embed(r, n, m, ballot) for r in core for ballot in dummyBallots(n, m)]
+
+def liftCore(core, n, m, k, axioms, depth=0, maxEmbeddings=1000, solver='cadical153', verbose=False):
+    """
+    Try the embeddings of the profiles in core (for n voters) into the setting with n+1 voters.
+
+    Keyword arguments:
+    core -- global indices of profiles on which the axioms are unsatisfiable for n voters
+    axioms -- names of the cnf functions as accepted by domainGrowth.growDomain
+    depth -- number of layers of neighbours added around the embedded profiles before solving (0 checks the embedded
+             core itself)
+    maxEmbeddings -- maximal number of dummy ballot assignments tried
+
+    Returns a pair (embedding, profiles) for the first embedding under which the axioms are unsatisfiable for n+1
+    voters, where profiles is an unsat core of the embedded instance, or None if no embedding works.
+    """
+    for embedding, seeds in embeddings(core, n, m, maxEmbeddings):
+        verdict, profiles, stats = growDomain(n+1, m, k, axioms, seeds=seeds, maxDepth=depth, solver=solver, core=True)
+        if verbose:
+            print(str(embedding) + ': ' + ('UNSAT' if verdict == False else 'not refuted') + ' on ' + str(stats['layers'][-1]) + ' profiles')
+        if verdict == False:
+            return embedding, profiles
+    return None
+
+def liftImpossibility(n, m, k, axioms, nMax, depth=0, maxProfiles=100000, solver='cadical153', verbose=False):
+    """
+    Find an unsat core of the axioms for n voters with domainGrowth.growDomain and lift it step by step up to nMax voters.
+    Returns a dictionary mapping every number of voters for which the impossibility was established to its unsat core.
+    """
+    verdict, core, stats = growDomain(n, m, k, axioms, maxProfiles=maxProfiles, solver=solver, core=True)
+    if verdict != False:
+        return {}
+    cores = {n: core}
+    for n in range(n, nMax):
+        lifted = liftCore(core, n, m, k, axioms, depth, solver=solver, verbose=verbose)
+        if lifted is None:
+            break
+        embedding, core = lifted
+        cores[n+1] = core
+        if verbose:
+            print('lifted to n=' + str(n+1) + ' with dummy ballots ' + str(embedding) + ', core of ' + str(len(core)) + ' profiles')
+    return cores
+
+
+if __name__ == "__main__":
+    # impartiality, anonymity and positive unanimity for k=1, lifted from n=3 up to n=6
+    cores = liftImpossibility(3, 1, 1, ['cnfAtLeastK','cnfAtMostK','cnfImpartial','cnfAnonymous','cnfPosUnanimous'], 6, verbose=True)
+    print('impossible for n in ' + str(sorted(cores)))
@@ -0,0 +1,142 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Structured instrumentation events and their summary
+
+"""iteratePeerGrading.main records every phase of a run as one JSON object per line in an events file: the ballot
+tables, the generation of every axiom (in its child process), the transport of the CNF to the parent, preprocessing,
+every solve and every timeout. Each event carries the run, n, m, k, the wall-clock and CPU seconds and the peak
+resident set size of the process doing the work, plus clause and variable counts and solver statistics where they
+apply. summarize aggregates the events of a run into a table per axiom and a table per (n, m, k):
+
+    python instrumentation.py events.jsonl [run]"""
+
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from clauseArrays import numClauses, numVariables
+
+
+def newRun():
+    """Identifier of a run: start time and process id."""
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime()) + '-' + str(os.getpid())
+
+def peakRSS():
+    """Peak resident set size of this process in bytes (ru_maxrss is in kilobytes on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def cnfSize(cnf):
+    """Number of clauses and variables of cnf, whose entries may be clause arrays (see clauseArrays.py)."""
+    return {'clauses': numClauses(cnf), 'variables': numVariables(cnf)}
+
+def solverStats(stats):
+    """The conflicts, decisions and propagations among the statistics a backend reports (see satSolvers.SolverResult)."""
+    return {key: stats[key] for key in ['conflicts', 'decisions', 'propagations'] if key in stats}
+
+def emit(filename, event, **fields):
+    """Append the event with the given fields to the events file (nothing if filename is None)."""
+    if filename is None:
+        return
+    record = {'event': event, 'time': time.time(), 'pid': os.getpid()}
+    record.update(fields)
+    # a single write of one line, so that events of concurrent processes do not interleave
+    with open(filename, 'a') as file:
+        file.write(json.dumps(record, default=str) + '\n')
+
+@contextmanager
+def phase(filename, event, **fields):
+    """
+    Measure the enclosed block and emit it as an event with its wall-clock and CPU seconds and the peak RSS of this
+    process. The block can add fields (e.g. clause counts) to the dictionary it receives.
+    """
+    extra = {}
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield extra
+    finally:
+        fields.update(extra)
+        emit(filename, event, wall=time.perf_counter() - wall, cpu=time.process_time() - cpu, rss=peakRSS(), **fields)
+
+
+# Summary
+
+def loadEvents(filename, run=None):
+    """The events of the given run (the last run in the file by default)."""
+    with open(filename) as file:
+        events = [json.loads(line) for line in file if line.strip()]
+    if run is None and len(events) > 0:
+        run = events[-1].get('run')
+    return [e for e in events if e.get('run') == run]
+
+# for every events file and run the bytes read so far and the (n, m, k) in which a generation or solve timed out or failed
+timeouts = {}
+
+def timedOut(filename, run, n, m, k):
+    """
+    Whether a generation or solve of the run for n, m, k timed out or failed (False if there is no events file). Only the events
+    appended since the last call for the same file and run are read.
+    """
+    if filename is None or not os.path.exists(filename):
+        return False
+    state = timeouts.setdefault((filename, run), [0, set()])
+    with open(filename, 'rb') as file:
+        file.seek(state[0])
+        data = file.read()
+    # a line still being written by another process is read by the next call
+    complete = data[:data.rfind(b'\n') + 1]
+    state[0] += len(complete)
+    for line in complete.splitlines():
+        if not line.strip():
+            continue
+        e = json.loads(line)
+        if e['event'] in ['timeout', 'error'] and e.get('run') == run:
+            state[1].add((e['n'], e['m'], e['k']))
+    return (n, m, k) in state[1]
+
+def table(rows, columns):
+    """Format rows (lists of values) under the given column titles, aligned."""
+    cells = [columns] + [[format(v, '.3f') if isinstance(v, float) else str(v) for v in row] for row in rows]
+    widths = [max(len(row[c]) for row in cells) for c in range(len(columns))]
+    return '\n'.join('  '.join(row[c].ljust(widths[c]) for c in range(len(columns))) for row in cells)
+
+def summarize(events):
+    """
+    Aggregate events into two tables: per axiom the generations, their total and maximal wall time, the maximal peak RSS
+    (MB) and the maximal number of clauses; per (n, m, k) the wall time spent in each phase and the number of solves
+    and timeouts.
+    """
+    axioms = {}
+    for e in events:
+        if e['event'] == 'generate':
+            a = axioms.setdefault(e['axiom'], [0, 0.0, 0.0, 0, 0])
+            a[0] += 1
+            a[1] += e['wall']
+            a[2] = max(a[2], e['wall'])
+            a[3] = max(a[3], e['rss'] // 2**20)
+            a[4] = max(a[4], e.get('clauses', 0))
+    cells = {}
+    phases = ['ballots', 'generate', 'transport', 'preprocess', 'solve']
+    for e in events:
+        if 'n' not in e:
+            continue
+        c = cells.setdefault((e['n'], e['m'], e['k']), {p: 0.0 for p in phases + ['solves', 'timeouts']})
+        if e['event'] in phases:
+            c[e['event']] += e.get('wall', 0.0)
+        if e['event'] == 'solve':
+            c['solves'] += 1
+        if e['event'] == 'timeout':
+            c['timeouts'] += 1
+    perAxiom = table([[name] + a for name, a in sorted(axioms.items())], ['axiom', 'runs', 'total s', 'max s', 'max MB', 'max clauses'])
+    perCell = table([[str(key)] + [c[p] for p in phases] + [int(c['solves']), int(c['timeouts'])] for key, c in sorted(cells.items())],
+        ['n,m,k'] + [p + ' s' for p in phases] + ['solves', 'timeouts'])
+    return perAxiom, perCell
+
+
+if __name__ == "__main__":
+    events = loadEvents(sys.argv[1] if len(sys.argv) > 1 else 'events.jsonl', sys.argv[2] if len(sys.argv) > 2 else None)
+    perAxiom, perCell = summarize(events)
+    print(perAxiom)
+    print()
+    print(perCell)
@@ -5,11 +5,23 @@
 """File for running sat instances over multiple combinations of parameters in one go."""
 
 
-from pylgl import solve, itersolve
 from math import factorial,comb
 from itertools import combinations,permutations,product,chain
+from preprocessing import decide
+import numpy as np
+from clauseArrays import profileClauses, spanningClauses, winnerLiterals, literalClauses, maskPairs, toClauses
+from profileCodec import approvalBallots, approvalTransitions, ballotMasks, profilesWithBallots, supportMasks, completeMasks, transitionArrays
+import time
+from instrumentation import newRun
+import resultsStore
+import verdictCache
 
-def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
+# version of the encoding of the axioms; increase it whenever a cnf* function changes, so that stored results are recomputed
+encodingVersion = 1
+
+defaultOutSizeLabels = ["0< <=K","<=K","=K"]
+
+def main(n,m,k,ax,axLabels,outSize,outSizeLabels,solver='pylgl',generators=False,cache=None):
 
     ## BASICS ######################################################
 
@@ -88,30 +100,19 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
 
     def cnfAtLeastOne():
         """The outcome contains at least one voter."""
-        cnf = []
-        for r in allApprovalProfiles():
-            cnf.append([posLiteral(r,x) for x in allVoters()])
-        return cnf    
+        return [profileClauses([[posLiteral(0,x) for x in allVoters()]], len(allApprovalProfiles()), n)]
         
     def cnfAtMostK():
         """At most k agents will be selected. 
         It must be the case that k<n, else the cnf will be empty and unsatisfiable."""
-        cnf = []
         # For each profile, in any selection of k+1 agents, at least one must be a loser.
-        for r in allApprovalProfiles():
-            for combo in list(combinations(allVoters(),k+1)):
-                cnf.append([negLiteral(r,i) for i in combo])
-        return cnf
+        return [profileClauses([[negLiteral(0,i) for i in combo] for combo in combinations(allVoters(),k+1)], len(allApprovalProfiles()), n)]
 
     def cnfAtLeastK():
         """At least k agents will be selected."""
-        cnf = []
         # For any profile, there can never be n-k+1 (or more) losers (for then there would be at most k-1 winners)
         # i.e., any set of n-k+1 voters, there has to be at least one winnner
-        for r in allApprovalProfiles():
-            for combo in list(combinations(allVoters(),n-k+1)):
-                cnf.append([posLiteral(r,i) for i in combo])
-        return cnf
+        return [profileClauses([[posLiteral(0,i) for i in combo] for combo in combinations(allVoters(),n-k+1)], len(allApprovalProfiles()), n)]
 
     # Impartiality
 
@@ -138,22 +139,28 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
         """No one with incomplete support is elected while someone with complete support is not.
         In other words for any two agents i and j, where the former has complete support and the latter does not,
         if i is not elected, then neither is j."""
-        cnf = []
-        for r in allApprovalProfiles():
-            for i in voters(lambda v: completeApproval(r,v)):
-                for j in voters(lambda v: not completeApproval(r,v)):
-                    cnf.append([posLiteral(r,i),negLiteral(r,j)])
-        return cnf
+        base = numPossibleBallots()
+        ballots = [approvalBallots(n,m,j,1) for j in allVoters()]
+        masks = [ballotMasks(ballots[j]) for j in allVoters()]
+        # Generate only the profiles in which some agent i has complete support, i.e. voter i is free and all other voters approve of i.
+        fullySupportedProfilesOf = lambda i: profilesWithBallots([[b for b in range(base) if j == i or i in ballots[j][b]] for j in allVoters()], base)
+        completeProfiles = np.unique(np.concatenate([fullySupportedProfilesOf(i) for i in allVoters()]))
+        complete = completeMasks(completeProfiles, masks, base)
+        r, i, j = maskPairs(completeProfiles, complete, ~complete & ((1 << n) - 1), n)
+        return [literalClauses(winnerLiterals(r, i, n), -winnerLiterals(r, j, n))]
 
     def cnfCondNegUnanimous():
         """If some agent with no support is elected, then everyone with at least one vote is elected as well.
         I.e., if any voter with positive support is not elected then every agent with no support is not elected."""
-        cnf = []
-        for r in allApprovalProfiles():
-            for i in voters(lambda v: positiveApproval(r,v)):
-                for j in voters(lambda v: not positiveApproval(r,v)):
-                    cnf.append([posLiteral(r,i),negLiteral(r,j)])
-        return cnf
+        base = numPossibleBallots()
+        ballots = [approvalBallots(n,m,j,1) for j in allVoters()]
+        masks = [ballotMasks(ballots[j]) for j in allVoters()]
+        # Generate only the profiles in which some agent j has no support, i.e. voter j is free and no other voter approves of j.
+        unsupportedProfilesOf = lambda j: profilesWithBallots([[b for b in range(base) if i == j or j not in ballots[i][b]] for i in allVoters()], base)
+        unsupportedProfiles = np.unique(np.concatenate([unsupportedProfilesOf(j) for j in allVoters()]))
+        support = supportMasks(unsupportedProfiles, masks, base)
+        r, i, j = maskPairs(unsupportedProfiles, support, ~support & ((1 << n) - 1), n)
+        return [literalClauses(winnerLiterals(r, i, n), -winnerLiterals(r, j, n))]
 
     def cnfNewUnanimity():
         """The agents with maximal approval scores are elected. There is no one who is elected while there is an agent with a higher approval
@@ -171,25 +178,17 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
         """For any voter i, if i is elected in r1 and r1 and r2 are j-variants, then if j does not approve of i in r1,
         and j approves of i in r2 besides or instead of some of the approved voters in r1,
         then i should be among the winners in r2."""
-        cnf = []
-        for i in allVoters():
-            for r1 in allApprovalProfiles():
-                # Consider only those voters that don't approve of i in r1
-                for j in voters(lambda l: l != i and not approves(l,i,r1)):
-                    # Consider only those j-variants of r1 in which j adds an extra approval of i or approves of i instead of some other agent.
-                    for r2 in approvalProfiles(lambda r: iVariants(j,r1,r) and approves(j,i,r) and len(approvalSet(j,r))>=len(approvalSet(j,r1)) and all(elem in approvalSet(j,r1) for elem in approvalSet(j,r) if elem != i)):
-                        # If i wins in r1, i should win in r2
-                        cnf.append([negLiteral(r1,i),posLiteral(r2,i)])
-        return cnf
+        transitions = [approvalTransitions(n,m,j,1) for j in allVoters()]
+        # r2 is the j-variant of r1 in which j approves of i besides or instead of some of the agents approved in r1
+        # If i wins in r1, i should win in r2
+        return [np.concatenate([literalClauses(-winnerLiterals(r1, i, n), winnerLiterals(r2, i, n))
+            for r1, i, r2 in transitionArrays(transitions, numPossibleBallots())])]
 
     # Surjectivity/non-imposition
 
     def cnfNoExclusion():
         """Every voter gets selected in some profile."""
-        cnf = []
-        for i in allVoters():
-            cnf.append([posLiteral(r,i) for r in allApprovalProfiles()])
-        return cnf
+        return [spanningClauses([[posLiteral(0,i)] for i in allVoters()], len(allApprovalProfiles()), n)]
 
     # Non-constantness
 
@@ -199,10 +198,7 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
         Note: saying that each agent should lose in some profile is a stronger requirement, for it is possible that the same 
         agent gets elected in every profile even though not all profiles have an identical outcome. 
         Also: only applicable when outcome is of size exactly k."""
-        cnf = []
-        for c in list(combinations(allVoters(),k)):
-            cnf.append([negLiteral(r,v) for r in allApprovalProfiles() for v in c])
-        return cnf
+        return [spanningClauses([[negLiteral(0,v) for v in c] for c in combinations(allVoters(),k)], len(allApprovalProfiles()), n)]
 
     # Anonymity
 
@@ -230,6 +226,9 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
                     cnf.extend([[negLiteral(r1,i),posLiteral(r2,i)],[posLiteral(r1,i),negLiteral(r2,i)]])
         return cnf
 
+    if generators == True: #only hand out the CNF generators, e.g. to benchmark them (see cnfBenchmark.py)
+        return {name: f for name, f in locals().items() if name.startswith('cnf')}
+
     ## SAT-solving #################################################################################
     
     # # SAT-solving for general framework (less efficient for only Holzamn impossibilities)
@@ -282,26 +281,42 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels):
     cnf_non_constant = cnfNonConstant()
     cnf_condnegunanimous = cnfCondNegUnanimous()
     cnf_condposunanimous = cnfCondPosUnanimous()
+
+    # verdicts of identical CNFs found before, in this or another module (see verdictCache.py)
+    verdicts = verdictCache.load(cache)
+
+    def satisfiable(cnf, label):
+        """Return 'True' or 'False', marked if unit and pure literal propagation decided the instance without the solver
+        or if the verdict of an identical CNF was cached."""
+        cnf = toClauses(cnf)
+        key = verdictCache.canonicalHash(cnf) if cache is not None else None
+        if key in verdicts:
+            return str(verdicts[key]['verdict']) + ' [cached from ' + verdicts[key]['label'] + ']'
+        verdict, preprocessed = decide(cnf, solver)
+        verdictCache.record(cache,verdicts,key,verdict,label=label,n=n,m=m,k=k,module='iterateAPGNoEmptyBallots',
+            source='preprocessing' if preprocessed else solver)
+        return str(verdict) + (' [preprocessing]' if preprocessed else '')
+
     # Initialize list of results
     results = []
     # Check that all axioms are satisfiable.
-    results.append('INDIVIDUAL AXIOMS\n\tI: ' + str(isinstance(solve(cnf_exactly_k+cnf_impartial),list)))
-    results.append('\tstrong-A: ' + str(isinstance(solve(cnf_exactly_k+cnf_strong_anonymous),list)))
-    results.append('\tNC: ' + str(isinstance(solve(cnf_exactly_k+cnf_non_constant),list)))
-    results.append('\tCNU: ' + str(isinstance(solve(cnf_exactly_k+cnf_condnegunanimous),list)))
-    results.append('\tCPU: ' + str(isinstance(solve(cnf_exactly_k+cnf_condposunanimous),list)))
+    results.append('INDIVIDUAL AXIOMS\n\tI: ' + satisfiable(cnf_exactly_k+cnf_impartial, 'I =K'))
+    results.append('\tstrong-A: ' + satisfiable(cnf_exactly_k+cnf_strong_anonymous, 'strong-A =K'))
+    results.append('\tNC: ' + satisfiable(cnf_exactly_k+cnf_non_constant, 'NC =K'))
+    results.append('\tCNU: ' + satisfiable(cnf_exactly_k+cnf_condnegunanimous, 'CNU =K'))
+    results.append('\tCPU: ' + satisfiable(cnf_exactly_k+cnf_condposunanimous, 'CPU =K'))
     # Check subsets of theorem 3
-    results.append('THEOREM 3\n\tI, strong-A: ' + str(isinstance(solve(cnf_exactly_k+cnf_impartial+cnf_strong_anonymous),list)))
-    results.append('\tI, NC: ' + str(isinstance(solve(cnf_exactly_k+cnf_impartial+cnf_non_constant),list)))
-    results.append('\tstrong-A, NC: ' + str(isinstance(solve(cnf_exactly_k+cnf_strong_anonymous+cnf_non_constant),list)))
+    results.append('THEOREM 3\n\tI, strong-A: ' + satisfiable(cnf_exactly_k+cnf_impartial+cnf_strong_anonymous, 'I, strong-A =K'))
+    results.append('\tI, NC: ' + satisfiable(cnf_exactly_k+cnf_impartial+cnf_non_constant, 'I, NC =K'))
+    results.append('\tstrong-A, NC: ' + satisfiable(cnf_exactly_k+cnf_strong_anonymous+cnf_non_constant, 'strong-A, NC =K'))
     # Check subsets of theorem 4
-    results.append('THEOREM 4\n\tI, CNU: ' + str(isinstance(solve(cnf_exactly_k+cnf_impartial+cnf_condnegunanimous),list)))
-    results.append('\tI, CPU: ' + str(isinstance(solve(cnf_exactly_k+cnf_impartial+cnf_condposunanimous),list)))
-    results.append('\tCNU, CPU: ' + str(isinstance(solve(cnf_exactly_k+cnf_condnegunanimous+cnf_condposunanimous),list)))
+    results.append('THEOREM 4\n\tI, CNU: ' + satisfiable(cnf_exactly_k+cnf_impartial+cnf_condnegunanimous, 'I, CNU =K'))
+    results.append('\tI, CPU: ' + satisfiable(cnf_exactly_k+cnf_impartial+cnf_condposunanimous, 'I, CPU =K'))
+    results.append('\tCNU, CPU: ' + satisfiable(cnf_exactly_k+cnf_condnegunanimous+cnf_condposunanimous, 'CNU, CPU =K'))
 
     return results
 
-def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLabels=False,filename="approval_results_no_empty_ballots.txt"):
+def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLabels=False,filename="approval_results_no_empty_ballots.txt",solver='pylgl',store=None,cache=None):
     """
     Iterate the peer grading SAT solving for multiple values of n, m, k, different combinations of axioms 
     and different allowed sizes of the outcome set.
@@ -315,6 +330,11 @@ def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLa
     outSize -- list of strings, each containing python code to generate CNF which specify the size of the outcome set
     outSizeLabels -- list of labels identifying the CNFs in outSize
     filename -- string containing file name to write results into
+    solver -- SAT solver backend, see satSolvers.solveCNF
+    store -- results store (see resultsStore.py): complete cells of the sweep found there are not recomputed, and every
+             computed cell is appended to it
+    cache -- verdict cache (see verdictCache.py), by default next to the store if there is one: instances whose CNF was
+             decided before, under any label, module or run, are not solved again
     """
     # default ranges for m and k
     if mRange == False:
@@ -323,6 +343,10 @@ def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLa
         kRange = range(1,max(nRange))
     
     count = 0
+    run = newRun()
+    stored = resultsStore.completedCells(resultsStore.load(store)) if store is not None else {}
+    if cache is None and store is not None:
+        cache = verdictCache.cacheFile(store)
     
     # Consider all combinations of parameters n, k, and m (but consider only values for k and m that are smaller than n)
     for n in nRange:
@@ -337,8 +361,20 @@ def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLa
                 # write what parameters are being considered
                 file.write(str(n)+','+str(m)+','+str(k)+':\n')   
                 print(str(n)+','+str(m)+','+str(k)+': ')                
+                # take the results from the store if the cell was computed before, and otherwise add them to it
+                key = resultsStore.sweepKey('iterateAPGNoEmptyBallots',n,m,k,axLabels,outSizeLabels or defaultOutSizeLabels,encodingVersion)
+                if key in stored:
+                    results = stored[key]['results']
+                    print('(from ' + store + ')')
+                else:
+                    start = time.time()
+                    results = main(n,m,k,ax,axLabels,outSize,outSizeLabels,solver,cache=cache)
+                    if store is not None:
+                        # every instance is solved to the end, so the cell is always complete
+                        resultsStore.storeCell(store,'iterateAPGNoEmptyBallots',n,m,k,axLabels,outSizeLabels or defaultOutSizeLabels,encodingVersion,results,
+                            True,time.time()-start,solver,run)
                 # write each result in the list to the specified file
-                for r in main(n,m,k,ax,axLabels,outSize,outSizeLabels):
+                for r in results:
                     file.write(r +'\n') 
                     print(r)    
                 file.write('\n')
@@ -3,13 +3,35 @@
 # On the basis of Holzman, Moulin - Impartial Nominations for a Prize
 
 
-from pylgl import solve, itersolve
 from math import factorial,comb
 from itertools import combinations,permutations,product,chain,compress
 import multiprocessing
 import time
-
-def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
+from preprocessing import simplify
+from satSolvers import solveCNF, pysatSolvers, available
+from lazySolving import lazySolve, lazyAxioms
+from portfolio import race, defaultConfigurations
+from cubeAndConquer import conquer, unanimousVariables
+from budgetedSolving import newSolver, solveBudgeted, budgetSolver
+from localSearch import searchModel
+from warmStart import outcomePhases, modelPhases, partitionRule, saveModel, cachedPhases
+import hashlib
+import numpy as np
+from clauseArrays import profileClauses, spanningClauses, ballotSpanningClause, winnerLiterals, literalClauses, maskPairs, toClauses
+from profileCodec import rankingBallots, rankingTransitions, ballotMasks, profilesWithBallots, supportMasks, transitionArrays
+from instrumentation import newRun, emit, phase, cnfSize, solverStats
+from progress import Progress, watch
+import planner
+from instrumentation import timedOut
+import resultsStore
+import verdictCache
+
+# version of the encoding of the axioms; increase it whenever a cnf* function changes, so that stored results are recomputed
+encodingVersion = 1
+
+defaultOutSizeLabels = ["0< <=K","<=K","=K"]
+
+def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False,lazy=False,solver='pylgl',portfolio=False,cubeDepth=0,cubeTimeout=3600,budget=False,budgetPasses=3,localFlips=0,warmStart=False,generators=False,events="events.jsonl",run=None,progressInterval=30,abortProjected=False,skip=(),generationTimeout=18000,cache=None,deadline=None):
 
     # Basics: Voters, Profiles
     
@@ -72,36 +94,29 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
     # Modelling Nomination Rules
 
     def cnfAtLeastOne():
-        cnf = []
-        for r in allProfiles():
-            cnf.append([posLiteral(r,x) for x in allVoters()])
-        return cnf    
+        return [profileClauses([[posLiteral(0,x) for x in allVoters()]], len(allProfiles()), n)]
 
     def cnfAtMostK():
         """
         At most k agents will be selected
         """
-        cnf = []
-        for r in allProfiles():
-            for c in list(combinations(allVoters(),k)):
-                for y in voters(lambda j: j not in c):
-                    ll = [negLiteral(r,x) for x in c if x is not None]
-                    ll.append(negLiteral(r,y))
-                    cnf.append(ll)
-        return cnf     
+        # the clauses for profile 0, shifted to every profile
+        template = []
+        for c in list(combinations(allVoters(),k)):
+            for y in voters(lambda j: j not in c):
+                template.append([negLiteral(0,x) for x in c] + [negLiteral(0,y)])
+        return [profileClauses(template, len(allProfiles()), n)]
         
     def cnfAtLeastK():
         """
         At least k agents will be selected
         """
-        cnf = []
-        for r in allProfiles():
-            for c in list(combinations(allVoters(),n-k)):
-                for y in voters(lambda j: j not in c):
-                    ll = [posLiteral(r,x) for x in c if x is not None]
-                    ll.append(posLiteral(r,y))
-                    cnf.append(ll)
-        return cnf   
+        # the clauses for profile 0, shifted to every profile
+        template = []
+        for c in list(combinations(allVoters(),n-k)):
+            for y in voters(lambda j: j not in c):
+                template.append([posLiteral(0,x) for x in c] + [posLiteral(0,y)])
+        return [profileClauses(template, len(allProfiles()), n)]
 
     # Impartiality
 
@@ -118,6 +133,7 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
             for r1 in allProfiles():
                 for r2 in profiles(lambda r : iVariants(i,r1,r)):
                     cnf.extend([[negLiteral(r1,i),posLiteral(r2,i)]])
+                tick(i*len(allProfiles())+r1+1, n*len(allProfiles()), len(cnf))
         return cnf
         
             
@@ -128,27 +144,39 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
         For m == n-1: If everyone besides i has i as their lowest candidate, i will not be selected
         For m != n-1: If no one lists i among their top m candidates, if i is selected, so are all other candidates with nonempty support
         """
-        cnf = []
+        blocks = []
+        base = comb(n-1,m)*factorial(m)
+        ballots = [rankingBallots(n,m,j) for j in allVoters()]
         if m==n-1:
             for i in allVoters():
-                for r in profiles(lambda r : all(i == preflist(j, r)[m-1] for j in voters(lambda j : j != i))):
-                    cnf.append([negLiteral(r,i)])
+                # voter i is free, all other voters rank i last
+                allowed = [[b for b in range(base) if j == i or ballots[j][b][m-1] == i] for j in allVoters()]
+                blocks.append(literalClauses(-winnerLiterals(profilesWithBallots(allowed, base), i, n)))
+                tick(i+1, n, sum(len(b) for b in blocks))
         else:
+            masks = [ballotMasks(ballots[j]) for j in allVoters()]
             for i in allVoters():
-                for r in profiles(lambda r : all(i not in preflist(j, r) for j in voters(lambda j : j != i))):
-                    for j in voters(lambda x : any(x in preflist(y,r) for y in allVoters())):
-                        cnf.append([negLiteral(r,i),posLiteral(r,j)])
-        return cnf
+                # voter i is free, all other voters leave i out, every agent j with support is elected along with i
+                allowed = [[b for b in range(base) if j == i or i not in ballots[j][b]] for j in allVoters()]
+                rs = profilesWithBallots(allowed, base)
+                r, _, j = maskPairs(rs, np.full(len(rs), 1 << i), supportMasks(rs, masks, base), n)
+                blocks.append(literalClauses(-winnerLiterals(r, i, n), winnerLiterals(r, j, n)))
+                tick(i+1, n, sum(len(b) for b in blocks))
+        return [np.concatenate(blocks)]
         
     def cnfPosUnanimous():
         """
         If everyone besides i has i as their top candidate, i will be selected
         """
-        cnf = []
+        blocks = []
+        base = comb(n-1,m)*factorial(m)
+        ballots = [rankingBallots(n,m,j) for j in allVoters()]
         for i in allVoters():
-            for r in profiles(lambda r : all(top(j,i,r) for j in voters(lambda j : j != i))):
-                cnf.append([posLiteral(r,i)])
-        return cnf
+            # voter i is free, all other voters rank i first
+            allowed = [[b for b in range(base) if j == i or ballots[j][b][0] == i] for j in allVoters()]
+            blocks.append(literalClauses(winnerLiterals(profilesWithBallots(allowed, base), i, n)))
+            tick(i+1, n, sum(len(b) for b in blocks))
+        return [np.concatenate(blocks)]
         
     # Monotonicity
 
@@ -156,27 +184,17 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
         """
         If agent i is selected and only agent i either gets ranked higher by an agent or newly gets into the top m of an agent, agent i is still selected
         """
-        cnf = []
-        for i in allVoters():
-            for r1 in allProfiles():
-                for j in voters(lambda x : i in preflist(x,r1) and not top(x,i,r1)):
-                    #single out the profile in which agent j ranks i one spot higher and everything else stays the same
-                    #r is a j-variant of r1, the top m of r and r1 are the same, i advances one spot in the ranking, the ranking stays fixed except for the swap
-                    for r2 in [r for r in profiles(lambda r : iVariants(j,r1,r) and sorted(preflist(j,r)) == sorted(preflist(j,r1))) if\
-                    (preflist(j,r).index(i) == preflist(j,r1).index(i)-1) and\
-                    all(preflist(j,r)[x] == preflist(j,r1)[x] for x in range(m) if x not in [preflist(j,r).index(i),preflist(j,r).index(i)+1])]:         
-                        cnf.append([negLiteral(r1,i), posLiteral(r2,i)])
-                        
-
-        for i in allVoters():
-            for r1 in allProfiles():
-                for j in voters(lambda x : i not in preflist(x,r1)):
-                    #single out the profile in which agent j ranks i last among top m and everything else stays the same
-                    #r is a j-variant of r1, the top m-1 of r and r1 are the same, the m-th preference in r is agent i
-                    for r2 in profiles(lambda r : iVariants(j,r1,r) and preflist(j,r)[:m-2] == preflist(j,r1)[:m-2] and\
-                    preflist(j,r)[m-1] == i): 
-                        cnf.append([negLiteral(r1,i), posLiteral(r2,i)])
-        return cnf
+        blocks = []
+        base = comb(n-1,m)*factorial(m)
+        transitions = [rankingTransitions(n,m,j) for j in allVoters()]
+        # every transition of a ballot of j yields one clause per profile of the other voters
+        total = sum(len(targets) for j in allVoters() for edges in transitions[j] for targets in edges.values()) * base**(n-1)
+        # r2 is the j-variant of r1 in which j ranks i one spot higher or ranks i last among her top m
+        for r1, i, r2 in transitionArrays(transitions, base):
+            blocks.append(literalClauses(-winnerLiterals(r1, i, n), winnerLiterals(r2, i, n)))
+            done = sum(len(b) for b in blocks)
+            tick(done, total, done)
+        return [np.concatenate(blocks)]
 
     # Surjectivity/Non-imposition
 
@@ -184,10 +202,7 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
         """
         Every voter gets selected in some profile
         """
-        cnf = []
-        for i in allVoters():
-            cnf.append([posLiteral(r,i) for r in allProfiles()])
-        return cnf
+        return [spanningClauses([[posLiteral(0,i)] for i in allVoters()], len(allProfiles()), n)]
 
     def cnfSurjective():
         """
@@ -204,17 +219,14 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
                 clause=[negLiteral(r,x) for x in c]
                 clause.append(posQLiteral(r,c))
                 cnf.append(clause)   
+            tick(r+1, len(allProfiles()), len(cnf))
         return cnf
 
     def cnfNonConstant():
         """
         For any set of winners (of size at most k) there is a profile in which one of the voters in this set does not win. 
         """
-        cnf = []
-        for c in list(combinations(allVoters(),k)):
-            clause = [negLiteral(r,v) for r in allProfiles() for v in c]
-            cnf.append(clause)
-        return cnf
+        return [spanningClauses([[negLiteral(0,v) for v in c] for c in combinations(allVoters(),k)], len(allProfiles()), n)]
 
 
     # Anonymity
@@ -228,6 +240,7 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
             for r2 in profiles(lambda r : vPermutation(r,r1)):
                 for x in allVoters():
                     cnf.extend([[negLiteral(r1,x),posLiteral(r2,x)],[posLiteral(r1,x),negLiteral(r2,x)]])
+            tick(r1+1, len(allProfiles()), len(cnf))
         return cnf
         
     # Non-dictatorship
@@ -236,14 +249,13 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
         """
         Call i an dictator if the outcome set consists always of the top k-1 voters in i's ballots and i herself
         """
-        cnf = []
+        blocks = []
+        base = comb(n-1,m)*factorial(m)
         for i in allVoters():
-            clause = []
-            for r in allProfiles():
-                for j in voters(lambda x : x in preflist(i,r)[:k-1] or x == i):
-                    clause.append(negLiteral(r,j))
-            cnf.append(clause)
-        return cnf 
+            # the literals for profile 0 and each ballot of i, shifted to every profile in which i submits that ballot
+            ballotTemplate = [[negLiteral(0,j) for j in voters(lambda x : x in ballot[:k-1] or x == i)] for ballot in rankingBallots(n,m,i)]
+            blocks.append(ballotSpanningClause(ballotTemplate, i, base, len(allProfiles()), n))
+        return [np.concatenate(blocks)]
 
     #No dummy 
 
@@ -265,11 +277,37 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
                         cnf.append([negDLiteral(r1,r2,j), posLiteral(r1,j)])
                         cnf.append([negDLiteral(r1,r2,j), negLiteral(r2,j)])
                         cnf.append([posDLiteral(r1,r2,j), negLiteral(r1,j), posLiteral(r2,j)])
+                tick(i*len(allProfiles())+r1+1, n*len(allProfiles()), len(cnf))
             cnf.append(clause)
 
 
+    # Progress of the generator running in the current child process (see progress.py)
+
+    progress = None
+
+    def tick(done, total, clauses):
+        if progress is not None:
+            progress.update(done, total, clauses)
+
+    if generators == True: #only hand out the CNF generators, e.g. to benchmark them (see cnfBenchmark.py)
+        return {name: f for name, f in locals().items() if name.startswith('cnf')}
+
+    if portfolio == False and not available(solver): #rather than generating the CNFs and failing in every solve
+        raise ValueError('SAT solver ' + solver + ' is not available')
+
+    # every event of this call carries the run and the cell (see instrumentation.py)
+    cell = {'run': run if run is not None else newRun(), 'n': n, 'm': m, 'k': k}
+    
+    def remaining(limit): #seconds a step may take: its own limit, but no more than what is left until the deadline
+        return limit if deadline is None else max(0, min(limit, deadline - time.time()))
+    with phase(events,'ballots',**cell): #the ballot tables are cached, so the child processes inherit them
+        for j in allVoters():
+            rankingBallots(n,m,j)
+            rankingTransitions(n,m,j)
+
     # SAT-solving
     def saveCNF(cnf, filename):
+        cnf = toClauses(cnf)
         nvars = max([abs(lit) for clause in cnf for lit in clause])
         nclauses = len(cnf)
         file = open(filename, 'w')
@@ -278,13 +316,42 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
             file.write(' '.join([str(lit) for lit in clause]) + ' 0\n')
         file.close()
     
-    def worker_solve(queue,cnf):
-        queue.put(isinstance(solve(cnf),list))
+    def worker_solve(queue,cnf,label,phases=None,timeout=None):
+        with phase(events,'solve',axioms=label,solver=solver,**cell) as e:
+            result = solveCNF(cnf,solver,timeout=timeout,phases=phases)
+            e.update(verdict=result.verdict,**solverStats(result.stats))
+        queue.put((result.verdict,result.model if warmStart else None))
+        
+    def worker_lazySolve(queue,cnf,lazyNames,label): #instantiate the axioms in lazyNames only where a model violates them
+        #lazy solving needs an incremental solver, so it falls back to CaDiCaL unless a PySAT solver is chosen
+        with phase(events,'solve',axioms=label,solver='lazy',**cell) as e:
+            verdict = lazySolve(n,m,cnf,lazyNames,solver=solver if solver in pysatSolvers else 'cadical153')[0]
+            e.update(verdict=verdict)
+        queue.put((verdict,None))
+        
+    def warmPhases(i,j): #phase hints for a cell and where they come from
+        numVars = len(allProfiles())*n
+        for (label,jj), model in sorted(models.items(), key=lambda e: -len(axiomSet(e[0][0]))): #the largest subset of the axioms first
+            if jj == j and axiomSet(label) < axiomSet(axLabels[i]):
+                return modelPhases(model,numVars), 'model of '+str(label)
+        phases = cachedPhases("model_cache.jsonl",n,m,k,str(axLabels[i])+' '+str(outSizeLabels[j]),numVars)
+        if phases is not None:
+            return phases, 'cached model'
+        return outcomePhases(partitionRule(n,m,k)), 'partition rule'
+        
+    def recordModel(i,j,model,assignment): #keep a model of a satisfiable cell for warm starts within the sweep and later sweeps
+        assigned = set(abs(lit) for lit in assignment)
+        model = [lit for lit in model if abs(lit) not in assigned] + list(assignment)
+        models[(axLabels[i],j)] = model
+        saveModel("model_cache.jsonl",n,m,k,str(axLabels[i])+' '+str(outSizeLabels[j]),model,len(allProfiles())*n)
         
     def worker_calcCNF(x,localVars,return_dict): #first calculate all cnfs, then solve
         print("currently calculating " + str(x))
         local = locals()
-        return_dict[x]=eval(x+"()",{**local, **localVars})
+        with phase(events,'generate',axiom=x,**cell) as e:
+            cnf = eval(x+"()",{**local, **localVars})
+            e.update(cnfSize(cnf or []))
+        return_dict[x]=cnf
 
     
     if outSize == False:
@@ -295,62 +362,189 @@ def main(n,m,k,ax,axLabels,outSize,outSizeLabels,save=False):
         for x in sizes:
             outSize.append(eval(x))
     if outSizeLabels == False:
-        outSizeLabels = ["0< <=K","<=K","=K"]
+        outSizeLabels = defaultOutSizeLabels
     
     # calculate all CNFs occurring in ax first
     axioms = ax
     axiomsSet = set([s.strip().replace("()","") for x in axioms for s in x.split("+")])
     axiomsDict = {}
+    lazyNames = lazyAxioms if lazy == True else []
     
     for x in axiomsSet:
+        if x in lazyNames:
+            axiomsDict[x] = []
+            continue
+        if x in skip: #the planner predicts that the generation exceeds the memory or the timeout (see planner.py)
+            emit(events,'skipped',phase='generate',axiom=x,**cell)
+            continue
+        if remaining(generationTimeout) == 0:
+            emit(events,'timeout',phase='generate',axiom=x,deadline=True,wall=0.0,**cell)
+            continue
         manager = multiprocessing.Manager()
         return_dict = manager.dict()
         local = locals()
         localVars = {key: local.get(key) for key in ['cnfAnonymous','cnfImpartial','cnfMonotonous','cnfNegUnanimous','cnfNoDummy','cnfNoExclusion','cnfNonConstant','cnfNondictatorial','cnfPosUnanimous','cnfSurjective']}
+        progress = Progress() #shared with the child, which ticks it from the generator
         p = multiprocessing.Process(target=worker_calcCNF, name="calculate CNF", args=(x,localVars,return_dict))
+        start = time.perf_counter()
         p.start()
-        p.join(18000) #time to wait for CNF construction (for a single CNF)
+        #time to wait for CNF construction (for a single CNF), the progress is reported every progressInterval seconds
+        outcome = watch(p,x,progress,remaining(generationTimeout),interval=progressInterval,abort=abortProjected,events=events,**cell)
         if p.is_alive():
             p.terminate()
             p.join()
-            log = open("log.txt", 'a')
-            log.write(time.strftime("%d-%m-%Y-%H:%M:%S", time.localtime())+" - killed n="+str(n)+", m="+str(m)+", k="+str(k)+" - calc CNF for "+x+'\n')
-            log.close()
+            emit(events,'timeout',phase='generate',axiom=x,projected=outcome == 'aborted',wall=time.perf_counter()-start,**cell)
             continue
-        axiomsDict[x] = return_dict[x]
+        with phase(events,'transport',axiom=x,**cell): #unpickling the CNF from the manager process
+            axiomsDict[x] = return_dict[x]
         
     # save CNFs to files
     if save == True:
-        for x in axiomsSet:
+        for x in axiomsSet - set(lazyNames):
             saveCNF(axiomsDict.get(x),x+"_"+str(n)+"_"+str(m)+"_"+str(k)+".txt")
         
     # filter ax for those entries which only make use of CNFs which we were able to compute
     axList = [[axiomsDict.get(s.strip().replace("()",""),0) for s in x.split("+")] for x in axioms]
     ax = [[c for y in x for c in y] for x in axList if 0 not in x]
     axLabels = list(compress(axLabels, [0 not in x for x in axList]))
+    axLazy = [[s.strip().replace("()","") for s in x.split("+") if s.strip().replace("()","") in lazyNames] for x in axioms]
+    axLazy = list(compress(axLazy, [0 not in x for x in axList]))
     
     results = []
+    models = {} #models of the satisfiable cells of this sweep, by axiom labels and outcome size
+    pending = [] #cells whose conflict budget was exhausted, with the position of their result, their solver and cache key
+    verdicts = verdictCache.load(cache) #verdicts of identical CNFs found before (see verdictCache.py)
+    
+    def remember(key, label, verdict, source):
+        verdictCache.record(cache,verdicts,key,verdict,label=label,n=n,m=m,k=k,module='iteratePeerGrading',source=source)
     for i in range(len(axLabels)):
         for j in range(len(outSizeLabels)):
-            cnf = ax[i] + outSize[j]
+            label = str(axLabels[i])+' '+str(outSizeLabels[j])
             if not (i==0 and j==0) and (any(set(tuple([s.replace("'","") for s in r[r.find('(')+1:r.find(')')].split(', ')])).issubset(axLabels[i]) and 'False' in r for r in results) or any(set(tuple([s.replace("'","") for s in r[r.find('(')+1:r.find(')')].split(', ')]))==set(axLabels[i]) for r in results)):
                 continue
+            cnf = toClauses(ax[i] + outSize[j]) #the clause arrays of the generators become lists only here
+            
+            # an identical CNF (up to the order of clauses and literals) was decided before, under this or another label
+            key = verdictCache.canonicalHash(cnf, {'lazy': sorted(axLazy[i]), 'n': n, 'm': m} if len(axLazy[i]) > 0 else None) if cache is not None else None
+            if key in verdicts:
+                results.append(label+': '+str(verdicts[key]['verdict'])+' [cached from '+verdicts[key]['label']+']')
+                continue
+            
+            # unit and pure literal propagation decides many instances without spawning a solver
+            # (with lazily instantiated axioms only a refutation is final, since further clauses get added later)
+            with phase(events,'preprocess',axioms=label,**cell) as e:
+                verdict, simplified, assignment = simplify(cnf)
+                e.update(verdict=verdict,**cnfSize(cnf))
+                e.update(remaining=len(simplified),assigned=len(assignment))
+            if verdict == False or (verdict == True and len(axLazy[i]) == 0):
+                results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(verdict)+' [preprocessing]')
+                remember(key,label,verdict,'preprocessing')
+                continue
+            if remaining(600) == 0: #no time left to solve the remaining instances of the cell
+                emit(events,'timeout',phase='solve',axioms=label,deadline=True,wall=0.0,**cell)
+                continue
+                
+            phases, source = None, None
+            if warmStart == True and len(axLazy[i]) == 0:
+                # seed the saved phases of the solver with a model of fewer axioms, a cached model or a known rule
+                phases, source = warmPhases(i,j)
+            if localFlips > 0 and len(axLazy[i]) == 0:
+                # a short stochastic local search finds many models cheaply, otherwise its best assignment serves as phase hints
+                with phase(events,'solve',axioms=label,solver='probsat',**cell) as e:
+                    model, searchPhases, stats = searchModel(simplified,maxFlips=localFlips,timeout=remaining(60))
+                    e.update(verdict=True if model is not None else None,flips=stats['flips'])
+                if model is not None:
+                    results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': True [local search]')
+                    remember(key,label,True,'local search')
+                    if warmStart == True:
+                        recordModel(i,j,model,assignment)
+                    continue
+                if phases is None:
+                    phases = searchPhases
+                
+            if portfolio != False and len(axLazy[i]) == 0:
+                # race several solvers on the cell, the winner is recorded in portfolio_winners.json
+                with phase(events,'solve',axioms=label,solver='portfolio',**cell) as e:
+                    verdict, winner, stats = race(simplified,defaultConfigurations if portfolio == True else portfolio,key=str((n,m,k))+' '+str(axLabels[i])+' '+str(outSizeLabels[j]),timeout=remaining(600))
+                    e.update(verdict=verdict,winner=winner)
+                if verdict is None:
+                    emit(events,'timeout',phase='solve',axioms=label,solver='portfolio',**cell)
+                    continue
+                results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(verdict))
+                remember(key,label,verdict,'portfolio '+winner)
+                continue
+                
+            if budget != False and len(axLazy[i]) == 0:
+                # solve in this process under a conflict budget, unknown cells are resumed below with larger budgets
+                s = newSolver(simplified,solver)
+                if phases:
+                    s.set_phases(phases)
+                with phase(events,'solve',axioms=label,solver=budgetSolver(solver),budget=budget,**cell) as e:
+                    result = solveBudgeted(s,budget)
+                    e.update(verdict=result.verdict,**solverStats(result.stats))
+                results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(result.verdict)+('' if source is None or result.verdict is None else ' [warm start from '+source+', '+'%.2f' % result.time+'s]'))
+                if result.verdict == True and warmStart == True:
+                    recordModel(i,j,result.model,assignment)
+                if result.verdict is None:
+                    pending.append((len(results)-1,s,key))
+                else:
+                    remember(key,label,result.verdict,budgetSolver(solver))
+                    s.delete()
+                continue
                 
             queue = multiprocessing.Queue()
-            p = multiprocessing.Process(target=worker_solve, name="SAT solve", args=(queue,cnf))
+            solveTimeout = remaining(600)
+            if len(axLazy[i]) == 0:
+                p = multiprocessing.Process(target=worker_solve, name="SAT solve", args=(queue,simplified,label,phases,solveTimeout))
+            else:
+                p = multiprocessing.Process(target=worker_lazySolve, name="SAT solve", args=(queue,cnf,axLazy[i],label))
+            start = time.perf_counter()
             p.start()
-            p.join(600) #time to wait for SAT solving (one instance)
+            p.join(solveTimeout) #time to wait for SAT solving (one instance)
             if p.is_alive():
                 p.terminate()
                 p.join()
-                log = open("log.txt", 'a')
-                log.write(time.strftime("%d-%m-%Y-%H:%M:%S", time.localtime())+" - killed n="+str(n)+", m="+str(m)+", k="+str(k)+" - SAT solving "+str(axLabels[i])+' '+str(outSizeLabels[j])+'\n')
-                log.close()
+                if cubeDepth > 0 and len(axLazy[i]) == 0:
+                    # split the instance into 2^cubeDepth cubes instead of giving up, a killed job resumes from the progress file
+                    cubeCell = str((n,m,k))+' '+str(axLabels[i])+' '+str(outSizeLabels[j])
+                    progressFile = "cubes_"+str(n)+"_"+str(m)+"_"+str(k)+"_"+hashlib.md5(cubeCell.encode()).hexdigest()[:8]+".jsonl"
+                    emit(events,'timeout',phase='solve',axioms=label,solver=solver,wall=time.perf_counter()-start,**cell)
+                    with phase(events,'solve',axioms=label,solver='cube-and-conquer',**cell) as e:
+                        verdict, stats = conquer(simplified,cubeDepth,candidates=unanimousVariables(n,m),progress=progressFile,timeout=remaining(cubeTimeout))
+                        e.update(verdict=verdict,**stats)
+                    if verdict is None: #the finished cubes stay in the progress file for the next attempt
+                        emit(events,'timeout',phase='solve',axioms=label,solver='cube-and-conquer',**cell)
+                    results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(verdict)+' [cube-and-conquer]')
+                    remember(key,label,verdict,'cube-and-conquer')
+                    continue
+                emit(events,'timeout',phase='solve',axioms=label,solver=solver if len(axLazy[i]) == 0 else 'lazy',wall=time.perf_counter()-start,**cell)
                 continue
-            results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(queue.get()))
+            if p.exitcode != 0 or queue.empty(): #the solver process died without a verdict
+                emit(events,'error',phase='solve',axioms=label,solver=solver if len(axLazy[i]) == 0 else 'lazy',exitcode=p.exitcode,**cell)
+                results.append(label+': None [solver failed, exit code '+str(p.exitcode)+']')
+                continue
+            verdict, model = queue.get()
+            results.append(str(axLabels[i])+' '+str(outSizeLabels[j])+': '+ str(verdict)+('' if source is None else ' [warm start from '+source+', '+'%.2f' % (time.perf_counter()-start)+'s]'))
+            remember(key,label,verdict,solver if len(axLazy[i]) == 0 else 'lazy')
+            if verdict == True and model is not None:
+                recordModel(i,j,model,assignment)
+            
+    # later passes resume the unknown cells on the same solver with 10 times the budget of the previous pass
+    for p in range(1,budgetPasses):
+        for position, s, key in pending:
+            if results[position].endswith(': None') and remaining(1) > 0:
+                with phase(events,'solve',axioms=results[position][:results[position].find(':')],solver=budgetSolver(solver),budget=budget*10**p,**cell) as e:
+                    result = solveBudgeted(s,budget*10**p)
+                    e.update(verdict=result.verdict,**solverStats(result.stats))
+                results[position] = results[position][:-len('None')] + str(result.verdict)
+                remember(key,results[position][:results[position].find(':')],result.verdict,budgetSolver(solver))
+    for position, s, key in pending:
+        if results[position].endswith(': None'):
+            results[position] += ' [budget exhausted after '+str(s.accum_stats()['conflicts'])+' conflicts]'
+        s.delete()
     return results
     
-def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLabels=False,filename="peerGrading.txt",save=False):
+def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLabels=False,filename="peerGrading.txt",save=False,lazy=False,solver='pylgl',portfolio=False,cubeDepth=0,cubeTimeout=3600,budget=False,budgetPasses=3,localFlips=0,warmStart=False,events="events.jsonl",progressInterval=30,abortProjected=False,plan=None,store=None,cache=None):
     """
     Iterate the peer grading SAT solving for multiple values of n, m, k, different combinations of axioms 
     and different allowed sizes of the outcome set.
@@ -364,6 +558,32 @@ def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLa
     outSize -- list of strings, each containing python code to generate CNF which specify the size of the outcome set
     outSizeLabels -- list of labels identifying the CNFs in outSize
     filename -- string containing file name to write results into
+    save -- save the CNF of every axiom to a file
+    lazy -- instantiate cnfImpartial, cnfMonotonous and cnfAnonymous only where a model violates them (see lazySolving.py)
+    solver -- SAT solver backend, see satSolvers.solveCNF
+    portfolio -- race several solvers on every instance instead (see portfolio.py), True for the default configurations
+                 or a list of pairs (solver, seed)
+    cubeDepth -- if positive, instances exceeding the solve timeout are decided by cube-and-conquer on 2^cubeDepth
+                 cubes (see cubeAndConquer.py) instead of being given up
+    cubeTimeout -- seconds after which cube-and-conquer gives up the remaining cubes and the cell is recorded as None
+    budget -- if set, solve in process under this conflict budget instead of a wall-clock timeout (see budgetedSolving.py);
+              cells left unknown are resumed on the same solver with 10 times the budget in each of budgetPasses passes
+    localFlips -- if positive, run ProbSAT for this many flips per core before the complete solver (see localSearch.py);
+                  if it finds no model, its best assignment is passed to PySAT solvers as phase hints
+    warmStart -- seed the phases of PySAT solvers with the model of a satisfiable subset of the axioms, a model cached
+                 for the cell or a neighbouring k in model_cache.jsonl, or the partition rule (see warmStart.py); the
+                 results report the source of the hints and the solve time
+    events -- file the structured events of every phase are appended to, all under one run identifier (see
+              instrumentation.py, whose summary aggregates them per axiom and per (n, m, k)); None to record nothing
+    progressInterval -- seconds between two reports of the fraction done, clauses per second, projected time and memory
+                        of a CNF generation (see progress.py)
+    abortProjected -- give up a CNF generation as soon as its projected completion exceeds the generation timeout
+    plan -- a plan of the sweep (see planner.py) or True to compute one: the cells are processed from the cheapest to
+            the most expensive one and axioms whose generation would exceed the memory or the timeout are skipped
+    store -- results store (see resultsStore.py): complete cells of the sweep found there are not recomputed, and every
+             computed cell is appended to it
+    cache -- verdict cache (see verdictCache.py), by default next to the store if there is one: instances whose CNF was
+             decided before, under any label, module or run, are not solved again
     """
     if mRange == False:
         mRange = range(1,max(nRange))
@@ -371,26 +591,52 @@ def iterate(nRange,ax,axLabels,mRange=False,kRange=False,outSize=False,outSizeLa
         kRange = range(1,max(nRange))
     
     count = 0
+    run = newRun()
+    cells = [(n,m,k) for n in nRange for k in (x for x in kRange if x < n) for m in (x for x in mRange if x < n)]
+    if plan == True:
+        plan = planner.plan(nRange,ax,mRange,kRange,outSize)
+    if plan:
+        cells = planner.order(plan)
+    stored = resultsStore.completedCells(resultsStore.load(store)) if store is not None else {}
+    if cache is None and store is not None:
+        cache = verdictCache.cacheFile(store)
     
-    for n in nRange:
-        for k in (x for x in kRange if x < n):
-            for m in (x for x in mRange if x < n):   
-                if count != 0:
-                    file = open(filename, 'a')
-                else: 
-                    file = open(filename, 'w')
-                file.write(str(n)+','+str(m)+','+str(k)+':\n')   
-                print(str(n)+','+str(m)+','+str(k)+': ')
-                
-                for r in main(n,m,k,ax,axLabels,outSize,outSizeLabels,save):
-                    file.write(r +'\n') 
-                    print(r)
-                    
-                file.write('\n')
-                print('-------------------------------------')
-                file.close()
+    for n, m, k in cells:
+        if count != 0:
+            file = open(filename, 'a')
+        else: 
+            file = open(filename, 'w')
+        file.write(str(n)+','+str(m)+','+str(k)+':\n')   
+        print(str(n)+','+str(m)+','+str(k)+': ')
+        
+        key = resultsStore.sweepKey('iteratePeerGrading',n,m,k,axLabels,outSizeLabels or defaultOutSizeLabels,encodingVersion)
+        if key in stored:
+            results = stored[key]['results']
+            print('(from ' + store + ')')
+        else:
+            start = time.time()
+            results = main(n,m,k,ax,axLabels,outSize,outSizeLabels,save,lazy,solver,portfolio,cubeDepth,cubeTimeout,budget,budgetPasses,localFlips,warmStart,events=events,run=run,progressInterval=progressInterval,abortProjected=abortProjected,skip=plan[(n,m,k)]['infeasible'] if plan else [],cache=cache)
+            if store is not None:
+                resultsStore.storeCell(store,'iteratePeerGrading',n,m,k,axLabels,outSizeLabels or defaultOutSizeLabels,encodingVersion,results,
+                    not timedOut(events,run,n,m,k),time.time()-start,solver,run,events)
+        for r in results:
+            file.write(r +'\n') 
+            print(r)
+            
+        file.write('\n')
+        print('-------------------------------------')
+        file.close()
+        
+        count += 1
                 
-                count += 1
+def axiomSet(label):
+    """
+    The set of axioms of a label, which is either a tuple of axiom names (as produced by giveCombinations) or a string
+    of comma-separated names (e.g. "I,NU,PU").
+    """
+    if isinstance(label, str):
+        return set(s.strip() for s in label.split(','))
+    return set(label)
                 
 def giveCombinations(cList):
     """
@@ -0,0 +1,141 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Counterexample-guided lazy instantiation of axioms
+
+"""For large n most instances of cnfImpartial, cnfMonotonous and cnfAnonymous are irrelevant for the verdict.
+Instead of generating them all, we solve the outcome size constraints (and the other, small axioms) together with a
+seed of instances, check the model against the full axioms and add only the violated instances before solving again.
+The solver keeps its state between rounds. If a model violates no instance, it satisfies the full CNF.
+
+Lazy instantiation only avoids generating these three axioms. The outcome size constraints, the other axioms, the
+winner variables and the outcome arrays checked in every round still grow with the number of profiles
+(numRankingBallots(n, m) ** n), as do the profile digits of lazySolve. For n = 6, 7 this is only feasible for m = 1
+(15625 and 279936 profiles), which is what lisa_analysis.py runs lazily; m >= 2 stays out of reach (64 million
+profiles for n = 6)."""
+
+from pysat.solvers import Solver
+import numpy as np
+from profileCodec import numRankingBallots, rankingTransitions, profileDigits, outcomeArray
+from ruleChecker import iVariantGroups, permutationGroups, impartialViolations, monotonousViolations, anonymousViolations
+
+lazyAxioms = ['cnfImpartial', 'cnfMonotonous', 'cnfAnonymous']
+
+
+# Literals (as in peerGrading.py)
+
+def posLiterals(r, x, n):
+    return r * n + x + 1
+
+def implications(r1, r2, x, n):
+    """Clauses [negLiteral(r1,x), posLiteral(r2,x)] for arrays of profiles r1, r2 and agents x."""
+    return np.stack([-posLiterals(r1, x, n), posLiterals(r2, x, n)], axis=1).tolist()
+
+# Instances of the lazy axioms. Each function returns the instances with first profile in the boolean mask r1Mask:
+# all of them if outcomes is None, and otherwise those needed to rule out the outcome array, as found by ruleChecker.py
+# (the violated instances of cnfMonotonous, and a cycle of instances through every class of i-variants or permutations
+# that disagrees).
+
+def violatedInstances(violations, n, r1Mask):
+    cnf = []
+    for x, r1, r2 in violations:
+        keep = r1Mask[r1]
+        cnf.extend(implications(r1[keep], r2[keep], x, n))
+    return cnf
+
+def impartialInstances(n, m, digits, outcomes, r1Mask):
+    if outcomes is not None:
+        return violatedInstances(impartialViolations(n, m, digits, outcomes), n, r1Mask)
+    base = numRankingBallots(n, m)
+    profiles = np.arange(len(digits), dtype=np.int64)
+    cnf = []
+    for i in range(n):
+        groups = iVariantGroups(digits, base, i)
+        for r1 in profiles[r1Mask]:
+            r2 = groups[r1] + np.arange(base, dtype=np.int64) * base**i
+            cnf.extend(implications(np.full(base, r1), r2, i, n))
+    return cnf
+
+def monotonousInstances(n, m, digits, outcomes, r1Mask):
+    if outcomes is not None:
+        return violatedInstances(monotonousViolations(n, m, digits, outcomes), n, r1Mask)
+    base = numRankingBallots(n, m)
+    cnf = []
+    for j in range(n):
+        for b, edges in enumerate(rankingTransitions(n, m, j)):
+            r1 = np.flatnonzero((digits[:,j] == b) & r1Mask)
+            for i, targets in edges.items():
+                for b2 in targets:
+                    cnf.extend(implications(r1, r1 + (b2 - b) * base**j, i, n))
+    return cnf
+
+def anonymousInstances(n, m, digits, outcomes, r1Mask):
+    if outcomes is not None:
+        return violatedInstances(anonymousViolations(n, m, digits, outcomes), n, r1Mask)
+    profiles = np.arange(len(digits), dtype=np.int64)
+    groups = permutationGroups(n, m, digits)
+    order = np.argsort(groups, kind='stable')
+    starts = np.searchsorted(groups[order], groups[r1Mask])
+    ends = np.searchsorted(groups[order], groups[r1Mask], side='right')
+    cnf = []
+    for x in range(n):
+        for r1, s, e in zip(profiles[r1Mask], starts, ends):
+            r2 = order[s:e]
+            cnf.extend(implications(np.full(len(r2), r1), r2, x, n))
+            cnf.extend(implications(r2, np.full(len(r2), r1), x, n))
+    return cnf
+
+instanceGenerators = {'cnfImpartial': impartialInstances, 'cnfMonotonous': monotonousInstances,
+    'cnfAnonymous': anonymousInstances}
+
+
+# Solving
+
+def lazySolve(n, m, cnf, lazy, seed=None, solver='cadical153', maxClausesPerRound=200000, verbose=False):
+    """
+    Decide satisfiability of cnf together with the axioms named in lazy (a subset of lazyAxioms), without generating
+    the latter in full.
+
+    Keyword arguments:
+    n, m -- number of voters and length of the ballots (ranking ballots as in peerGrading.py)
+    cnf -- the clauses that are generated in full, e.g. the outcome size constraints and the unanimity axioms
+    lazy -- names of the axioms that are instantiated lazily
+    seed -- boolean mask over all profiles, the instances starting in these profiles are added up front; by default
+            the profiles occurring in unit clauses of cnf and profile 0
+    solver -- name of the incremental PySAT solver
+    maxClausesPerRound -- maximal number of violated instances added per axiom and round
+
+    Returns a pair (satisfiable, stats) where stats counts the rounds and the instances added per axiom.
+
+    The digits of all profiles and an outcome array per round are held in memory, so the size limit is that of the
+    number of profiles, see the module documentation (for n >= 6 only m = 1).
+    """
+    numProfiles = numRankingBallots(n, m) ** n
+    digits = profileDigits(np.arange(numProfiles), numRankingBallots(n, m), n)
+    if seed is None:
+        seed = np.zeros(numProfiles, dtype=bool)
+        seed[0] = True
+        units = np.array([abs(c[0]) for c in cnf if len(c) == 1 and abs(c[0]) <= numProfiles * n], dtype=np.int64)
+        seed[(units - 1) // n] = True
+
+    stats = {'rounds': 0}
+    with Solver(name=solver, bootstrap_with=cnf) as s:
+        for x in lazy:
+            instances = instanceGenerators[x](n, m, digits, None, seed)
+            s.append_formula(instances)
+            stats[x] = len(instances)
+        while True:
+            stats['rounds'] += 1
+            if not s.solve():
+                return False, stats
+            outcomes = outcomeArray(s.get_model(), n, numProfiles)
+            violated = 0
+            everywhere = np.ones(numProfiles, dtype=bool)
+            for x in lazy:
+                instances = instanceGenerators[x](n, m, digits, outcomes, everywhere)[:maxClausesPerRound]
+                s.append_formula(instances)
+                stats[x] += len(instances)
+                violated += len(instances)
+            if verbose:
+                print('round ' + str(stats['rounds']) + ': ' + str(violated) + ' violated instances')
+            if violated == 0:
+                return True, stats
@@ -1,9 +1,16 @@
 from iteratePeerGrading import *
+from scheduler import schedule
+import time
+
+# both sweeps share the 24 hours of first_job.txt, cheap cells first; a resubmitted job resumes from the checkpoints
+deadline = time.time() + 24*3600
 
 # check holzman thm3 and thm4
 axDesc = [tuple(["I","NU","PU"]),tuple(["I","A","NC"])]
 axCnf = ["cnfImpartial()+cnfNegUnanimous()+cnfPosUnanimous()","cnfImpartial()+cnfAnonymous()+cnfNonConstant()"] 
-iterate(nRange=range(3,8),ax=axCnf,axLabels=axDesc,outSize=["cnfAtLeastK()+cnfAtMostK()"],outSizeLabels=["=K"],filename="holzman_thm3_thm4.txt",save=True)
+schedule(nRange=range(3,6),ax=axCnf,axLabels=axDesc,outSize=["cnfAtLeastK()+cnfAtMostK()"],outSizeLabels=["=K"],filename="holzman_thm3_thm4.txt",deadline=deadline,save=True)
+# for n=6,7 impartiality and anonymity are only instantiated where a model violates them
+schedule(nRange=range(6,8),mRange=[1],ax=axCnf,axLabels=axDesc,outSize=["cnfAtLeastK()+cnfAtMostK()"],outSizeLabels=["=K"],filename="holzman_thm3_thm4_lazy.txt",deadline=deadline,plan=None,lazy=True)
 
 # check axiom combinations which include I,NU,PU (holzman thm 4) for =K
 axDesc = [tuple(["I","NU","PU"])] + [tuple(["I","NU","PU"]) + axioms  for axioms in giveCombinations(["M","NE","ND","A","S"])]
@@ -0,0 +1,146 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Stochastic local search before the complete solver
+
+"""Many cells are satisfiable by simple rules, which a stochastic local search often finds in a fraction of the time a
+CDCL solver needs to build up. We run ProbSAT (pick a random falsified clause, flip one of its variables with
+probability decreasing in the number of clauses the flip would break) for a limited number of flips in several
+processes with different seeds. A model found this way is verified against all clauses; otherwise the best assignment
+found is handed to the complete solver as phase hints (see satSolvers.solveCNF).
+
+The clauses are kept in a compact store of numpy arrays: the literals of all clauses in one flat array with clause
+offsets, and for every literal the clauses it occurs in."""
+
+import time
+import multiprocessing
+import numpy as np
+from portfolio import shareCNF, attachCNF
+
+
+# Clause store
+
+def clauseStore(cnf):
+    """
+    Compact representation of cnf as a tuple (lits, starts, occStarts, occClauses, numVars): clause c consists of
+    lits[starts[c]:starts[c+1]], and the clauses containing literal l are occClauses[occStarts[i]:occStarts[i+1]]
+    with i = literalIndex(l). Repeated literals are merged and tautological clauses dropped, so that every clause
+    occurs at most once in the occurrence list of a variable.
+    """
+    cnf = [list(dict.fromkeys(clause)) for clause in cnf]
+    # without repeated literals a clause is tautological iff two of its literals share a variable
+    cnf = [clause for clause in cnf if len(set(abs(lit) for lit in clause)) == len(clause)]
+    lengths = np.array([len(clause) for clause in cnf], dtype=np.int64)
+    lits = np.fromiter((lit for clause in cnf for lit in clause), dtype=np.int64, count=int(lengths.sum()))
+    starts = np.r_[0, np.cumsum(lengths)]
+    numVars = int(np.abs(lits).max()) if len(lits) > 0 else 0
+    clauseOf = np.repeat(np.arange(len(cnf)), lengths)
+    indices = literalIndex(lits)
+    order = np.argsort(indices, kind='stable')
+    occStarts = np.r_[0, np.cumsum(np.bincount(indices, minlength=2 * (numVars + 1)))]
+    return lits, starts, occStarts, clauseOf[order], numVars
+
+def literalIndex(lit):
+    """Index 2v for the literal v and 2v+1 for -v."""
+    return 2 * np.abs(lit) + (lit < 0)
+
+def verifyModel(cnf, model):
+    """True iff the model (a list of literals) satisfies every clause of cnf."""
+    true = set(model)
+    return all(any(lit in true for lit in clause) for clause in cnf)
+
+
+# ProbSAT
+
+def probSAT(store, seed=0, maxFlips=100000, cb=2.3, eps=1.0, initial=None):
+    """
+    Run ProbSAT on the clause store.
+
+    Keyword arguments:
+    seed -- seed of the random generator
+    maxFlips -- number of flips before giving up
+    cb, eps -- a variable breaking b clauses is flipped with probability proportional to (eps + b)^-cb
+    initial -- boolean array over the variables 0..numVars to start from (random by default)
+
+    Returns a triple (satisfied, assignment, stats): assignment is the best assignment found (a model if satisfied),
+    as a list of literals.
+    """
+    lits, starts, occStarts, occClauses, numVars = store
+    rng = np.random.default_rng(seed)
+    value = rng.random(numVars + 1) < 0.5 if initial is None else np.array(initial, dtype=bool)
+    occurrences = lambda lit: occClauses[occStarts[literalIndex(lit)]:occStarts[literalIndex(lit) + 1]]
+    litTrue = (lits > 0) == value[np.abs(lits)]
+    numTrue = np.add.reduceat(litTrue.astype(np.int64), starts[:-1]) if len(lits) > 0 else np.zeros(len(starts) - 1, dtype=np.int64)
+    numTrue[starts[:-1] == starts[1:]] = 0
+    # the falsified clauses, with the position of every clause in that list (-1 if satisfied)
+    unsat = list(np.flatnonzero(numTrue == 0))
+    position = np.full(len(numTrue), -1, dtype=np.int64)
+    position[unsat] = np.arange(len(unsat))
+    best, bestValue = len(unsat), value.copy()
+    flips = 0
+    while len(unsat) > 0 and flips < maxFlips:
+        c = unsat[rng.integers(len(unsat))]
+        clause = lits[starts[c]:starts[c+1]]
+        if len(clause) == 0:
+            break
+        # flipping the variable of lit makes lit true, breaking the clauses in which -lit is the only true literal
+        breaks = np.array([np.count_nonzero(numTrue[occurrences(-lit)] == 1) for lit in clause])
+        weights = (eps + breaks) ** -cb
+        lit = clause[rng.choice(len(clause), p=weights / weights.sum())]
+        value[abs(lit)] = lit > 0
+        made = occurrences(lit)
+        numTrue[made] += 1
+        for d in made[numTrue[made] == 1]:
+            last = unsat.pop()
+            if last != d:
+                unsat[position[d]] = last
+                position[last] = position[d]
+            position[d] = -1
+        broken = occurrences(-lit)
+        numTrue[broken] -= 1
+        for d in broken[numTrue[broken] == 0]:
+            position[d] = len(unsat)
+            unsat.append(d)
+        flips += 1
+        if len(unsat) < best:
+            best, bestValue = len(unsat), value.copy()
+    assignment = [v if bestValue[v] else -v for v in range(1, numVars + 1)]
+    return best == 0, assignment, {'flips': flips, 'unsatisfied': best}
+
+def worker_probSAT(name, length, seed, maxFlips):
+    return probSAT(clauseStore(attachCNF(name, length)), seed, maxFlips)
+
+def searchModel(cnf, processes=None, seeds=None, maxFlips=100000, timeout=None):
+    """
+    Run ProbSAT with different seeds in parallel (one run per seed, by default one per core).
+
+    Returns a triple (model, phases, stats): model is a verified model of cnf or None; phases is the assignment
+    leaving the fewest clauses falsified, to be used as phase hints; stats holds the flips and the time.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    seeds = list(range(processes)) if seeds is None else seeds
+    start = time.perf_counter()
+    block, length = shareCNF(cnf)
+    pool = multiprocessing.Pool(processes)
+    model, phases, stats = None, None, {'runs': 0, 'flips': 0, 'unsatisfied': None}
+    try:
+        pending = [pool.apply_async(worker_probSAT, (block.name, length, seed, maxFlips)) for seed in seeds]
+        deadline = None if timeout is None else time.time() + timeout
+        while len(pending) > 0 and model is None and (deadline is None or time.time() < deadline):
+            for result in [r for r in pending if r.ready()]:
+                pending.remove(result)
+                satisfied, assignment, runStats = result.get()
+                stats['runs'] += 1
+                stats['flips'] += runStats['flips']
+                if stats['unsatisfied'] is None or runStats['unsatisfied'] < stats['unsatisfied']:
+                    stats['unsatisfied'], phases = runStats['unsatisfied'], assignment
+                if satisfied and verifyModel(cnf, assignment):
+                    model = assignment
+                    break
+            time.sleep(0.01)
+    finally:
+        pool.terminate()
+        pool.join()
+        block.close()
+        block.unlink()
+    stats['time'] = time.perf_counter() - start
+    return model, phases, stats
@@ -5,9 +5,12 @@
 # Multi-ballots: every agent submits a ranking over their top m agents
 # Multi-winner: up to k agents will be selected
 
-from pylgl import solve, itersolve
 from math import factorial,comb
 from itertools import combinations,permutations,product
+import numpy as np
+from clauseArrays import winnerLiterals, literalClauses, maskPairs, toClauses
+from profileCodec import rankingBallots, rankingTransitions, ballotMasks, profilesWithBallots, supportMasks, transitionArrays, \
+    profileDigits, outcomeArray
 
 
 # Basics: Voters, Profiles
@@ -133,27 +136,36 @@ def cnfNegUnanimous():
     For m == n-1: If everyone besides i has i as their lowest candidate, i will not be selected
     For m != n-1: If no one lists i among their top m candidates, if i is selected, so are all other candidates with nonempty support
     """
-    cnf = []
+    blocks = []
+    base = comb(n-1,m)*factorial(m)
+    ballots = [rankingBallots(n,m,j) for j in allVoters()]
     if m==n-1:
         for i in allVoters():
-            for r in profiles(lambda r : all(i == preflist(j, r)[m-1] for j in voters(lambda j : j != i))):
-                cnf.append([negLiteral(r,i)])
+            # voter i is free, all other voters rank i last
+            allowed = [[b for b in range(base) if j == i or ballots[j][b][m-1] == i] for j in allVoters()]
+            blocks.append(literalClauses(-winnerLiterals(profilesWithBallots(allowed, base), i, n)))
     else:
+        masks = [ballotMasks(ballots[j]) for j in allVoters()]
         for i in allVoters():
-            for r in profiles(lambda r : all(i not in preflist(j, r) for j in voters(lambda j : j != i))):
-                for j in voters(lambda x : any(x in preflist(y,r) for y in allVoters())):
-                    cnf.append([negLiteral(r,i),posLiteral(r,j)])
-    return cnf
+            # voter i is free, all other voters leave i out, every agent j with support is elected along with i
+            allowed = [[b for b in range(base) if j == i or i not in ballots[j][b]] for j in allVoters()]
+            rs = profilesWithBallots(allowed, base)
+            r, _, j = maskPairs(rs, np.full(len(rs), 1 << i), supportMasks(rs, masks, base), n)
+            blocks.append(literalClauses(-winnerLiterals(r, i, n), winnerLiterals(r, j, n)))
+    return [np.concatenate(blocks)]
     
 def cnfPosUnanimous():
     """
     If everyone besides i has i as their top candidate, i will be selected
     """
-    cnf = []
+    blocks = []
+    base = comb(n-1,m)*factorial(m)
+    ballots = [rankingBallots(n,m,j) for j in allVoters()]
     for i in allVoters():
-        for r in profiles(lambda r : all(top(j,i,r) for j in voters(lambda j : j != i))):
-            cnf.append([posLiteral(r,i)])
-    return cnf
+        # voter i is free, all other voters rank i first
+        allowed = [[b for b in range(base) if j == i or ballots[j][b][0] == i] for j in allVoters()]
+        blocks.append(literalClauses(winnerLiterals(profilesWithBallots(allowed, base), i, n)))
+    return [np.concatenate(blocks)]
     
 # Monotonicity
 
@@ -161,26 +173,11 @@ def cnfMonotonous():
     """
     If agent i is selected and only agent i either gets ranked higher by an agent or newly gets into the top m of an agent, agent i is still selected
     """
-    cnf = []
-    for i in allVoters():
-        for r1 in allProfiles():
-            for j in voters(lambda x : i in preflist(x,r1) and not top(x,i,r1)):
-                #single out the profile in which agent j ranks i one spot higher and everything else stays the same
-                #r is a j-variant of r1, the top m of r and r1 are the same, i advances one spot in the ranking, the ranking stays fixed except for the swap
-                for r2 in [r for r in profiles(lambda r : iVariants(j,r1,r) and sorted(preflist(j,r)) == sorted(preflist(j,r1))) if\
-                (preflist(j,r).index(i) == preflist(j,r1).index(i)-1) and\
-                all(preflist(j,r)[x] == preflist(j,r1)[x] for x in range(m) if x not in [preflist(j,r).index(i),preflist(j,r).index(i)+1])]:         
-                    cnf.append([negLiteral(r1,i), posLiteral(r2,i)])
-
-    for i in allVoters():
-        for r1 in allProfiles():
-            for j in voters(lambda x : i not in preflist(x,r1)):
-                #single out the profile in which agent j ranks i last among top m and everything else stays the same
-                #r is a j-variant of r1, the top m-1 of r and r1 are the same, the m-th preference in r is agent i
-                for r2 in profiles(lambda r : iVariants(j,r1,r) and preflist(j,r)[:m-2] == preflist(j,r1)[:m-2] and\
-                preflist(j,r)[m-1] == i): 
-                    cnf.append([negLiteral(r1,i), posLiteral(r2,i)])
-    return cnf
+    base = comb(n-1,m)*factorial(m)
+    transitions = [rankingTransitions(n,m,j) for j in allVoters()]
+    # r2 is the j-variant of r1 in which j ranks i one spot higher or ranks i last among her top m
+    return [np.concatenate([literalClauses(-winnerLiterals(r1, i, n), winnerLiterals(r2, i, n))
+        for r1, i, r2 in transitionArrays(transitions, base)])]
 
 # Surjectivity/Non-imposition
 
@@ -276,6 +273,7 @@ def cnfNoDummy():
 # Export CNF
     
 def saveCNF(cnf, filename):
+    cnf = toClauses(cnf)
     nvars = max([abs(lit) for clause in cnf for lit in clause])
     nclauses = len(cnf)
     file = open(filename, 'w')
@@ -286,24 +284,40 @@ def saveCNF(cnf, filename):
 
 # Interpret Outcome
 
+def decodeRule(model):
+    """
+    Boolean array (number of profiles, n) with entry [r, x] True iff x is selected in profile r, read from the winner
+    variables posLiteral(r,x) of the model (wherever they occur in it).
+    """
+    return outcomeArray(model, n, len(allProfiles()))
+
+def formatProfile(r, winners):
+    return str([rankingBallots(n,m,i)[b] for i, b in enumerate(profileDigits([r], comb(n-1,m)*factorial(m), n)[0])]) + ' --> ' + str(winners)
+
+def ruleLines(outcomes, condition=None):
+    """
+    Lazily format the profiles r with their winners in the outcome array (see decodeRule) for which condition(r, winners)
+    holds (all profiles by default), e.g. condition=lambda r, winners: 0 in winners for the profiles in which voter 0 wins.
+    """
+    for r in allProfiles():
+        winners = np.flatnonzero(outcomes[r]).tolist()
+        if condition is None or condition(r, winners):
+            yield formatProfile(r, winners)
+
 def interpret(variable):
     r = (variable - 1) // n
     x = (variable - 1) % n
-    profilesList = [preflist(i,r) for i in allVoters()]
-    print(str(profilesList) + ' --> ' + str(x))  
+    print(formatProfile(r, x))
 
-def extractRule(model):
-    rule = []
-    j=0
-    for r in allProfiles():
-        profilesList = [preflist(i,r) for i in allVoters()]
-        rule.append(str(profilesList) + ' --> ' + str([(abs(i)-1) % n for i in model[n*j:n*(j+1)] if i>0]))
-        j+=1
+def extractRule(model, condition=None):
+    """Print the rule given by the model, restricted to the profiles selected by condition (see ruleLines), and return
+    the printed lines. Use decodeRule for the rule as an outcome array."""
+    rule = list(ruleLines(decodeRule(model), condition))
     for R in rule:
         print(R)
     return rule
 
 # SAT-solving
 
-#print('impartial + neg unan + pos unan together are satisfiable: ' + str(isinstance(solve(cnfAtLeastOne() + cnfAtLeastK() + cnfAtMostK() + cnfImpartial() + cnfNegUnanimous() + cnfPosUnanimous()),list)))
-#print('impartial + neg unan + noexcl + monotonous together are satisfiable: ' + str(isinstance(solve(cnfAtLeastOne() + cnfAtLeastK() + cnfAtMostK() + cnfImpartial() + cnfNegUnanimous() + cnfNoExclusion() + cnfMonotonous()),list)))
+#print('impartial + neg unan + pos unan together are satisfiable: ' + str(solveCNF(toClauses(cnfAtLeastOne() + cnfAtLeastK() + cnfAtMostK() + cnfImpartial() + cnfNegUnanimous() + cnfPosUnanimous())).verdict))
+#print('impartial + neg unan + noexcl + monotonous together are satisfiable: ' + str(solveCNF(toClauses(cnfAtLeastOne() + cnfAtLeastK() + cnfAtMostK() + cnfImpartial() + cnfNegUnanimous() + cnfNoExclusion() + cnfMonotonous())).verdict))
@@ -0,0 +1,224 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Dry-run planning of sweeps from closed-form clause and variable counts
+
+"""For every cnf* function of iteratePeerGrading.main, counts gives the number of clauses and literals and the size of
+the variable space from combinatorial formulas, without generating anything. With P = B^n profiles, where
+B = C(n-1,m) m! is the number of ballots of a voter, e.g. cnfImpartial has n P B binary clauses (one per voter, profile
+and i-variant), and cnfMonotonous has n P ((m-1) + (n-1-m) t) clauses, where t is the number of ballots by which a
+voter lets an unranked agent enter her top m. Only cnfAnonymous has no closed form: its clauses are counted by sorting
+the ballot ids of every profile, and bounded by n! P beyond maxAnonymousProfiles profiles.
+
+The generation time of an axiom is its work (the literals it writes, the pairs of profiles the Python loops of
+cnfImpartial and cnfAnonymous compare, or the pairs cnfNoDummy searches) times seconds per unit of work, and its memory
+is bytes per literal and per clause of the resulting list of lists. calibrate fits both from a cnfBenchmark.py result;
+the defaults were measured on a laptop. plan checks every (n, m, k) of a sweep against the memory of the node and the generation timeout of main,
+and iterate(plan=...) skips the axioms that would exceed them and processes the cheapest cells first:
+
+    python planner.py --n 3 4 5 [--benchmark cnf_benchmark.json] [--memory GB] [--timeout s]"""
+
+import argparse
+import json
+import os
+from math import comb, factorial
+import numpy as np
+from profileCodec import numRankingBallots, rankingBallotIds, profileDigits
+from instrumentation import table
+
+# profiles up to which the clauses of cnfAnonymous are counted exactly
+maxAnonymousProfiles = 10**6
+
+# seconds per unit of work and bytes per literal, measured on a laptop (see calibrate)
+defaultSeconds = {'cnfImpartial': 8.0e-7, 'cnfAnonymous': 2.0e-6, 'cnfNoDummy': 3.0e-8}
+defaultSecondsPerLiteral = 8.0e-7
+bytesPerLiteral = 40 #a pointer and an int object
+bytesPerClause = 72 #a list object with some overallocation
+
+# the outcome sizes of main if none are given
+defaultOutSize = ["cnfAtLeastOne()+cnfAtMostK()","cnfAtMostK()","cnfAtLeastK()+cnfAtMostK()"]
+
+
+# Counts
+
+def anonymousPairs(n, m):
+    """Number of pairs (r1, r2) of profiles whose ballots are permutations of each other (see vPermutation), or None."""
+    base = numRankingBallots(n, m)
+    if base**n > maxAnonymousProfiles:
+        return None
+    ids = rankingBallotIds(n, m)
+    digits = profileDigits(np.arange(base**n), base, n)
+    shared = np.sort(np.stack([ids[i][digits[:,i]] for i in range(n)], axis=1), axis=1)
+    # one number per multiset of ballots (with n digits in base comb(n,m) m!) is much faster to count than rows
+    key = np.zeros(len(shared), dtype=np.int64)
+    for i in range(n):
+        key = key * (comb(n,m) * factorial(m)) + shared[:,i]
+    counts = np.unique(key, return_counts=True)[1]
+    return int((counts.astype(np.int64)**2).sum())
+
+def monotoneTransitions(n, m):
+    """Number of monotone transitions of a single ballot (see profileCodec.rankingTransitions)."""
+    # an unranked agent enters position m, position m-1 is free (for m == 1 the slicing keeps no agent fixed)
+    entering = 1 if m == 1 else n - m
+    return (m - 1) + (n - 1 - m) * entering
+
+def counts(name, n, m, k):
+    """
+    Dictionary with the number of clauses, literals and variables (the largest variable the axiom can use) of the
+    cnf* function name of iteratePeerGrading.main, its work and whether the counts are exact.
+    """
+    base = numRankingBallots(n, m)
+    P = base**n
+    winners = n * P
+    exact = True
+    if name == 'cnfAtLeastOne':
+        clauses, literals = P, n * P
+    elif name == 'cnfAtMostK':
+        clauses = P * comb(n,k) * (n-k)
+        literals = clauses * (k+1)
+    elif name == 'cnfAtLeastK':
+        clauses = P * comb(n,n-k) * k
+        literals = clauses * (n-k+1)
+    elif name == 'cnfImpartial':
+        clauses = n * P * base
+        literals = 2 * clauses
+        work = n * P * P * n
+    elif name == 'cnfNegUnanimous':
+        if m == n-1:
+            # all other voters rank i last
+            clauses = n * base * factorial(m-1)**(n-1)
+            literals = clauses
+        else:
+            # all other voters leave i out, one clause for every agent j listed by some voter
+            avoid = comb(n-2,m) * factorial(m)
+            avoidBoth = comb(n-3,m) * factorial(m)
+            clauses = n * (n-1) * (base * avoid**(n-1) - avoid * avoid * avoidBoth**(n-2))
+            literals = 2 * clauses
+    elif name == 'cnfPosUnanimous':
+        clauses = n * base * (comb(n-2,m-1) * factorial(m-1))**(n-1)
+        literals = clauses
+    elif name == 'cnfMonotonous':
+        clauses = n * P * monotoneTransitions(n, m)
+        literals = 2 * clauses
+    elif name == 'cnfNoExclusion':
+        clauses, literals = n, n * P
+    elif name == 'cnfSurjective':
+        clauses = comb(n,k) + P * comb(n,k) * (k+1)
+        literals = comb(n,k) * P + P * comb(n,k) * (3*k + 1)
+        winners += P * comb(n,k)
+    elif name == 'cnfNonConstant':
+        clauses, literals = comb(n,k), comb(n,k) * P * k
+    elif name == 'cnfAnonymous':
+        pairs = anonymousPairs(n, m)
+        if pairs is None:
+            pairs, exact = factorial(n) * P, False
+        clauses = 2 * n * pairs
+        literals = 2 * clauses
+        work = P * P * n * base
+    elif name == 'cnfNondictatorial':
+        clauses, literals = n, n * P * (min(k-1,m) + 1)
+    elif name == 'cnfNoDummy':
+        # the D-variables of every voter, profile, i-variant and winner (main discards the result)
+        clauses = 3 * n * n * P * base + n
+        literals = 8 * n * n * P * base
+        winners += P * comb(n,k) + n * P * P
+        work = 4 * n * n * P * base * P * P #every D-literal searches the list of all pairs of profiles
+    else:
+        raise ValueError('no counts for ' + name)
+    if name not in defaultSeconds:
+        work = literals
+    return {'clauses': clauses, 'literals': literals, 'variables': winners, 'work': work, 'exact': exact}
+
+def axiomNames(expressions):
+    """The cnf* functions occurring in the given expressions, as parsed by main (e.g. "cnfImpartial()+cnfAnonymous()")."""
+    return sorted(set(s.strip().replace("()","") for x in expressions for s in x.split("+")))
+
+
+# Calibration
+
+def calibrate(filename='cnf_benchmark.json', module='iteratePeerGrading'):
+    """
+    Seconds per unit of work of every axiom and bytes per literal, fitted from the largest successful generation of
+    every axiom of module in a cnfBenchmark.py result. Axioms not in the benchmark keep the defaults.
+    """
+    with open(filename) as file:
+        records = [r for r in json.load(file)['records'] if r['module'] == module and 'axiom' in r and r.get('status') == 'ok']
+    seconds, memory = {}, []
+    for record in sorted(records, key=lambda r: r['wall']):
+        c = counts(record['axiom'], record['n'], record['m'], record['k'])
+        seconds[record['axiom']] = record['wall'] / max(c['work'], 1)
+        if record['memory'] > 1 << 24:
+            memory.append(record['memory'] / (c['literals'] + c['clauses']))
+    return {'seconds': seconds, 'bytes': max(memory) if len(memory) > 0 else None}
+
+def estimate(name, n, m, k, calibration=None):
+    """Counts of an axiom together with its estimated generation seconds and memory (bytes) as a list of lists."""
+    c = counts(name, n, m, k)
+    seconds = (calibration or {}).get('seconds', {}).get(name, defaultSeconds.get(name, defaultSecondsPerLiteral))
+    size = (calibration or {}).get('bytes')
+    c['seconds'] = c['work'] * seconds
+    c['memory'] = (c['literals'] + c['clauses']) * size if size else c['literals'] * bytesPerLiteral + c['clauses'] * bytesPerClause
+    return c
+
+
+# Planning
+
+def nodeMemory():
+    """Physical memory of this machine in bytes."""
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+def plan(nRange, ax, mRange=False, kRange=False, outSize=False, memory=None, timeout=18000, calibration=None):
+    """
+    Plan a sweep as iterate would run it. Returns a dictionary mapping every (n, m, k) to a dictionary with
+    axioms -- the estimate of every axiom occurring in ax
+    infeasible -- the axioms whose generation exceeds the timeout or whose generation (holding the CNF and its pickled
+                  copy) exceeds the memory
+    memory -- bytes the parent holds: all feasible axioms and the outcome size constraints
+    seconds -- estimated seconds to generate the feasible axioms
+    feasible -- no axiom is infeasible and the parent fits into memory
+    """
+    memory = memory or nodeMemory()
+    mRange = mRange or range(1,max(nRange))
+    kRange = kRange or range(1,max(nRange))
+    names = axiomNames(ax)
+    sizes = axiomNames(outSize or defaultOutSize)
+    cells = {}
+    for n in nRange:
+        for k in (x for x in kRange if x < n):
+            for m in (x for x in mRange if x < n):
+                axioms = {name: estimate(name, n, m, k, calibration) for name in names}
+                infeasible = [name for name, e in axioms.items() if e['seconds'] > timeout or 2 * e['memory'] > memory]
+                held = sum(e['memory'] for name, e in axioms.items() if name not in infeasible) \
+                    + sum(estimate(name, n, m, k, calibration)['memory'] for name in sizes)
+                cells[(n,m,k)] = {'axioms': axioms, 'infeasible': infeasible, 'memory': held,
+                    'seconds': sum(e['seconds'] for name, e in axioms.items() if name not in infeasible),
+                    'feasible': len(infeasible) == 0 and held <= memory}
+    return cells
+
+def order(cells):
+    """The (n, m, k) of a plan, the cheapest first and the infeasible ones last."""
+    return sorted(cells, key=lambda key: (not cells[key]['feasible'], cells[key]['seconds'], cells[key]['memory']))
+
+def report(cells):
+    """Format a plan: one row per (n, m, k) and axiom, with the infeasible axioms marked."""
+    rows = []
+    for key in sorted(cells):
+        for name, e in sorted(cells[key]['axioms'].items()):
+            rows.append([str(key), name, e['clauses'], e['literals'], e['variables'], 'yes' if e['exact'] else 'bound',
+                e['seconds'], e['memory'] // 2**20, 'SKIP' if name in cells[key]['infeasible'] else ''])
+        rows.append([str(key), 'total', '', '', '', '', cells[key]['seconds'], cells[key]['memory'] // 2**20, '' if cells[key]['feasible'] else 'INFEASIBLE'])
+    return table(rows, ['n,m,k', 'axiom', 'clauses', 'literals', 'variables', 'exact', 'est. s', 'est. MB', ''])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Plan a sweep of iteratePeerGrading without generating any CNF.')
+    parser.add_argument('--n', type=int, nargs='+', default=[3,4,5])
+    parser.add_argument('--axioms', nargs='+', default=["cnfImpartial()+cnfNegUnanimous()+cnfPosUnanimous()+cnfMonotonous()+cnfNoExclusion()"
+        "+cnfNondictatorial()+cnfAnonymous()+cnfSurjective()+cnfNonConstant()"])
+    parser.add_argument('--benchmark', help='cnfBenchmark.py result to calibrate the estimates')
+    parser.add_argument('--memory', type=float, help='memory of the node in GB (this machine by default)')
+    parser.add_argument('--timeout', type=float, default=18000)
+    arguments = parser.parse_args()
+    calibration = calibrate(arguments.benchmark) if arguments.benchmark else None
+    cells = plan(arguments.n, arguments.axioms, memory=arguments.memory and arguments.memory * 2**30,
+        timeout=arguments.timeout, calibration=calibration)
+    print(report(cells))
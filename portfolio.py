@@ -0,0 +1,130 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Racing a portfolio of SAT solvers on the same CNF
+
+"""Which solver is fast differs a lot between cells: an instance on which Lingeling runs for hours may take seconds in
+CaDiCaL or with a different clause order. race launches several configurations in parallel, takes the first
+definitive answer and terminates the others. The CNF is written once into shared memory as a flat array of literals
+(each clause terminated by 0), which every racer reads without receiving its own pickled copy. The winning
+configuration of every cell is recorded in a JSON file, and configurations that won before are launched first."""
+
+import json
+import os
+import random
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from queue import Empty
+import numpy as np
+from satSolvers import solveCNF
+
+defaultConfigurations = [('pylgl',None),('cadical153',None),('glucose4',None),('maplesat',None),('cadical153',1),('pycosat',None)]
+
+
+# Sharing the CNF
+
+def shareCNF(cnf):
+    """Write cnf into a new shared memory block as a flat int32 array. Returns the block and the number of entries."""
+    flat = np.fromiter((lit for clause in cnf for lit in clause + [0]), dtype=np.int32)
+    block = shared_memory.SharedMemory(create=True, size=max(flat.nbytes, 1))
+    np.ndarray(flat.shape, dtype=np.int32, buffer=block.buf)[:] = flat
+    return block, len(flat)
+
+def attachCNF(name, length):
+    """Read the CNF written by shareCNF from the shared memory block with the given name."""
+    block = shared_memory.SharedMemory(name=name)
+    flat = np.ndarray((length,), dtype=np.int32, buffer=block.buf)
+    ends = np.flatnonzero(flat == 0)
+    starts = np.r_[0, ends[:-1] + 1]
+    cnf = [flat[s:e].tolist() for s, e in zip(starts, ends)]
+    del flat
+    block.close()
+    return cnf
+
+
+# Configurations
+
+def configurationName(configuration):
+    solver, seed = configuration
+    return solver if seed is None else solver + ' seed=' + str(seed)
+
+def shuffled(cnf, seed):
+    """cnf with the order of the clauses and of the literals within them shuffled, to diversify the search."""
+    rng = random.Random(seed)
+    cnf = [rng.sample(clause, len(clause)) for clause in cnf]
+    rng.shuffle(cnf)
+    return cnf
+
+def loadWinners(record):
+    if record is None or not os.path.exists(record):
+        return {}
+    with open(record) as file:
+        return json.load(file)
+
+def preferredOrder(configurations, key, winners):
+    """Sort configurations: the winner of the cell key first, then by the number of cells won overall."""
+    counts = {}
+    for name in winners.values():
+        counts[name] = counts.get(name, 0) + 1
+    return sorted(configurations, key=lambda c: (winners.get(key) != configurationName(c), -counts.get(configurationName(c), 0)))
+
+
+# Racing
+
+def worker_race(queue, name, length, configuration):
+    cnf = attachCNF(name, length)
+    solver, seed = configuration
+    if seed is not None:
+        cnf = shuffled(cnf, seed)
+    result = solveCNF(cnf, solver)
+    queue.put((configurationName(configuration), result.verdict, result.time))
+
+def race(cnf, configurations=defaultConfigurations, key=None, timeout=600, record='portfolio_winners.json', maxProcesses=None):
+    """
+    Solve cnf with several configurations in parallel and return the first definitive answer.
+
+    Keyword arguments:
+    configurations -- list of pairs (solver, seed) where solver is a backend of satSolvers.solveCNF and seed (or None)
+                      shuffles the clauses
+    key -- name of the cell (e.g. parameters and axioms), under which the winning configuration is recorded
+    timeout -- seconds after which all racers are stopped
+    record -- JSON file mapping cells to their winning configuration (None to not record)
+    maxProcesses -- number of configurations launched, all of them by default; the ones that won before go first
+
+    Returns a triple (verdict, winner, stats): verdict is True, False or None (if no racer finished in time), winner the
+    name of the winning configuration and stats maps the configurations that finished to their verdict and time.
+    """
+    winners = loadWinners(record)
+    configurations = preferredOrder(configurations, key, winners)[:maxProcesses or len(configurations)]
+    block, length = shareCNF(cnf)
+    queue = multiprocessing.Queue()
+    racers = [multiprocessing.Process(target=worker_race, name="SAT race", args=(queue, block.name, length, c)) for c in configurations]
+    verdict, winner, stats = None, None, {}
+    try:
+        for p in racers:
+            p.start()
+        deadline = time.time() + timeout
+        while verdict is None and len(stats) < len(racers) and time.time() < deadline:
+            try:
+                name, v, seconds = queue.get(timeout=min(1, max(deadline - time.time(), 0.01)))
+            except Empty:
+                # a racer that crashed never reports, so stop waiting once all racers have exited
+                if all(not p.is_alive() for p in racers) and queue.empty():
+                    break
+                continue
+            stats[name] = (v, seconds)
+            if v is not None:
+                verdict, winner = v, name
+    finally:
+        for p in racers:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+        block.close()
+        block.unlink()
+    if winner is not None and record is not None and key is not None:
+        winners = loadWinners(record)
+        winners[key] = winner
+        with open(record, 'w') as file:
+            json.dump(winners, file, indent=1, sort_keys=True)
+    return verdict, winner, stats
@@ -0,0 +1,93 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Preprocessing of CNFs before they are handed to a SAT solver
+
+"""Many of our instances are already decided by the unit clauses that some axioms produce (e.g. cnfPosUnanimous and,
+for m == n-1, cnfNegUnanimous). Unit propagation together with pure literal elimination over the concatenated axioms
+either decides such an instance right away or leaves a smaller, equisatisfiable CNF for the solver."""
+
+from satSolvers import solveCNF
+
+def simplify(cnf):
+    """
+    Propagate unit clauses and pure literals through cnf.
+
+    Returns a triple (verdict, cnf, assignment):
+    verdict -- False if propagation derives the empty clause, True if every clause is satisfied, None otherwise
+    cnf -- the remaining clauses with satisfied clauses and false literals removed (equisatisfiable with the input)
+    assignment -- the set of literals fixed during propagation
+    """
+    # Remove duplicate literals and tautologies (e.g. cnfImpartial relates every profile to itself).
+    clauses = []
+    for clause in cnf:
+        clause = list(dict.fromkeys(clause))
+        if len(clause) == 0:
+            return False, [[]], set()
+        literals = set(clause)
+        if not any(-lit in literals for lit in clause if lit > 0):
+            clauses.append(clause)
+
+    # For every literal the clauses it occurs in.
+    occurrences = {}
+    for c, clause in enumerate(clauses):
+        for lit in clause:
+            occurrences.setdefault(lit, []).append(c)
+
+    assignment = set()
+    satisfied = [False] * len(clauses)
+    falseCount = [0] * len(clauses)
+
+    def assign(lit, queue):
+        """Set lit to true and queue the clauses that became unit. Returns False on a conflict."""
+        assignment.add(lit)
+        for c in occurrences.get(lit, []):
+            satisfied[c] = True
+        for c in occurrences.get(-lit, []):
+            falseCount[c] += 1
+            if satisfied[c]:
+                continue
+            if falseCount[c] == len(clauses[c]):
+                return False
+            if falseCount[c] == len(clauses[c]) - 1:
+                queue.append(c)
+        return True
+
+    def propagate(queue):
+        while queue:
+            c = queue.pop()
+            if satisfied[c]:
+                continue
+            unassigned = [lit for lit in clauses[c] if lit not in assignment and -lit not in assignment]
+            if len(unassigned) == 0:
+                return False
+            if not assign(unassigned[0], queue):
+                return False
+        return True
+
+    queue = [c for c, clause in enumerate(clauses) if len(clause) == 1]
+    while True:
+        if not propagate(queue):
+            return False, [[]], assignment
+        # Pure literals never cause a conflict, but satisfying their clauses can make further literals pure.
+        remaining = set(lit for c, clause in enumerate(clauses) if not satisfied[c] for lit in clause \
+            if lit not in assignment and -lit not in assignment)
+        pure = [lit for lit in remaining if -lit not in remaining]
+        if len(pure) == 0:
+            break
+        for lit in pure:
+            assign(lit, queue)
+
+    cnf = [[lit for lit in clause if -lit not in assignment] for c, clause in enumerate(clauses) if not satisfied[c]]
+    if len(cnf) == 0:
+        return True, cnf, assignment
+    return None, cnf, assignment
+
+def decide(cnf, solver='pylgl'):
+    """
+    Decide satisfiability of cnf, calling the SAT solver (see satSolvers.py) only if preprocessing does not settle the instance.
+    Returns a pair (satisfiable, preprocessed) where preprocessed tells whether the verdict came from preprocessing.
+    """
+    verdict, cnf, assignment = simplify(cnf)
+    if verdict is not None:
+        return verdict, True
+    return solveCNF(cnf, solver).verdict, False
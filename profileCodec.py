@@ -0,0 +1,180 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Tables for encoding and decoding profiles
+
+"""A profile is a number with n digits in base B (the number of ballots a single voter can submit), where digit i is the
+index of the ballot of voter i. The functions below compute the ballot tables once, so that tools working on whole
+arrays of profiles do not have to call preflist for every single profile."""
+
+from math import factorial, comb
+from itertools import combinations, permutations
+from functools import lru_cache
+import numpy as np
+
+
+# Ranking ballots
+
+def numRankingBallots(n, m):
+    return comb(n-1,m)*factorial(m)
+
+@lru_cache(maxsize=None)
+def rankingBallots(n, m, i):
+    """
+    All ballots of voter i in the order used by preflist: all subsets of size m of N\{i} and for each subset all orders on it.
+    """
+    return [ballot for selection in combinations([j for j in range(n) if j != i],m) for ballot in permutations(selection)]
+
+@lru_cache(maxsize=None)
+def rankingBallotIndex(n, m, i):
+    """Dictionary mapping each ballot of voter i to its index."""
+    return {ballot: b for b, ballot in enumerate(rankingBallots(n, m, i))}
+
+@lru_cache(maxsize=None)
+def rankingTransitions(n, m, j):
+    """
+    Monotone transitions of the ballots of voter j, as used by cnfMonotonous.
+    Returns a list indexed by ballot index b holding a dictionary {i: [b2,...]}, where b2 ranges over the ballots
+    by which j improves the position of agent i and changes nothing else:
+    either j ranks i one spot higher (swapping i with the agent above) or i newly enters the top m of j.
+    """
+    ballots = rankingBallots(n, m, j)
+    index = rankingBallotIndex(n, m, j)
+    transitions = []
+    for ballot in ballots:
+        edges = {}
+        for i in range(n):
+            if i in ballot and ballot[0] != i:
+                p = ballot.index(i)
+                swapped = list(ballot)
+                swapped[p-1], swapped[p] = swapped[p], swapped[p-1]
+                edges[i] = [index[tuple(swapped)]]
+            elif i not in ballot:
+                # slicing as in cnfMonotonous: the first m-2 agents are kept and i is ranked in position m
+                edges[i] = [b2 for b2, other in enumerate(ballots) if other[:m-2] == ballot[:m-2] and other[m-1] == i]
+        transitions.append(edges)
+    return transitions
+
+def rankingBallotIds(n, m):
+    """
+    Array (n, B) mapping the ballot index of every voter to an id shared by all voters, so that two voters submitting
+    the same ranking get the same id (as compared by vPermutation).
+    """
+    ids = {ballot: g for g, ballot in enumerate(permutations(range(n), m))}
+    return np.array([[ids[ballot] for ballot in rankingBallots(n, m, i)] for i in range(n)], dtype=np.int64)
+
+
+# Approval ballots
+
+def numApprovalBallots(n, m, minSize=0):
+    return sum(comb(n-1,size) for size in range(minSize,m+1))
+
+@lru_cache(maxsize=None)
+def approvalBallots(n, m, i, minSize=0):
+    """
+    All ballots of voter i in the order used by approvalSet: all subsets of N\{i} of size minSize up to m, by size.
+    minSize is 1 if empty ballots are not allowed.
+    """
+    return [ballot for size in range(minSize,m+1) for ballot in combinations([j for j in range(n) if j != i],size)]
+
+@lru_cache(maxsize=None)
+def approvalTransitions(n, m, j, minSize=0):
+    """
+    Monotone transitions of the ballots of voter j, as used by cnfMonotonicity.
+    Returns a list indexed by ballot index b holding a dictionary {i: [b2,...]}, where i is not approved on b and b2
+    ranges over the ballots that approve of i besides or instead of some of the agents approved on b.
+    """
+    ballots = approvalBallots(n, m, j, minSize)
+    transitions = []
+    for ballot in ballots:
+        edges = {}
+        for i in range(n):
+            if i != j and i not in ballot:
+                edges[i] = [b2 for b2, other in enumerate(ballots) if i in other and len(other) >= len(ballot) and \
+                    all(x in ballot for x in other if x != i)]
+        transitions.append(edges)
+    return transitions
+
+
+# Supported agents
+
+def ballotMasks(ballots):
+    """Bitmask of the agents listed on each of the given ballots (bit x is set iff x is ranked or approved)."""
+    return [sum(1 << x for x in ballot) for ballot in ballots]
+
+def profilesWithBallots(allowed, base):
+    """
+    Sorted array of the profiles in which every voter i submits one of the ballots with index in allowed[i], generated
+    directly by fixing the constrained digits and iterating the free ones.
+    """
+    profiles = np.zeros(1, dtype=np.int64)
+    for i, ballots in enumerate(allowed):
+        profiles = (profiles[:,None] + np.asarray(ballots, dtype=np.int64) * base**i).ravel()
+    return np.sort(profiles)
+
+def supportMasks(profiles, masks, base):
+    """
+    For every profile the bitmask of the agents that are listed by some voter, where masks[i] holds the ballotMasks
+    of voter i.
+    """
+    digits = profileDigits(profiles, base, len(masks))
+    support = np.zeros(len(digits), dtype=np.int64)
+    for i in range(len(masks)):
+        support |= np.asarray(masks[i], dtype=np.int64)[digits[:,i]]
+    return support
+
+def completeMasks(profiles, masks, base):
+    """
+    For every profile the bitmask of the agents that are listed by all other voters, where masks[i] holds the
+    ballotMasks of voter i.
+    """
+    n = len(masks)
+    digits = profileDigits(profiles, base, n)
+    complete = np.full(len(digits), (1 << n) - 1, dtype=np.int64)
+    for i in range(n):
+        # voter i never lists herself, so she does not count against i
+        complete &= np.asarray(masks[i], dtype=np.int64)[digits[:,i]] | (1 << i)
+    return complete
+
+
+# Profiles
+
+def transitionArrays(transitions, base):
+    """
+    Generate for every voter j the arrays (r1, i, r2) of the triples such that r2 is the j-variant of r1 in which voter j
+    replaces her ballot by one of the ballots transitions[j][b][i] (see rankingTransitions, approvalTransitions), where
+    b is her ballot in r1. The profiles are obtained by substituting digit j, so only the emitted pairs are ever visited.
+    """
+    n = len(transitions)
+    for j in range(n):
+        r1s, agents, shifts = [], [], []
+        for b, edges in enumerate(transitions[j]):
+            if len(edges) == 0:
+                continue
+            rs = profilesWithBallots([[b] if x == j else range(base) for x in range(n)], base)
+            for i, targets in edges.items():
+                for b2 in targets:
+                    r1s.append(rs)
+                    agents.append(np.full(len(rs), i, dtype=np.int64))
+                    shifts.append(np.full(len(rs), (b2 - b) * base**j, dtype=np.int64))
+        if len(r1s) == 0:
+            continue
+        r1 = np.concatenate(r1s)
+        yield r1, np.concatenate(agents), r1 + np.concatenate(shifts)
+
+def profileDigits(profiles, base, n):
+    """
+    Array (len(profiles), n) whose column i holds the ballot index of voter i in each of the given profiles.
+    """
+    profiles = np.asarray(profiles, dtype=np.int64)
+    return np.stack([(profiles // base**i) % base for i in range(n)], axis=1)
+
+def outcomeArray(model, n, numProfiles):
+    """
+    Boolean array (numProfiles, n) with entry [r, x] True iff x is selected in profile r, i.e. iff the variable
+    r * n + x + 1 is true in model. Variables missing from the model count as false.
+    """
+    model = np.asarray(model, dtype=np.int64)
+    positive = model[(model > 0) & (model <= numProfiles * n)]
+    outcomes = np.zeros(numProfiles * n, dtype=bool)
+    outcomes[positive - 1] = True
+    return outcomes.reshape(numProfiles, n)
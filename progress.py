@@ -0,0 +1,77 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Progress of CNF generation in a child process
+
+"""The generators of iteratePeerGrading.main run in a child process that the parent kills after a fixed time. A
+generator reports how much of its outer loop (e.g. the profiles r1 of cnfImpartial) it has processed and how many
+clauses it has produced through a Progress, a few doubles in shared memory written at most a thousand times per
+generation. The parent polls them with watch, prints the fraction done, the clauses per second, the projected time to
+completion and the peak RSS of the child, and can give up on a generation as soon as its projected completion exceeds
+the time left."""
+
+import multiprocessing
+import time
+from instrumentation import peakRSS, emit
+
+# positions in the shared array
+DONE, TOTAL, CLAUSES, RSS = range(4)
+
+
+class Progress:
+    def __init__(self, steps=1000):
+        self.values = multiprocessing.Array('d', 4, lock=False)
+        self.steps = steps
+        self.next = 0
+
+    def update(self, done, total, clauses):
+        """Record that done of total units of work are finished and clauses were generated so far (in the child)."""
+        if done < self.next and done < total:
+            return
+        self.next = done + max(1, total // self.steps)
+        self.values[TOTAL] = total
+        self.values[CLAUSES] = clauses
+        self.values[RSS] = peakRSS()
+        self.values[DONE] = done
+
+    def fraction(self):
+        return self.values[DONE] / self.values[TOTAL] if self.values[TOTAL] > 0 else 0.0
+
+
+def report(name, progress, elapsed, budget):
+    """
+    The progress of the generation of name after elapsed seconds as a dictionary with the fraction done, the clauses
+    per second, the projected seconds to completion (None as long as nothing is done) and the peak RSS in MB, and a
+    line to print.
+    """
+    fraction = progress.fraction()
+    rate = progress.values[CLAUSES] / elapsed if elapsed > 0 else 0.0
+    eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+    status = {'fraction': fraction, 'rate': rate, 'eta': eta, 'mb': progress.values[RSS] / 2**20}
+    line = name + ': ' + '%.1f' % (100 * fraction) + '% after ' + '%.0f' % elapsed + 's, ' + '%.0f' % rate + ' clauses/s, ETA ' \
+        + ('unknown' if eta is None else '%.0f' % eta + 's') + ' (' + '%.0f' % (budget - elapsed) + 's left), ' + '%.0f' % status['mb'] + ' MB'
+    return status, line
+
+def watch(process, name, progress, timeout, interval=30, abort=False, minFraction=0.01, events=None, **fields):
+    """
+    Wait for the started generating process for at most timeout seconds, reporting its progress every interval seconds.
+    With abort, the process is given up as soon as at least minFraction of the work is done and the projected completion
+    lies beyond the timeout. Every report is also emitted as a 'progress' event. The caller terminates the process if it
+    is still alive.
+
+    Returns 'done', 'timeout' or 'aborted'.
+    """
+    start = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - start
+        process.join(max(0, min(interval, timeout - elapsed)))
+        elapsed = time.perf_counter() - start
+        if not process.is_alive():
+            return 'done'
+        if elapsed >= timeout:
+            return 'timeout'
+        status, line = report(name, progress, elapsed, timeout)
+        print(line)
+        emit(events, 'progress', axiom=name, elapsed=elapsed, **status, **fields)
+        if abort and status['fraction'] >= minFraction and elapsed + status['eta'] > timeout:
+            print(name + ': projected completion exceeds the time left, giving up')
+            return 'aborted'
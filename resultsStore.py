@@ -0,0 +1,119 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Append-only store of sweep results
+
+"""The results files of iterate are free text and are truncated when a sweep starts, so a killed job loses what it
+found and a rerun starts from scratch. With a store, iterate appends one JSON object per line for every instance
+(module, n, m, k, axiom set, outcome size and encoding version with the verdict, the note of the result line, the
+seconds spent on it and the solver) and one for every finished cell (n, m, k) of a sweep, holding its result lines.
+Reruns take complete cells from the store instead of recomputing them. A cell counts as complete if no generation or
+solve in it timed out, and results of an older encoding version are never reused. The iterate functions of the
+approval modules use the same store under their own module names; their cells are always complete. export regenerates
+the text format of iterate (e.g. approval_results.txt) and importText reads a file written without a store into it:
+
+    python resultsStore.py export results.jsonl holzman_thm3_thm4.txt [module]
+    python resultsStore.py import approval_results.txt results.jsonl iterateApprovalPeerGrading"""
+
+import json
+import os
+import sys
+import time
+from instrumentation import loadEvents
+
+
+def append(filename, record):
+    """Append a record (a dictionary) to the store, with the time it was stored."""
+    record = dict(record, time=time.time())
+    with open(filename, 'a') as file:
+        file.write(json.dumps(record, default=str) + '\n')
+
+def load(filename):
+    """All records of the store, oldest first (no records if the store does not exist yet)."""
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def sweepKey(module, n, m, k, axLabels, outSizeLabels, encoding):
+    return (module, n, m, k, tuple(str(a) for a in axLabels), tuple(str(o) for o in outSizeLabels), encoding)
+
+def recordKey(record):
+    return (record['module'], record['n'], record['m'], record['k'], tuple(record['axioms']), tuple(record['outSizes']), record['encoding'])
+
+def completedCells(records):
+    """The latest complete cell record for every key (see sweepKey)."""
+    return {recordKey(r): r for r in records if r['kind'] == 'cell' and r['complete']}
+
+def parseResult(line, axLabels, outSizeLabels):
+    """Axiom label, outcome size label, verdict and note (or None) of a result line of main, or None if it is none."""
+    for a in axLabels:
+        for o in outSizeLabels:
+            prefix = str(a)+' '+str(o)+': '
+            if line.startswith(prefix):
+                verdict, _, note = line[len(prefix):].partition(' [')
+                return str(a), str(o), {'True': True, 'False': False}.get(verdict), note[:-1] if note else None
+    return None
+
+def storeCell(filename, module, n, m, k, axLabels, outSizeLabels, encoding, results, complete, seconds, solver=None, run=None, events=None):
+    """
+    Append a record for every result line of a cell and one for the cell. The seconds of an instance are the wall time
+    of the preprocessing and solve events of the run for it in this cell (see instrumentation.py), None without events.
+    """
+    timings = {}
+    if events is not None and run is not None and os.path.exists(events):
+        for e in loadEvents(events, run):
+            if e['event'] in ['preprocess', 'solve'] and 'axioms' in e and (e['n'], e['m'], e['k']) == (n, m, k):
+                timings[e['axioms']] = timings.get(e['axioms'], 0.0) + e.get('wall', 0.0)
+    cell = {'module': module, 'n': n, 'm': m, 'k': k, 'encoding': encoding, 'solver': solver, 'run': run}
+    for line in results:
+        parsed = parseResult(line, axLabels, outSizeLabels)
+        if parsed is not None:
+            a, o, verdict, note = parsed
+            append(filename, dict(cell, kind='instance', axioms=a, outSize=o, verdict=verdict, note=note, seconds=timings.get(a+' '+o)))
+    append(filename, dict(cell, kind='cell', axioms=[str(a) for a in axLabels], outSizes=[str(o) for o in outSizeLabels],
+        results=list(results), complete=complete, seconds=seconds))
+
+
+# Text format of iterate
+
+def export(filename, output, module='iteratePeerGrading', axLabels=None, outSizeLabels=None, encoding=None):
+    """
+    Write the complete cells of module in the store to output in the layout of iterate, in the order of iterate
+    (n, then k, then m). Only cells of the given axiom and outcome size labels and encoding version if they are given.
+    """
+    cells = [r for r in completedCells(load(filename)).values() if r['module'] == module
+        and (axLabels is None or r['axioms'] == [str(a) for a in axLabels])
+        and (outSizeLabels is None or r['outSizes'] == [str(o) for o in outSizeLabels])
+        and (encoding is None or r['encoding'] == encoding)]
+    with open(output, 'w') as file:
+        for r in sorted(cells, key=lambda r: (r['n'], r['k'], r['m'])):
+            file.write(str(r['n'])+','+str(r['m'])+','+str(r['k'])+':\n')
+            for line in r['results']:
+                file.write(line + '\n')
+            file.write('\n')
+
+def importText(textfile, filename, module, axLabels=(), outSizeLabels=(), encoding=1):
+    """
+    Read a results file in the layout of iterate into the store. A cell counts as complete if it is terminated by an
+    empty line (the last cell of a killed job is not); result lines matching the given labels also become instances.
+    """
+    with open(textfile) as file:
+        lines = file.read().splitlines()
+    cell = None
+    for line in lines:
+        if cell is None:
+            if line.endswith(':') and len(line[:-1].split(',')) == 3:
+                cell, results = [int(x) for x in line[:-1].split(',')], []
+        elif line == '':
+            n, m, k = cell
+            storeCell(filename, module, n, m, k, axLabels, outSizeLabels, encoding, results, True, None, run='import '+textfile)
+            cell = None
+        else:
+            results.append(line)
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == 'export':
+        export(sys.argv[2], sys.argv[3], *sys.argv[4:5])
+    elif sys.argv[1] == 'import':
+        importText(sys.argv[2], sys.argv[3], sys.argv[4])
@@ -0,0 +1,298 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Checking a rule against the axioms without SAT solving
+
+"""A rule is given as a boolean outcome array (numProfiles, n) whose entry [r, x] is True iff agent x is selected in
+profile r (ranking ballots as in peerGrading.py). Such an array can be decoded from a model (profileCodec.outcomeArray),
+computed from a Python function (warmStart.ruleFromFunction) or read from a file (loadRule). checkRule evaluates the
+axioms of peerGrading.py on the array directly, working on whole columns of profiles at once instead of generating
+clauses, and reports the first violations of every axiom. checkApprovalRule does the same for the approval ballots and
+axioms of approvalPeerGrading.py, iterateApprovalPeerGrading.py and (with minSize=1) iterateAPGNoEmptyBallots.py.
+
+The violation finders for the axioms relating pairs of profiles (impartiality, monotonicity, anonymity) return the
+instances r1 -> r2 that rule out the outcomes; lazySolving.py adds exactly these as clauses."""
+
+import hashlib
+import numpy as np
+from itertools import combinations
+from profileCodec import numRankingBallots, rankingBallots, rankingTransitions, rankingBallotIds, ballotMasks, \
+    profileDigits, outcomeArray, supportMasks, numApprovalBallots, approvalBallots, approvalTransitions, completeMasks
+
+rankingAxioms = ['cnfAtLeastOne', 'cnfAtMostK', 'cnfAtLeastK', 'cnfImpartial', 'cnfNegUnanimous', 'cnfPosUnanimous',
+    'cnfMonotonous', 'cnfNoExclusion', 'cnfSurjective', 'cnfNonConstant', 'cnfAnonymous', 'cnfNondictatorial', 'cnfNoDummy']
+
+approvalAxioms = ['cnfAtLeastOne', 'cnfAtMostK', 'cnfAtLeastK', 'cnfImpartial', 'cnfCondPosUnanimous', 'cnfCondNegUnanimous',
+    'cnfNewUnanimity', 'cnfMonotonicity', 'cnfNoExclusion', 'cnfNonConstant', 'cnfApprovalScoreAnonymity', 'cnfAnonymity']
+
+
+# Reading rules
+
+def loadRule(filename, n, numProfiles):
+    """
+    Outcome array from a file: a numpy array saved with np.save (.npy), or a model as a list of literals, e.g. the
+    output of a SAT solver (lines starting with 'v') or a DIMACS-like list of literals.
+    """
+    if filename.endswith('.npy'):
+        return np.load(filename).astype(bool).reshape(numProfiles, n)
+    literals = []
+    with open(filename) as file:
+        for line in file:
+            if line.startswith('c') or line.startswith('s') or line.startswith('p'):
+                continue
+            literals.extend(int(lit) for lit in line.replace('v', ' ').split() if lit != '0')
+    return outcomeArray(literals, n, numProfiles)
+
+
+# Classes of profiles
+
+def iVariantGroups(digits, base, i):
+    """Profiles are i-variants iff they agree on all digits except digit i, i.e. iff they have the same group."""
+    return np.arange(len(digits), dtype=np.int64) - digits[:,i] * base**i
+
+# the classes by n, m and the digits they were computed for (lazySolving.py asks again in every round)
+permutationClasses = {}
+
+def permutationGroups(n, m, digits):
+    """Profiles are permutations of each other (vPermutation) iff they contain the same multiset of rankings."""
+    key = (n, m, digits.shape, hashlib.sha1(np.ascontiguousarray(digits).tobytes()).hexdigest())
+    if key not in permutationClasses:
+        ids = rankingBallotIds(n, m)
+        keys = np.sort(ids[np.arange(n), digits], axis=1)
+        permutationClasses[key] = np.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+    return permutationClasses[key]
+
+def groupCycles(groups, r, wins):
+    """
+    For profiles r partitioned into groups (equal values of groups), find the groups in which wins is not constant and
+    return arrays (r1, r2) linking the profiles of each such group in a cycle r1 -> r2. The implications along the cycle
+    are instances of the axiom and together force the whole group to agree.
+    """
+    order = np.argsort(groups, kind='stable')
+    groups, r, wins = groups[order], r[order], wins[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.r_[starts[1:], len(groups)]
+    counts = np.add.reduceat(wins.astype(np.int64), starts)
+    violated = np.repeat((counts > 0) & (counts < ends - starts), ends - starts)
+    successor = np.arange(1, len(groups) + 1)
+    successor[ends - 1] = starts
+    return r[violated], r[successor[violated]]
+
+
+# Instances violated by an outcome array. Each function yields triples (x, r1, r2) of an agent and arrays of profiles:
+# the instances "if x is selected in r1 then in r2" needed to rule out the outcomes.
+
+def impartialViolations(n, m, digits, outcomes):
+    for i in range(n):
+        r1, r2 = groupCycles(iVariantGroups(digits, numRankingBallots(n, m), i), np.arange(len(digits)), outcomes[:,i])
+        yield i, r1, r2
+
+def transitionViolations(transitions, base, digits, outcomes):
+    """The instances r1 -> r2 of the j-variants along transitions[j] (see profileCodec.transitionArrays) that fail."""
+    for j in range(len(transitions)):
+        for b, edges in enumerate(transitions[j]):
+            rows = np.flatnonzero(digits[:,j] == b)
+            for i, targets in edges.items():
+                r1 = rows[outcomes[rows,i]]
+                for b2 in targets:
+                    r2 = r1 + (b2 - b) * base**j
+                    keep = ~outcomes[r2,i]
+                    yield i, r1[keep], r2[keep]
+
+def monotonousViolations(n, m, digits, outcomes):
+    yield from transitionViolations([rankingTransitions(n, m, j) for j in range(n)], numRankingBallots(n, m), digits, outcomes)
+
+def anonymousViolations(n, m, digits, outcomes):
+    groups = permutationGroups(n, m, digits)
+    for x in range(n):
+        r1, r2 = groupCycles(groups, np.arange(len(digits)), outcomes[:,x])
+        yield x, r1, r2
+
+pairViolations = {'cnfImpartial': impartialViolations, 'cnfMonotonous': monotonousViolations,
+    'cnfAnonymous': anonymousViolations}
+
+# The same for approval ballots, where minSize is 1 if empty ballots are not allowed.
+
+def approvalImpartialViolations(n, m, digits, outcomes, minSize=0):
+    for i in range(n):
+        r1, r2 = groupCycles(iVariantGroups(digits, numApprovalBallots(n, m, minSize), i), np.arange(len(digits)), outcomes[:,i])
+        yield i, r1, r2
+
+def approvalMonotonicityViolations(n, m, digits, outcomes, minSize=0):
+    transitions = [approvalTransitions(n, m, j, minSize) for j in range(n)]
+    yield from transitionViolations(transitions, numApprovalBallots(n, m, minSize), digits, outcomes)
+
+def approvalScores(n, m, digits, minSize=0):
+    """Array (numProfiles, n) holding the approval score of every agent in every profile."""
+    scores = np.zeros(digits.shape, dtype=np.int64)
+    for j in range(n):
+        masks = np.array(ballotMasks(approvalBallots(n, m, j, minSize)), dtype=np.int64)[digits[:,j]]
+        scores += (masks[:,None] >> np.arange(n)) & 1
+    return scores
+
+def approvalScoreAnonymityViolations(n, m, digits, outcomes, minSize=0):
+    groups = np.unique(approvalScores(n, m, digits, minSize), axis=0, return_inverse=True)[1].reshape(-1)
+    for x in range(n):
+        r1, r2 = groupCycles(groups, np.arange(len(digits)), outcomes[:,x])
+        yield x, r1, r2
+
+def approvalAnonymityViolations(n, m, digits, outcomes, minSize=0):
+    # the bitmask of an approval set does not depend on the voter, so profiles are vPermutations iff their sorted masks agree
+    masks = np.stack([np.array(ballotMasks(approvalBallots(n, m, j, minSize)), dtype=np.int64)[digits[:,j]] for j in range(n)], axis=1)
+    groups = np.unique(np.sort(masks, axis=1), axis=0, return_inverse=True)[1].reshape(-1)
+    for x in range(n):
+        r1, r2 = groupCycles(groups, np.arange(len(digits)), outcomes[:,x])
+        yield x, r1, r2
+
+approvalPairViolations = {'cnfImpartial': approvalImpartialViolations, 'cnfMonotonicity': approvalMonotonicityViolations,
+    'cnfApprovalScoreAnonymity': approvalScoreAnonymityViolations, 'cnfAnonymity': approvalAnonymityViolations}
+
+
+# Checking
+
+commonAxioms = ['cnfAtLeastOne', 'cnfAtMostK', 'cnfAtLeastK', 'cnfNoExclusion', 'cnfNonConstant']
+
+def failedInstances(instances, outcomes, limit):
+    """The first limit instances (x, r1, r2) among those yielded by a violation finder in which x is selected in r1 but not in r2."""
+    violations = []
+    for x, r1, r2 in instances:
+        # in a cycle through a disagreeing group some instance fails, these are the ones reported
+        bad = outcomes[r1,x] & ~outcomes[r2,x]
+        violations.extend((x, a, b) for a, b in zip(r1[bad][:limit].tolist(), r2[bad][:limit].tolist()))
+        if len(violations) >= limit:
+            break
+    return violations
+
+def commonViolations(axiom, k, outcomes, limit):
+    """Violations of the axioms that do not depend on the ballots, see commonAxioms."""
+    n = outcomes.shape[1]
+    sizes = outcomes.sum(axis=1)
+    if axiom == 'cnfAtLeastOne':
+        return [(r,) for r in np.flatnonzero(sizes < 1)[:limit].tolist()]
+    if axiom == 'cnfAtMostK':
+        return [(r,) for r in np.flatnonzero(sizes > k)[:limit].tolist()]
+    if axiom == 'cnfAtLeastK':
+        return [(r,) for r in np.flatnonzero(sizes < k)[:limit].tolist()]
+    if axiom == 'cnfNoExclusion':
+        return [(i,) for i in np.flatnonzero(~outcomes.any(axis=0)).tolist()]
+    if axiom == 'cnfNonConstant':
+        return [c for c in combinations(range(n), k) if outcomes[:,list(c)].all()]
+
+def checkRule(n, m, k, outcomes, axioms=rankingAxioms, limit=10):
+    """
+    Check the rule given by the outcome array against the axioms.
+
+    Keyword arguments:
+    n, m, k -- number of voters, length of the ballots and size of the outcome
+    outcomes -- boolean array (numProfiles, n)
+    axioms -- names of the axioms to check (the CNF generators of peerGrading.py, see rankingAxioms)
+    limit -- number of violations reported per axiom
+
+    Returns a dictionary mapping each axiom to the list of its first violations (empty if the rule satisfies it):
+    profiles (r,) for the outcome size axioms, (x, r1, r2) if x is selected in r1 but not in r2 for the axioms relating
+    two profiles, (r, i) or (r, i, x) for the unanimity axioms, and the agents or k-sets that witness a violation of the
+    existential axioms (e.g. the dictator for cnfNondictatorial).
+    """
+    outcomes = np.asarray(outcomes, dtype=bool)
+    base = numRankingBallots(n, m)
+    digits = profileDigits(np.arange(len(outcomes)), base, n)
+    ballots = [rankingBallots(n, m, i) for i in range(n)]
+    report = {}
+    for axiom in axioms:
+        if axiom in pairViolations:
+            violations = failedInstances(pairViolations[axiom](n, m, digits, outcomes), outcomes, limit)
+        elif axiom in commonAxioms:
+            violations = commonViolations(axiom, k, outcomes, limit)
+        elif axiom == 'cnfPosUnanimous':
+            tops = np.stack([np.array([b[0] for b in ballots[j]])[digits[:,j]] for j in range(n)], axis=1)
+            violations = []
+            for i in range(n):
+                unanimous = np.all((tops == i) | (np.arange(n) == i), axis=1)
+                violations.extend((r, i) for r in np.flatnonzero(unanimous & ~outcomes[:,i])[:limit].tolist())
+        elif axiom == 'cnfNegUnanimous':
+            masks = [np.array(ballotMasks(ballots[j]), dtype=np.int64) for j in range(n)]
+            violations = []
+            if m == n - 1:
+                lasts = np.stack([np.array([b[m-1] for b in ballots[j]])[digits[:,j]] for j in range(n)], axis=1)
+                for i in range(n):
+                    unanimous = np.all((lasts == i) | (np.arange(n) == i), axis=1)
+                    violations.extend((r, i) for r in np.flatnonzero(unanimous & outcomes[:,i])[:limit].tolist())
+            else:
+                listed = np.stack([masks[j][digits[:,j]] for j in range(n)], axis=1)
+                support = supportMasks(np.arange(len(outcomes)), masks, base)
+                for i in range(n):
+                    unlisted = np.all(((listed >> i) & 1 == 0) | (np.arange(n) == i), axis=1)
+                    for x in range(n):
+                        bad = unlisted & outcomes[:,i] & ((support >> x) & 1 == 1) & ~outcomes[:,x]
+                        violations.extend((r, i, x) for r in np.flatnonzero(bad)[:limit].tolist())
+        elif axiom == 'cnfSurjective':
+            violations = [c for c in combinations(range(n), k) if not outcomes[:,list(c)].all(axis=1).any()]
+        elif axiom == 'cnfNondictatorial':
+            # i is a dictator if i and the top k-1 agents of i are selected in every profile
+            violations = []
+            for i in range(n):
+                favourites = np.array([[x in b[:k-1] or x == i for x in range(n)] for b in ballots[i]])[digits[:,i]]
+                if np.all(outcomes | ~favourites):
+                    violations.append((i,))
+        elif axiom == 'cnfNoDummy':
+            # i is a dummy if the outcome does not change between any two i-variants
+            violations = []
+            for i in range(n):
+                groups = iVariantGroups(digits, base, i)
+                if all(len(groupCycles(groups, np.arange(len(outcomes)), outcomes[:,x])[0]) == 0 for x in range(n)):
+                    violations.append((i,))
+        else:
+            raise ValueError('no checker for axiom ' + axiom)
+        report[axiom] = violations[:limit]
+    return report
+
+def checkApprovalRule(n, m, k, outcomes, axioms=approvalAxioms, limit=10, minSize=0):
+    """
+    Check the rule given by the outcome array over approval profiles against the approval axioms, as checkRule does for
+    ranking ballots.
+
+    Keyword arguments:
+    n, m, k -- number of voters, maximal number of approved agents and size of the outcome
+    outcomes -- boolean array (numProfiles, n)
+    axioms -- names of the axioms to check (the CNF generators of iterateApprovalPeerGrading.py, see approvalAxioms)
+    limit -- number of violations reported per axiom
+    minSize -- 1 if empty ballots are not allowed (iterateAPGNoEmptyBallots.py)
+
+    Returns a dictionary mapping each axiom to the list of its first violations: (x, r1, r2) if x is selected in r1 but
+    not in r2 for the axioms relating two profiles, (r, i, j) if j is selected in profile r but i is not although i has
+    complete support (cnfCondPosUnanimous), some support (cnfCondNegUnanimous) or a higher approval score
+    (cnfNewUnanimity) than j, and otherwise as checkRule.
+    """
+    outcomes = np.asarray(outcomes, dtype=bool)
+    base = numApprovalBallots(n, m, minSize)
+    digits = profileDigits(np.arange(len(outcomes)), base, n)
+    masks = [ballotMasks(approvalBallots(n, m, j, minSize)) for j in range(n)]
+    report = {}
+    for axiom in axioms:
+        if axiom in approvalPairViolations:
+            violations = failedInstances(approvalPairViolations[axiom](n, m, digits, outcomes, minSize), outcomes, limit)
+        elif axiom in commonAxioms:
+            violations = commonViolations(axiom, k, outcomes, limit)
+        elif axiom in ['cnfCondPosUnanimous', 'cnfCondNegUnanimous', 'cnfNewUnanimity']:
+            # i ranks above j: complete against incomplete support, some against no support, or a higher approval score
+            if axiom == 'cnfCondPosUnanimous':
+                complete = completeMasks(np.arange(len(outcomes)), masks, base)
+                above = lambda i, j: ((complete >> i) & 1 == 1) & ((complete >> j) & 1 == 0)
+            elif axiom == 'cnfCondNegUnanimous':
+                support = supportMasks(np.arange(len(outcomes)), masks, base)
+                above = lambda i, j: ((support >> i) & 1 == 1) & ((support >> j) & 1 == 0)
+            else:
+                scores = approvalScores(n, m, digits, minSize)
+                above = lambda i, j: scores[:,i] > scores[:,j]
+            violations = []
+            for i in range(n):
+                for j in range(n):
+                    if i != j:
+                        bad = above(i, j) & ~outcomes[:,i] & outcomes[:,j]
+                        violations.extend((r, i, j) for r in np.flatnonzero(bad)[:limit].tolist())
+        else:
+            raise ValueError('no checker for axiom ' + axiom)
+        report[axiom] = violations[:limit]
+    return report
+
+def satisfiedAxioms(report):
+    return [axiom for axiom, violations in report.items() if len(violations) == 0]
@@ -0,0 +1,123 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Enumerating and counting the rules satisfying a set of axioms
+
+"""A satisfiable cell usually has many rules. enumerateRules streams them with one incremental solver: after every
+model the solver receives a clause blocking its outcomes, i.e. the assignment of the winner variables
+posLiteral(r,x) = r*n + x + 1 only, so that models differing only in the auxiliary Q/D variables of cnfSurjective and
+cnfNoDummy count as one rule. Counting the rules this way is projected model counting on the winner variables, which
+is exact once the solver runs out of models and is feasible for small instances.
+
+The axioms are invariant under relabeling the agents (agent x becomes pi[x], voter i submits the relabeled ballot of
+voter pi^-1[i]). With relabel set, every rule found is blocked together with all its relabelings and only one rule per
+orbit is returned, along with the size of its orbit, so that the orbits add up to the exact number of rules. This is
+only sound for axiom sets without a fixed labeling, which holds for all axioms of peerGrading.py and
+approvalPeerGrading.py."""
+
+import threading
+from itertools import permutations
+import numpy as np
+from pysat.solvers import Solver
+from profileCodec import rankingBallots, rankingBallotIndex, approvalBallots, profileDigits, outcomeArray
+from budgetedSolving import budgetSolver
+
+
+# Relabelings
+
+def relabelings(n, m, kind='ranking', minSize=0):
+    """
+    For every permutation pi of the agents a pair (pi, ballotMaps), where ballotMaps[i][b] is the index of the ballot
+    b of voter i with every agent x replaced by pi[x], among the ballots of voter pi[i].
+    """
+    if kind == 'ranking':
+        ballots = [rankingBallots(n, m, i) for i in range(n)]
+        index = [rankingBallotIndex(n, m, i) for i in range(n)]
+    else:
+        ballots = [approvalBallots(n, m, i, minSize) for i in range(n)]
+        index = [{ballot: b for b, ballot in enumerate(ballots[i])} for i in range(n)]
+    result = []
+    for pi in permutations(range(n)):
+        relabel = (lambda ballot: tuple(pi[x] for x in ballot)) if kind == 'ranking' else (lambda ballot: tuple(sorted(pi[x] for x in ballot)))
+        result.append((pi, [np.array([index[pi[i]][relabel(ballot)] for ballot in ballots[i]], dtype=np.int64) for i in range(n)]))
+    return result
+
+def relabeledOutcomes(outcomes, digits, base, relabeling):
+    """The outcome array of the rule obtained by relabeling the agents."""
+    pi, ballotMaps = relabeling
+    n = len(pi)
+    profiles = np.zeros(len(outcomes), dtype=np.int64)
+    for i in range(n):
+        profiles += ballotMaps[i][digits[:,i]] * base**pi[i]
+    image = np.zeros(outcomes.shape, dtype=bool)
+    image[profiles[:,None], np.array(pi)[None,:]] = outcomes
+    return image
+
+def blockingClause(outcomes):
+    """The clause excluding exactly the given outcomes on the winner variables."""
+    variables = np.arange(1, outcomes.size + 1)
+    return np.where(outcomes.reshape(-1), -variables, variables).tolist()
+
+
+# Enumerating
+
+def enumerateRules(cnf, n, numProfiles, relabel=None, limit=None, timeout=None, solver='cadical153'):
+    """
+    Lazily enumerate the rules satisfying cnf.
+
+    Keyword arguments:
+    cnf -- the axioms and outcome size constraints
+    n, numProfiles -- number of agents and profiles, fixing the winner variables 1..numProfiles*n
+    relabel -- relabelings(n, m, kind, minSize) to return one rule per orbit, or None to return all rules
+    limit -- maximal number of rules returned
+    timeout -- seconds after which the enumeration stops (the solver is interrupted, so a solver supporting this is
+               used, see budgetedSolving.budgetSolver)
+    solver -- name of the PySAT solver
+
+    Yields pairs (outcomes, orbitSize) of a boolean outcome array (numProfiles, n) and the number of distinct rules in
+    its orbit (1 without relabel). The generator's return value (StopIteration.value) is True iff all rules were found.
+    """
+    if relabel is not None:
+        base = len(relabel[0][1][0])
+        digits = profileDigits(np.arange(numProfiles), base, n)
+    found = 0
+    with Solver(name=solver if timeout is None else budgetSolver(solver), bootstrap_with=cnf) as s:
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, s.interrupt)
+            timer.start()
+        try:
+            while limit is None or found < limit:
+                verdict = s.solve() if timeout is None else s.solve_limited(expect_interrupt=True)
+                if verdict is None:
+                    return False
+                if not verdict:
+                    return True
+                outcomes = outcomeArray(s.get_model(), n, numProfiles)
+                orbit = {outcomes.tobytes(): outcomes}
+                for relabeling in relabel or []:
+                    image = relabeledOutcomes(outcomes, digits, base, relabeling)
+                    orbit.setdefault(image.tobytes(), image)
+                for image in orbit.values():
+                    s.add_clause(blockingClause(image))
+                found += 1
+                yield outcomes, len(orbit)
+            return False
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+def countRules(cnf, n, numProfiles, relabel=None, limit=None, timeout=None, solver='cadical153'):
+    """
+    Count the rules satisfying cnf by enumerating them (see enumerateRules).
+    Returns a triple (count, orbits, exact): the number of rules found (with relabel, the sizes of the orbits found
+    added up), the number of rules or orbits returned by the enumeration, and whether the count is complete.
+    """
+    count, orbits = 0, 0
+    rules = enumerateRules(cnf, n, numProfiles, relabel, limit, timeout, solver)
+    while True:
+        try:
+            outcomes, size = next(rules)
+        except StopIteration as stop:
+            return count, orbits, stop.value
+        count += size
+        orbits += 1
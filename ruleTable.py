@@ -0,0 +1,102 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Compiled rules: lookup tables applicable to real peer grading inputs
+
+"""A rule found by the solver is compiled into a lookup table holding for every profile index the bitmask of the
+selected agents (bit x is set iff agent x is selected). The table is stored as a .npy file, which loadTable maps into
+memory instead of reading it, with the parameters of the rule in a JSON file next to it. query encodes the ballots of
+the voters with the profile codec of the module the rule comes from (ranking ballots as in peerGrading.py or approval
+ballots as in approvalPeerGrading.py) and looks up the outcome; a batch of many grading instances is answered with one
+array lookup."""
+
+import json
+from collections import namedtuple
+import numpy as np
+from profileCodec import numRankingBallots, rankingBallotIndex, numApprovalBallots, approvalBallots, outcomeArray
+
+RuleTable = namedtuple('RuleTable', ['n', 'm', 'kind', 'minSize', 'masks'])
+RuleTable.__doc__ = """
+n, m -- number of voters and length (ranking) or maximal size (approval) of the ballots
+kind -- 'ranking' or 'approval'
+minSize -- minimal size of an approval ballot (1 if empty ballots are not allowed)
+masks -- array mapping every profile index to the bitmask of the selected agents
+"""
+
+
+# Compiling
+
+def maskType(n):
+    return np.uint8 if n <= 8 else np.uint16 if n <= 16 else np.uint32 if n <= 32 else np.uint64
+
+def numBallots(n, m, kind, minSize=0):
+    return numRankingBallots(n, m) if kind == 'ranking' else numApprovalBallots(n, m, minSize)
+
+def compileRule(outcomes, m, kind='ranking', minSize=0):
+    """Lookup table of the rule given by a boolean outcome array (numProfiles, n)."""
+    outcomes = np.asarray(outcomes, dtype=bool)
+    n = outcomes.shape[1]
+    if len(outcomes) != numBallots(n, m, kind, minSize) ** n:
+        raise ValueError('outcome array does not match the profiles of n=' + str(n) + ', m=' + str(m))
+    masks = (outcomes.astype(np.uint64) << np.arange(n, dtype=np.uint64)).sum(axis=1).astype(maskType(n))
+    return RuleTable(n, m, kind, minSize, masks)
+
+def compileModel(model, n, m, kind='ranking', minSize=0):
+    """Lookup table of the rule given by a model (winner variables r*n + x + 1)."""
+    return compileRule(outcomeArray(model, n, numBallots(n, m, kind, minSize) ** n), m, kind, minSize)
+
+def tableFile(filename):
+    """The name np.save writes the masks to: filename with the extension .npy added if it lacks it."""
+    return filename if filename.endswith('.npy') else filename + '.npy'
+
+def saveTable(table, filename):
+    """Write the masks to filename (a .npy file, the extension is added if missing) and the parameters to filename.npy.json."""
+    filename = tableFile(filename)
+    np.save(filename, table.masks)
+    with open(filename + '.json', 'w') as file:
+        json.dump({'n': table.n, 'm': table.m, 'kind': table.kind, 'minSize': table.minSize}, file)
+
+def loadTable(filename):
+    """The table saved by saveTable under the same name, with the masks mapped into memory read-only."""
+    filename = tableFile(filename)
+    with open(filename + '.json') as file:
+        parameters = json.load(file)
+    return RuleTable(parameters['n'], parameters['m'], parameters['kind'], parameters['minSize'], np.load(filename, mmap_mode='r'))
+
+
+# Querying
+
+def ballotIndex(table, i):
+    """Dictionary mapping the ballots of voter i (rankings as tuples, approval sets as sorted tuples) to their index."""
+    if table.kind == 'ranking':
+        return rankingBallotIndex(table.n, table.m, i)
+    return {ballot: b for b, ballot in enumerate(approvalBallots(table.n, table.m, i, table.minSize))}
+
+def encodeProfiles(table, instances):
+    """
+    Profile indices of a batch of instances, each a list holding for every voter i their ballot: a ranking of m agents
+    other than i (best first) or a set of approved agents other than i.
+    """
+    base = numBallots(table.n, table.m, table.kind, table.minSize)
+    indices = [ballotIndex(table, i) for i in range(table.n)]
+    digits = np.zeros((len(instances), table.n), dtype=np.int64)
+    for s, ballots in enumerate(instances):
+        if len(ballots) != table.n:
+            raise ValueError('instance ' + str(s) + ' has ' + str(len(ballots)) + ' ballots, expected ' + str(table.n))
+        for i, ballot in enumerate(ballots):
+            key = tuple(ballot) if table.kind == 'ranking' else tuple(sorted(ballot))
+            if key not in indices[i]:
+                raise ValueError('invalid ballot ' + str(ballot) + ' of voter ' + str(i) + ' in instance ' + str(s))
+            digits[s, i] = indices[i][key]
+    return digits @ (base ** np.arange(table.n, dtype=np.int64))
+
+def queryMasks(table, instances):
+    """Bitmasks of the agents selected in a batch of instances."""
+    return np.asarray(table.masks[encodeProfiles(table, instances)])
+
+def query(table, instances):
+    """Lists of the agents selected in a batch of instances."""
+    return [[x for x in range(table.n) if mask >> x & 1] for mask in queryMasks(table, instances).tolist()]
+
+def winners(table, ballots):
+    """The agents selected when every voter i submits ballots[i]."""
+    return query(table, [ballots])[0]
@@ -0,0 +1,165 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# SAT solver backends
+
+"""All modules decide their instances through solveCNF, which dispatches to one of the following backends:
+'pylgl' (Lingeling, the default), 'pycosat' (PicoSAT), the solvers embedded in PySAT (e.g. 'cadical153', 'glucose4',
+'maplesat') and any external solver reading DIMACS, given as 'external:<command>' (e.g. 'external:kissat -q').
+External solvers are expected to follow the SAT competition output format (lines 's SATISFIABLE' and 'v ... 0').
+Every backend returns a SolverResult."""
+
+import importlib.util
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+SolverResult = namedtuple('SolverResult', ['verdict', 'model', 'stats', 'time'])
+SolverResult.__doc__ = """
+verdict -- True (satisfiable), False (unsatisfiable) or None (unknown, e.g. after a timeout)
+model -- list of literals if satisfiable, else None
+stats -- dictionary of solver statistics (empty if the backend reports none)
+time -- wall-clock seconds spent in the backend
+"""
+
+pysatSolvers = ['cadical103','cadical153','cadical195','glucose3','glucose4','glucose42','lingeling','maplechrono','maplecm',
+    'maplesat','mergesat3','minisat22','minisatgh']
+
+
+# DIMACS
+
+def writeDIMACS(cnf, file):
+    """Write cnf in DIMACS format to the open file."""
+    nvars = max([abs(lit) for clause in cnf for lit in clause], default=0)
+    file.write('p cnf ' + str(nvars) + ' ' + str(len(cnf)) + '\n')
+    for clause in cnf:
+        file.write(' '.join([str(lit) for lit in clause]) + ' 0\n')
+
+def loadCNF(filename):
+    """Read a CNF in DIMACS format, e.g. one written by saveCNF."""
+    cnf = []
+    clause = []
+    with open(filename) as file:
+        for line in file:
+            if line.startswith('c') or line.startswith('p') or line.strip() == '':
+                continue
+            for lit in line.split():
+                if lit == '0':
+                    cnf.append(clause)
+                    clause = []
+                else:
+                    clause.append(int(lit))
+    return cnf
+
+
+# Backends
+
+def solvePylgl(cnf):
+    from pylgl import solve
+    model = solve(cnf)
+    return isinstance(model, list), model if isinstance(model, list) else None, {}
+
+def solvePycosat(cnf):
+    from pycosat import solve
+    model = solve(cnf)
+    if model == 'UNKNOWN':
+        return None, None, {}
+    return isinstance(model, list), model if isinstance(model, list) else None, {}
+
+def solvePysat(cnf, name, phases=None):
+    from pysat.solvers import Solver
+    with Solver(name=name, bootstrap_with=cnf) as s:
+        if phases:
+            s.set_phases(phases)
+        verdict = s.solve()
+        return verdict, s.get_model() if verdict else None, s.accum_stats()
+
+def solveExternal(cnf, command, timeout=None):
+    """
+    Run the external solver command (a list of arguments) on a temporary DIMACS file.
+
+    The solver runs in a session of its own, whose process group is killed on a timeout and when the calling process is
+    terminated (as main and portfolio.race stop their workers), so that no solver outlives its caller.
+    """
+    handle, filename = tempfile.mkstemp(suffix='.cnf')
+    try:
+        with os.fdopen(handle, 'w') as file:
+            writeDIMACS(cnf, file)
+        process = subprocess.Popen(command + [filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            start_new_session=True)
+        def kill():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        def terminated(signum, frame):
+            kill()
+            raise SystemExit(128 + signum)
+        handler = None
+        if threading.current_thread() is threading.main_thread():
+            handler = signal.signal(signal.SIGTERM, terminated)
+        try:
+            stdout = process.communicate(timeout=timeout)[0]
+        except subprocess.TimeoutExpired:
+            kill()
+            process.communicate()
+            return None, None, {'timeout': True}
+        finally:
+            if handler is not None:
+                signal.signal(signal.SIGTERM, handler)
+    finally:
+        os.remove(filename)
+    verdict = None
+    model = []
+    for line in stdout.splitlines():
+        if line.startswith('s '):
+            verdict = {'SATISFIABLE': True, 'UNSATISFIABLE': False}.get(line[2:].strip())
+        elif line.startswith('v '):
+            model.extend(int(lit) for lit in line[2:].split() if lit != '0')
+    if verdict is None:
+        # solvers that print no status line still report it through their exit code
+        verdict = {10: True, 20: False}.get(process.returncode)
+    return verdict, model if verdict else None, {'returncode': process.returncode}
+
+def available(solver):
+    """Whether the backend of solver (as for solveCNF) can be used here: its module is installed or the command exists."""
+    if solver.startswith('external:'):
+        command = shlex.split(solver[len('external:'):])
+        return len(command) > 0 and shutil.which(command[0]) is not None
+    if solver in ['pylgl', 'pycosat']:
+        return importlib.util.find_spec(solver) is not None
+    if solver in pysatSolvers:
+        return importlib.util.find_spec('pysat') is not None
+    return False
+
+def solveCNF(cnf, solver='pylgl', timeout=None, phases=None):
+    """
+    Decide satisfiability of cnf with the given backend.
+
+    Keyword arguments:
+    cnf -- list of clauses
+    solver -- 'pylgl', 'pycosat', the name of a PySAT solver (see pysatSolvers) or 'external:<command>'
+    timeout -- seconds after which an external solver is stopped (the embedded solvers are stopped by the caller,
+               as in main, by terminating the process they run in, which also stops a running external solver)
+    phases -- list of literals the solver should prefer when deciding (e.g. a previous model or the best assignment of
+              localSearch.searchModel); only used by the PySAT solvers
+
+    Returns a SolverResult.
+    """
+    start = time.perf_counter()
+    if solver == 'pylgl':
+        verdict, model, stats = solvePylgl(cnf)
+    elif solver == 'pycosat':
+        verdict, model, stats = solvePycosat(cnf)
+    elif solver in pysatSolvers:
+        verdict, model, stats = solvePysat(cnf, solver, phases)
+    elif solver.startswith('external:'):
+        verdict, model, stats = solveExternal(cnf, shlex.split(solver[len('external:'):]), timeout)
+    else:
+        raise ValueError('unknown SAT solver ' + solver)
+    return SolverResult(verdict, model, stats, time.perf_counter() - start)
@@ -0,0 +1,152 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Cost-aware scheduling of a sweep within the time window of a job
+
+"""iterate processes the cells (n, m, k) of a sweep in nested-loop order, so a single cell whose generation takes many
+hours can use up the window of a SLURM job (24 hours in first_job.txt) before any of the cheaper cells after it run.
+schedule runs the same cells ordered by their predicted cost: the seconds the cell took in earlier runs according to
+the events file (see instrumentation.py), otherwise the estimate of the planner (see planner.py). Every cell gets a
+budget of at least its fair share of the time left and never more than what is left, which main enforces as a deadline
+for all generations and solves of the cell together. After every cell the results and timings go to a checkpoint file
+and the results file is rewritten in the layout of iterate, with the cells in nested-loop order. A cell in which some
+generation or solve timed out stays pending, with at least twice its budget as predicted cost, so the next job resumes
+with the expensive remainder:
+
+    schedule(nRange=range(3,6),ax=axCnf,axLabels=axDesc,filename="results.txt",window=24*3600)"""
+
+import json
+import os
+import time
+from instrumentation import newRun, timedOut
+import resultsStore
+import iteratePeerGrading
+import planner
+
+# seconds kept free at the end of the window, e.g. to write the results
+defaultReserve = 600
+
+# the generation timeout of main, which no budget of a cell exceeds
+maxGenerationTimeout = 18000
+
+
+def history(filename):
+    """
+    Seconds spent on every (n, m, k) in the latest run that processed it, i.e. the wall time of all phases including
+    the time waited for generations and solves that timed out. Empty if there is no events file.
+    """
+    if filename is None or not os.path.exists(filename):
+        return {}
+    runs = {}
+    with open(filename) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            e = json.loads(line)
+            if 'n' not in e or e['event'] == 'progress':
+                continue
+            key = (e['n'], e['m'], e['k'])
+            latest = runs.setdefault(key, {})
+            latest[e['run']] = latest.get(e['run'], 0.0) + e.get('wall', 0.0)
+    # runs are named by their start time, so the largest name is the latest run
+    return {key: seconds[max(seconds)] for key, seconds in runs.items()}
+
+def loadCheckpoint(filename, sweep):
+    """The state of the sweep saved in filename, or a new state. Raises ValueError if filename belongs to another sweep."""
+    if not os.path.exists(filename):
+        return {'sweep': sweep, 'cells': {}}
+    with open(filename) as file:
+        state = json.load(file)
+    if state['sweep'] != sweep:
+        raise ValueError('checkpoint ' + filename + ' belongs to a different sweep')
+    return state
+
+def saveCheckpoint(filename, state):
+    # write a new file and move it over the old one, so that a job killed while writing leaves the old checkpoint
+    with open(filename + '.tmp', 'w') as file:
+        json.dump(state, file, indent=1)
+    os.replace(filename + '.tmp', filename)
+
+def cellKey(cell):
+    return ','.join(str(x) for x in cell)
+
+def writeResults(filename, cells, state):
+    """Write the results of all processed cells in the given order, in the layout of iterate."""
+    with open(filename, 'w') as file:
+        for cell in cells:
+            done = state['cells'].get(cellKey(cell))
+            if done is None:
+                continue
+            file.write(cellKey(cell)+':\n')
+            for r in done['results']:
+                file.write(r + '\n')
+            file.write('\n')
+
+def predict(cells, state, past, plan):
+    """Predicted seconds of every cell: from an earlier run, otherwise from the plan; twice the last budget if it was too small."""
+    cost = {}
+    for cell in cells:
+        cost[cell] = past.get(cell, plan[cell]['seconds'] if plan else 0.0)
+        done = state['cells'].get(cellKey(cell))
+        if done is not None and not done['complete']:
+            cost[cell] = max(cost[cell], 2 * done['budget'])
+    return cost
+
+def schedule(nRange, ax, axLabels, mRange=False, kRange=False, outSize=False, outSizeLabels=False, filename="peerGrading.txt",
+             checkpoint=None, window=24*3600, deadline=None, reserve=defaultReserve, plan=True, events="events.jsonl", store=None, **options):
+    """
+    Run the cells of a sweep as iterate does, but the cheapest first and within a time window, resuming from a checkpoint.
+
+    Keyword arguments (see iterate for the others):
+    filename -- results file, rewritten after every cell with all cells processed so far (by this or earlier jobs)
+    checkpoint -- file holding the results, times and budgets of the processed cells, filename + '.schedule.json' by default
+    window -- seconds this job may run, counted from the call
+    deadline -- alternatively the end of the window as a time.time() value, e.g. to share one window among several sweeps
+    reserve -- seconds kept free at the end of the window
+    plan -- a plan of the sweep (see planner.py), True to compute one or None to rely on earlier runs only; the axioms
+            the plan marks infeasible are skipped
+    events -- events file of this and earlier runs; without it cells count as complete even if a timeout occurred
+    store -- results store the cells are also recorded in (see resultsStore.py)
+    options -- further keyword arguments of main, e.g. solver or lazy
+
+    Returns the cells that are still pending, the most expensive last.
+    """
+    if mRange == False:
+        mRange = range(1,max(nRange))
+    if kRange == False:
+        kRange = range(1,max(nRange))
+    deadline = (deadline or time.time() + window) - reserve
+    checkpoint = checkpoint or filename + '.schedule.json'
+    sweep = json.loads(json.dumps({'ax': ax, 'axLabels': axLabels, 'outSize': outSize, 'outSizeLabels': outSizeLabels}))
+    state = loadCheckpoint(checkpoint, sweep)
+    cells = [(n,m,k) for n in nRange for k in (x for x in kRange if x < n) for m in (x for x in mRange if x < n)]
+    if plan == True:
+        plan = planner.plan(nRange,ax,mRange,kRange,outSize)
+    cost = predict(cells, state, history(events), plan)
+    pending = sorted([cell for cell in cells if not state['cells'].get(cellKey(cell), {}).get('complete', False)], key=lambda cell: cost[cell])
+    run = newRun()
+
+    for index, (n,m,k) in enumerate(pending):
+        left = deadline - time.time()
+        if cost[(n,m,k)] > left:
+            # the remaining cells are predicted to be even more expensive, but predictions of cheap cells may be off
+            print(cellKey((n,m,k))+': predicted '+'%.0f' % cost[(n,m,k)]+'s, '+'%.0f' % left+'s left, deferred')
+            continue
+        # the predicted cost with some slack, and at least an equal share of what is left for the remaining cells
+        budget = min(maxGenerationTimeout, left, max(2 * cost[(n,m,k)], left / (len(pending) - index)))
+        print(cellKey((n,m,k))+': (budget '+'%.0f' % budget+'s)')
+        cellRun = run+'-'+cellKey((n,m,k))
+        start = time.time()
+        results = iteratePeerGrading.main(n,m,k,ax,axLabels,outSize,outSizeLabels,events=events,run=cellRun,deadline=start+budget,
+            skip=plan[(n,m,k)]['infeasible'] if plan else [],**options)
+        for r in results:
+            print(r)
+        print('-------------------------------------')
+        complete = not timedOut(events, cellRun, n, m, k)
+        state['cells'][cellKey((n,m,k))] = {'results': results, 'seconds': time.time() - start, 'budget': budget, 'complete': complete}
+        if store is not None:
+            resultsStore.storeCell(store,'iteratePeerGrading',n,m,k,axLabels,outSizeLabels or iteratePeerGrading.defaultOutSizeLabels,
+                iteratePeerGrading.encodingVersion,results,complete,time.time() - start,options.get('solver','pylgl'),cellRun,events)
+        saveCheckpoint(checkpoint, state)
+        writeResults(filename, cells, state)
+
+    return [cell for cell in pending if not state['cells'].get(cellKey(cell), {}).get('complete', False)]
@@ -0,0 +1,94 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Comparison of the SAT solver backends on the saved CNFs
+
+"""iterate(..., save=True) in lisa_analysis.py saves the CNF of every axiom as <axiom>_<n>_<m>_<k>.txt. This script
+combines the saved files into the instances checked there (together with the outcome size constraints for =K), runs
+every backend on every instance in a separate process with a time limit and writes a table of verdicts and times."""
+
+import os
+import multiprocessing
+import time
+from itertools import combinations
+from math import factorial, comb
+from satSolvers import solveCNF, loadCNF, available
+from clauseArrays import profileClauses
+
+# the backends compared by default, as far as they are installed here (see satSolvers.available)
+solvers = [s for s in ['pylgl','pycosat','cadical153','glucose4','maplesat'] if available(s)]
+
+
+def exactlyK(n, m, k):
+    """cnfAtLeastK() + cnfAtMostK() for ranking ballots (every set of k+1 agents contains a loser, every set of n-k+1 a winner)."""
+    numProfiles = (comb(n-1,m)*factorial(m)) ** n
+    atMost = profileClauses([[-(x+1) for x in c] for c in combinations(range(n),k+1)], numProfiles, n)
+    atLeast = profileClauses([[x+1 for x in c] for c in combinations(range(n),n-k+1)], numProfiles, n)
+    return atMost.tolist() + atLeast.tolist()
+
+def savedInstances(axCnf, axDesc, directory='.'):
+    """
+    Yield pairs (label, cnf) for every (n,m,k) and every combination of axioms in axCnf (as passed to iterate) whose
+    axioms have all been saved in directory.
+    """
+    saved = {}
+    for filename in os.listdir(directory):
+        parts = filename[:-len('.txt')].split('_')
+        if filename.endswith('.txt') and len(parts) == 4 and parts[0].startswith('cnf') and all(p.isdigit() for p in parts[1:]):
+            saved[(parts[0],) + tuple(int(p) for p in parts[1:])] = os.path.join(directory, filename)
+    for n, m, k in sorted(set(key[1:] for key in saved)):
+        for desc, axioms in zip(axDesc, axCnf):
+            names = [s.strip().replace("()","") for s in axioms.split("+")]
+            if all((x, n, m, k) in saved for x in names):
+                cnf = [clause for x in names for clause in loadCNF(saved[(x, n, m, k)])] + exactlyK(n, m, k)
+                yield str((n, m, k)) + ' ' + str(desc) + ' =K', cnf
+
+def worker_solve(queue, cnf, solver):
+    result = solveCNF(cnf, solver)
+    queue.put((result.verdict, result.time))
+
+def benchmark(axCnf, axDesc, directory='.', solvers=solvers, timeout=600, filename='solver_benchmark.txt'):
+    """
+    Run every solver on the saved instances and write one line per instance with the verdict and time of every solver,
+    followed by the number of solved instances and the total time per solver. Returns the table as a dictionary
+    mapping (label, solver) to (verdict, seconds), where verdict is None if the solver hit the timeout and 'error' if its
+    process died without a verdict.
+    """
+    table = {}
+    file = open(filename, 'w')
+    for label, cnf in savedInstances(axCnf, axDesc, directory):
+        line = label + ':'
+        for solver in solvers:
+            queue = multiprocessing.Queue()
+            p = multiprocessing.Process(target=worker_solve, name="SAT solve", args=(queue, cnf, solver))
+            start = time.perf_counter()
+            p.start()
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+                table[(label, solver)] = (None, timeout)
+            elif queue.empty():
+                table[(label, solver)] = ('error', time.perf_counter() - start)
+            else:
+                table[(label, solver)] = queue.get()
+            verdict, seconds = table[(label, solver)]
+            line += ' ' + solver + ' ' + str(verdict) + ' (' + format(seconds, '.3f') + 's)'
+        if len(set(table[(label, s)][0] for s in solvers) - {None, 'error'}) > 1:
+            line += ' VERDICTS DIFFER'
+        file.write(line + '\n')
+        print(line)
+    for solver in solvers:
+        times = [table[key] for key in table if key[1] == solver]
+        line = solver + ': ' + str(sum(v in [True, False] for v, t in times)) + '/' + str(len(times)) + ' solved, ' + \
+            format(sum(t for v, t in times), '.3f') + 's in total'
+        file.write(line + '\n')
+        print(line)
+    file.close()
+    return table
+
+
+if __name__ == "__main__":
+    # the instances of Holzman and Moulin's theorems 3 and 4 saved by lisa_analysis.py
+    axDesc = [tuple(["I","NU","PU"]),tuple(["I","A","NC"])]
+    axCnf = ["cnfImpartial()+cnfNegUnanimous()+cnfPosUnanimous()","cnfImpartial()+cnfAnonymous()+cnfNonConstant()"]
+    benchmark(axCnf, axDesc)
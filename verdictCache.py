@@ -0,0 +1,47 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Cache of verdicts keyed by the hash of the canonical CNF
+
+"""Different labels often lead to the same formula, e.g. when an outcome size constraint only repeats clauses that the
+axioms already contain, or when the same combination appears in several sweeps, modules or runs. The main functions of
+iteratePeerGrading.py and of the approval modules look up every instance in a verdict cache before deciding it and
+record every verdict they find. The key is the SHA-256 hash of
+the canonical CNF (every clause sorted and without repeated literals, the clauses sorted and without repetitions), so
+the order of axioms and clauses does not matter, together with solver-independent metadata: for lazily instantiated
+axioms (see lazySolving.py) their names and n and m, since the solver adds their clauses later. The cache is a JSON
+lines file, by default next to the results store (see resultsStore.py)."""
+
+import hashlib
+import json
+import os
+import time
+
+
+def canonicalHash(cnf, metadata=None):
+    """SHA-256 hash (hexadecimal) of the canonical form of cnf and the metadata."""
+    clauses = sorted(set(tuple(sorted(set(clause))) for clause in cnf))
+    h = hashlib.sha256()
+    h.update(json.dumps(metadata, sort_keys=True).encode())
+    for clause in clauses:
+        h.update((' '.join(str(lit) for lit in clause) + ' 0\n').encode())
+    return h.hexdigest()
+
+def cacheFile(store):
+    """The verdict cache kept next to the given results store."""
+    return os.path.splitext(store)[0] + '_verdicts.jsonl'
+
+def load(filename):
+    """Dictionary mapping every hash in the cache to its record (empty if there is no cache yet)."""
+    if filename is None or not os.path.exists(filename):
+        return {}
+    with open(filename) as file:
+        return {r['hash']: r for r in (json.loads(line) for line in file if line.strip())}
+
+def record(filename, cache, key, verdict, **fields):
+    """Add a definite verdict for key to the cache (in memory and on disk); unknown verdicts are not cached."""
+    if filename is None or verdict is None or key in cache:
+        return
+    r = dict(fields, hash=key, verdict=verdict, time=time.time())
+    cache[key] = r
+    with open(filename, 'a') as file:
+        file.write(json.dumps(r, default=str) + '\n')
@@ -0,0 +1,134 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Warm-starting the solver with phase hints
+
+"""A CDCL solver decides unassigned variables according to their saved phases. Seeding these with a good candidate
+rule lets the solver start next to a model: within a sweep, a model for the axioms S is a good start for S plus one
+more axiom, and classic rules are models of many cells outright. Phase hints come from
+
+- a previous model (e.g. of a subset of the axioms, see iteratePeerGrading.main with warmStart=True),
+- a rule computed directly over all profiles as a boolean outcome array (numProfiles, n), such as the partition rule
+  of Holzman and Moulin or the top-k plurality and approval score rules,
+- a model cached for a neighbouring cell: only cells with the same n and m share their winner variables
+  posLiteral(r,x) = r*n + x + 1, so the neighbours of (n, m, k) are (n, m, k-1) and (n, m, k+1).
+
+Hints are only used by the PySAT backends, see satSolvers.solveCNF; compareWarmStart measures their effect."""
+
+import json
+import os
+import numpy as np
+from profileCodec import numRankingBallots, rankingBallots, numApprovalBallots, approvalBallots, ballotMasks, profileDigits
+from satSolvers import solveCNF
+
+
+# Phases
+
+def outcomePhases(outcomes):
+    """Phase hints (a list of literals) selecting exactly the agents x with outcomes[r, x] in every profile r."""
+    outcomes = np.asarray(outcomes, dtype=bool)
+    variables = np.arange(1, outcomes.size + 1)
+    return np.where(outcomes.reshape(-1), variables, -variables).tolist()
+
+def modelPhases(model, numVars=None):
+    """Phase hints from a model, restricted to the variables 1..numVars (e.g. the winner variables) if given."""
+    return [lit for lit in model if numVars is None or abs(lit) <= numVars]
+
+
+# Rules
+
+def topK(scores, k):
+    """Boolean outcome array selecting in every row the k agents with the highest score, ties broken by index."""
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    outcomes = np.zeros(scores.shape, dtype=bool)
+    np.put_along_axis(outcomes, order, True, axis=1)
+    return outcomes
+
+def pluralityScores(n, m, outside=None):
+    """
+    Array (numProfiles, n) counting for every profile and agent the voters that rank the agent first. If outside is a
+    list of groups of agents, only the votes of voters outside the group of the agent are counted.
+    """
+    base = numRankingBallots(n, m)
+    digits = profileDigits(np.arange(base**n), base, n)
+    group = np.zeros(n, dtype=np.int64) if outside is None else np.array([g for x in range(n) for g, members in enumerate(outside) if x in members])
+    scores = np.zeros((base**n, n), dtype=np.int64)
+    for i in range(n):
+        tops = np.array([ballot[0] for ballot in rankingBallots(n, m, i)])[digits[:, i]]
+        counted = np.ones(base**n, dtype=bool) if outside is None else group[tops] != group[i]
+        np.add.at(scores, (np.flatnonzero(counted), tops[counted]), 1)
+    return scores
+
+def pluralityTopK(n, m, k):
+    """The k agents ranked first by the most voters win."""
+    return topK(pluralityScores(n, m), k)
+
+def partitionRule(n, m, k, groups=None):
+    """
+    Partition rule of Holzman and Moulin: the agents are split into k groups (contiguous groups by default) and in every
+    group the agent ranked first by the most voters outside the group wins. Impartial, since no voter influences the
+    outcome within their own group.
+    """
+    groups = [list(g) for g in np.array_split(np.arange(n), k)] if groups is None else groups
+    scores = pluralityScores(n, m, outside=groups)
+    outcomes = np.zeros(scores.shape, dtype=bool)
+    for members in groups:
+        outcomes[np.arange(len(scores)), np.array(members)[np.argmax(scores[:, members], axis=1)]] = True
+    return outcomes
+
+def approvalTopK(n, m, k, minSize=0):
+    """The k agents with the highest approval score win (for the profiles of iterateApprovalPeerGrading)."""
+    base = numApprovalBallots(n, m, minSize)
+    digits = profileDigits(np.arange(base**n), base, n)
+    scores = np.zeros((base**n, n), dtype=np.int64)
+    for i in range(n):
+        masks = np.array(ballotMasks(approvalBallots(n, m, i, minSize)))[digits[:, i]]
+        scores += (masks[:, None] >> np.arange(n)) & 1
+    return topK(scores, k)
+
+def ruleFromFunction(rule, n, numProfiles):
+    """Boolean outcome array of a Python function mapping a profile r to the set of winning agents."""
+    outcomes = np.zeros((numProfiles, n), dtype=bool)
+    for r in range(numProfiles):
+        outcomes[r, list(rule(r))] = True
+    return outcomes
+
+
+# Cached models
+
+def cellKey(n, m, k, label):
+    return str((n, m, k)) + ' ' + str(label)
+
+def saveModel(cache, n, m, k, label, model, numVars):
+    """Append the winner variables (1..numVars) set to true by model to the JSON lines file cache under the given cell."""
+    with open(cache, 'a') as file:
+        file.write(json.dumps({'cell': cellKey(n, m, k, label), 'true': [lit for lit in model if 0 < lit <= numVars]}) + '\n')
+
+def loadModels(cache):
+    """Dictionary mapping every cell in the cache to its winner variables set to true, the latest model of a cell wins."""
+    if cache is None or not os.path.exists(cache):
+        return {}
+    with open(cache) as file:
+        return {r['cell']: r['true'] for r in (json.loads(line) for line in file if line.strip())}
+
+def cachedPhases(cache, n, m, k, label, numVars):
+    """Phase hints from the cached model of the cell itself or of a neighbouring cell (n, m, k-1) or (n, m, k+1)."""
+    models = loadModels(cache)
+    for key in [cellKey(n, m, k, label), cellKey(n, m, k - 1, label), cellKey(n, m, k + 1, label)]:
+        if key in models:
+            true = set(models[key])
+            return [v if v in true else -v for v in range(1, numVars + 1)]
+    return None
+
+
+# Measuring the effect
+
+def compareWarmStart(cnf, hints, solver='cadical153'):
+    """
+    Solve cnf without phase hints and once with each of the given hints (a dictionary name -> phases).
+    Returns a dictionary name -> (verdict, seconds, conflicts), including the cold start under 'cold'.
+    """
+    report = {}
+    for name, phases in [('cold', None)] + list(hints.items()):
+        result = solveCNF(cnf, solver, phases=phases)
+        report[name] = (result.verdict, result.time, result.stats.get('conflicts'))
+    return report
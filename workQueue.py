@@ -0,0 +1,235 @@
+# Advanced Topics in Computational Social Choice 2021
+# Peer Grading
+# Work queue of sweep tasks shared by many workers
+
+"""A sweep is split into tasks, one per (n, m, k) and axiom set of ax, which are kept in a SQLite file on shared storage
+together with the outcome sizes and the options of main. Any number of worker processes, on one node or on many,
+take tasks from the queue with work. A task is leased to a worker for a limited time, and a thread of the worker
+extends the lease while it works (heartbeat). The lease of a worker that died runs out and the task is handed out again,
+at most maxAttempts times. Every task is solved by main under its own label, so a task gives the result lines iterate
+gives for that label. The workers share a verdict cache (see verdictCache.py), so a CNF that an earlier task already
+decided, e.g. of an axiom set that differs only in the order of its axioms, is not solved again.
+
+The cheapest tasks (see planner.py) are handed out first, but a task waits for the earlier tasks of its cell whose label
+is a subset of its own. As in main, it is pruned without solving if one of them is unsatisfiable for some outcome size
+or has the same label. The verdict of every task is kept in its row for this. SQLite locks the file for every lease,
+which needs a shared file system with working locks (e.g. not every NFS mount):
+
+    createQueue("queue.db", nRange=range(3,6), ax=axCnf, axLabels=axDesc, outSize=["cnfAtLeastK()+cnfAtMostK()"], outSizeLabels=["=K"])
+    python workQueue.py work queue.db        (on every node, e.g. in a SLURM array job)
+    python workQueue.py status queue.db
+    python workQueue.py export queue.db results.txt"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from instrumentation import newRun, timedOut
+import iteratePeerGrading
+import planner
+import resultsStore
+import verdictCache
+
+# seconds a lease lasts without a heartbeat, and between two heartbeats
+defaultLease = 600
+defaultHeartbeat = 60
+
+# leases of a task before it is given up
+maxAttempts = 3
+
+
+def connect(filename):
+    # autocommit, transactions are started explicitly; wait for the lock of other workers
+    return sqlite3.connect(filename, timeout=600, isolation_level=None)
+
+def createQueue(filename, nRange, ax, axLabels, mRange=False, kRange=False, outSize=False, outSizeLabels=False, **options):
+    """
+    Create a queue holding a task for every (n, m, k) of the sweep (as in iterate) and every axiom set of ax with its
+    label. options are further keyword arguments of main (e.g. solver or lazy) used by all workers. Adding the same
+    sweep to an existing queue adds only the missing tasks.
+    """
+    if mRange == False:
+        mRange = range(1,max(nRange))
+    if kRange == False:
+        kRange = range(1,max(nRange))
+    conn = connect(filename)
+    conn.execute("CREATE TABLE IF NOT EXISTS sweep (outSize TEXT, outSizeLabels TEXT, options TEXT)")
+    # verdict is 0 if some result line of the task is unsatisfiable, 1 if it has others and NULL without result lines
+    conn.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, n INTEGER, m INTEGER, k INTEGER, position INTEGER,"
+        " axioms TEXT, label TEXT, cost REAL, status TEXT DEFAULT 'pending', worker TEXT, lease REAL, attempts INTEGER DEFAULT 0,"
+        " results TEXT, verdict INTEGER, complete INTEGER, seconds REAL, UNIQUE (n, m, k, position))")
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DELETE FROM sweep")
+    conn.execute("INSERT INTO sweep VALUES (?, ?, ?)", (json.dumps(outSize), json.dumps(outSizeLabels), json.dumps(options)))
+    for n in nRange:
+        for k in (x for x in kRange if x < n):
+            for m in (x for x in mRange if x < n):
+                for position, (expression, label) in enumerate(zip(ax, axLabels)):
+                    cost = sum(planner.estimate(name, n, m, k)['seconds'] for name in planner.axiomNames([expression]))
+                    conn.execute("INSERT OR IGNORE INTO tasks (n, m, k, position, axioms, label, cost) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (n, m, k, position, expression, json.dumps(label), cost))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+# Leases
+
+def labelSet(label):
+    """The axioms named by a label, e.g. {'I', 'NU'} for ('I', 'NU'), as main compares labels when pruning."""
+    return set(label) if isinstance(label, (tuple, list)) else {label}
+
+def lease(conn, worker, duration=defaultLease):
+    """
+    Lease the cheapest task that is pending or whose lease ran out to worker. Returns (id, n, m, k, axioms, label), None
+    if no task is left, or False if the remaining tasks wait for tasks of other workers. Tasks leased maxAttempts times
+    without completion are marked failed.
+
+    A task is only handed out once the earlier tasks of its cell (in the order of ax) whose label is a subset of its own
+    are finished. It is pruned without solving if one of them is unsatisfiable or has the same label and a result, as
+    main skips these labels.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("UPDATE tasks SET status = 'failed' WHERE status = 'leased' AND lease < ? AND attempts >= ?", (now, maxAttempts))
+    candidates = conn.execute("SELECT id, n, m, k, position, axioms, label FROM tasks WHERE status = 'pending'"
+        " OR (status = 'leased' AND lease < ?) ORDER BY cost, id", (now,)).fetchall()
+    leased = None
+    for taskId, n, m, k, position, axioms, label in candidates:
+        labels = labelSet(loadLabel(label))
+        subsets = [(status, verdict, labelSet(loadLabel(other))) for other, status, verdict in
+            conn.execute("SELECT label, status, verdict FROM tasks WHERE n = ? AND m = ? AND k = ? AND position < ?", (n, m, k, position)).fetchall()
+            if labelSet(loadLabel(other)) <= labels]
+        if any(status == 'done' and (verdict == 0 or (verdict is not None and other == labels)) for status, verdict, other in subsets):
+            conn.execute("UPDATE tasks SET status = 'pruned', results = '[]', complete = 1 WHERE id = ?", (taskId,))
+            continue
+        if any(status in ['pending', 'leased'] for status, verdict, other in subsets):
+            continue
+        conn.execute("UPDATE tasks SET status = 'leased', worker = ?, lease = ?, attempts = attempts + 1 WHERE id = ?", (worker, now + duration, taskId))
+        leased = (taskId, n, m, k, axioms, loadLabel(label))
+        break
+    if leased is None and conn.execute("SELECT count(*) FROM tasks WHERE status IN ('pending', 'leased')").fetchone()[0] > 0:
+        leased = False
+    conn.execute("COMMIT")
+    return leased
+
+def heartbeat(conn, task, worker, duration=defaultLease):
+    """Extend the lease of worker on task. Returns False if the lease was lost to another worker or the task is done."""
+    cursor = conn.execute("UPDATE tasks SET lease = ? WHERE id = ? AND worker = ? AND status = 'leased'", (time.time() + duration, task, worker))
+    return cursor.rowcount == 1
+
+def finish(conn, task, worker, results, verdict, complete, seconds):
+    """Record the results and verdict of task; the first worker to finish a task wins."""
+    conn.execute("UPDATE tasks SET status = 'done', worker = ?, results = ?, verdict = ?, complete = ?, seconds = ? WHERE id = ?"
+        " AND status != 'done'", (worker, json.dumps(results), verdict, int(complete), seconds, task))
+
+def keepLeased(filename, task, worker, duration, interval, stop):
+    """Heartbeat of a worker, run in a thread until stop is set (with its own connection, as SQLite requires)."""
+    conn = connect(filename)
+    while not stop.wait(interval):
+        if not heartbeat(conn, task, worker, duration):
+            print(worker + ': lost the lease of task ' + str(task))
+            break
+    conn.close()
+
+
+# Workers
+
+def loadLabel(text):
+    """A label stored as JSON, with tuples (e.g. ('I', 'NU', 'PU')) restored, since they appear in the result lines."""
+    label = json.loads(text)
+    return tuple(label) if isinstance(label, list) else label
+
+def taskVerdict(results, label, outSizeLabels):
+    """0 if some result line is unsatisfiable, 1 if there are result lines but none is, None without result lines."""
+    verdicts = [parsed[2] for parsed in (resultsStore.parseResult(r, [label], outSizeLabels) for r in results) if parsed is not None]
+    if len(verdicts) == 0:
+        return None
+    return 0 if False in verdicts else 1
+
+def work(filename, worker=None, duration=defaultLease, interval=defaultHeartbeat, events="events.jsonl", store=None, cache=None):
+    """
+    Take tasks from the queue and solve them with main until none is left. Results are written to the queue and, if a
+    store is given, to the results store (see resultsStore.py). cache is the verdict cache shared by the workers, by
+    default next to the store if there is one and otherwise next to the queue. Returns the number of tasks done by this
+    worker.
+    """
+    worker = worker or socket.gethostname() + '-' + str(os.getpid())
+    conn = connect(filename)
+    outSize, outSizeLabels, options = [json.loads(x) for x in conn.execute("SELECT outSize, outSizeLabels, options FROM sweep").fetchone()]
+    outSizeLabels = outSizeLabels or iteratePeerGrading.defaultOutSizeLabels
+    sweepCache = options.pop('cache', None)
+    if cache is None:
+        cache = sweepCache if sweepCache is not None else verdictCache.cacheFile(store if store is not None else filename)
+    run = newRun()
+    done = 0
+    while True:
+        task = lease(conn, worker, duration)
+        if task is None:
+            break
+        if task is False: #the remaining tasks wait for their subsets, which other workers are solving
+            time.sleep(interval)
+            continue
+        task, n, m, k, axioms, label = task
+        # a run of its own for every task, so that timeouts of earlier tasks of this worker are not attributed to it
+        taskRun = run+'-'+str(task)
+        print(worker + ': ' + str(n)+','+str(m)+','+str(k) + ' ' + str(label))
+        stop = threading.Event()
+        thread = threading.Thread(target=keepLeased, args=(filename, task, worker, duration, interval, stop), daemon=True)
+        thread.start()
+        start = time.time()
+        try:
+            results = iteratePeerGrading.main(n,m,k,[axioms],[label],outSize,outSizeLabels,events=events,run=taskRun,cache=cache,**options)
+        finally:
+            stop.set()
+            thread.join()
+        complete = not timedOut(events, taskRun, n, m, k)
+        finish(conn, task, worker, results, taskVerdict(results, label, outSizeLabels), complete, time.time() - start)
+        if store is not None:
+            resultsStore.storeCell(store,'iteratePeerGrading',n,m,k,[label],outSizeLabels,iteratePeerGrading.encodingVersion,
+                results,complete,time.time() - start,options.get('solver','pylgl'),taskRun,events)
+        done += 1
+    conn.close()
+    return done
+
+
+# Reports
+
+def status(filename):
+    """Number of tasks in every state, and the pending and leased ones by worker."""
+    conn = connect(filename)
+    counts = dict(conn.execute("SELECT status, count(*) FROM tasks GROUP BY status").fetchall())
+    workers = dict(conn.execute("SELECT worker, count(*) FROM tasks WHERE status = 'leased' GROUP BY worker").fetchall())
+    conn.close()
+    return counts, workers
+
+def export(filename, output):
+    """Write the results of all done tasks in the layout of iterate, the axiom sets of a cell in the order of ax."""
+    conn = connect(filename)
+    rows = conn.execute("SELECT n, m, k, results FROM tasks WHERE status = 'done' ORDER BY n, k, m, position").fetchall()
+    conn.close()
+    with open(output, 'w') as file:
+        cell = None
+        for n, m, k, results in rows:
+            if (n, m, k) != cell:
+                if cell is not None:
+                    file.write('\n')
+                file.write(str(n)+','+str(m)+','+str(k)+':\n')
+                cell = (n, m, k)
+            for r in json.loads(results):
+                file.write(r + '\n')
+        if cell is not None:
+            file.write('\n')
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == 'work':
+        print(str(work(sys.argv[2], *sys.argv[3:4])) + ' tasks done')
+    elif sys.argv[1] == 'status':
+        counts, workers = status(sys.argv[2])
+        print(counts)
+        print(workers)
+    elif sys.argv[1] == 'export':
+        export(sys.argv[2], sys.argv[3])